@@ -43,6 +43,8 @@ export interface AdminVideoFilters {
   user_id?: string;
   sort_by?: "created_at" | "title" | "views_count" | "updated_at";
   sort_order?: "asc" | "desc";
+  cursor?: string;
+  count?: "exact" | "estimated";
 }
 
 export interface PaginatedResponse<T> {
@@ -51,6 +53,8 @@ export interface PaginatedResponse<T> {
   skip: number;
   limit: number;
   has_more: boolean;
+  total_is_estimate?: boolean;
+  next_cursor?: string | null;
 }
 
 export type AdminVideosResponse = PaginatedResponse<Video>;
@@ -187,6 +191,8 @@ export const getAdminVideos = async (
     user_id,
     sort_by = "created_at",
     sort_order = "desc",
+    cursor,
+    count,
   } = filters;
 
   // Build query params object
@@ -202,6 +208,8 @@ export const getAdminVideos = async (
   if (processing_status) params.processing_status = processing_status;
   if (search) params.search = search;
   if (user_id) params.user_id = user_id;
+  if (cursor) params.cursor = cursor;
+  if (count) params.count = count;
 
   try {
     const response = await api.get<AdminVideosResponse>("/videos/list-all", {
@@ -0,0 +1,30 @@
+"""add keyset pagination indexes to videos
+
+Revision ID: b5e83f0d2a17
+Revises: 7d2e4b91c0a6
+Create Date: 2026-10-18 16:40:12.503918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e83f0d2a17'
+down_revision: Union[str, Sequence[str], None] = '7d2e4b91c0a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_videos_created_at_id', 'videos', ['created_at', 'id'], unique=False)
+    op.create_index('ix_videos_user_id_created_at_id', 'videos', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_videos_user_id_created_at_id', table_name='videos')
+    op.drop_index('ix_videos_created_at_id', table_name='videos')
@@ -0,0 +1,35 @@
+"""add view_flushes table
+
+Revision ID: d3f6a8c41e92
+Revises: b5e83f0d2a17
+Create Date: 2026-10-18 19:05:37.412063
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f6a8c41e92'
+down_revision: Union[str, Sequence[str], None] = 'b5e83f0d2a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'view_flushes',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('applied_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_view_flushes_applied_at'), 'view_flushes', ['applied_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_view_flushes_applied_at'), table_name='view_flushes')
+    op.drop_table('view_flushes')
@@ -3,7 +3,8 @@ from app.apis.routes.auth import auth_router
 from app.apis.routes.health import healthRouter
 from app.apis.routes.video import video_router
 from app.apis.routes.user import user_router
+from app.apis.routes.playback import playback_router
 
 
 
-__all__ = ["auth_router","healthRouter","video_router","user_router"]
\ No newline at end of file
+__all__ = ["auth_router","healthRouter","video_router","user_router","playback_router"]
\ No newline at end of file
@@ -99,7 +99,7 @@ def refresh(
     summary="Logout user",
     description="Revoke refresh token (logout from this session)"
 )
-async def logout(
+def logout(
     token_data: RefreshTokenRequest,
     db: Session = Depends(get_db)
 ) -> dict:
@@ -113,7 +113,7 @@ async def logout(
     summary="Verify email address",
     description="Verify user's email using token from email link"
 )
-async def verify_email(
+def verify_email(
     token: str,  # Query parameter from URL
     db: Session = Depends(get_db)
 ) -> dict:
@@ -131,7 +131,7 @@ async def verify_email(
     summary="Resend verification email",
     description="Resend verification email if user didn't receive it"
 )
-async def resend_verification(
+def resend_verification(
     request: ResendVerificationRequest, 
     db: Session = Depends(get_db)
 ) -> dict:
@@ -0,0 +1,209 @@
+# /backend/app/apis/routes/playback.py
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from app.core.config import get_settings
+from app.core.database import get_db
+from app.core.dependencies import get_current_user_optional, get_current_admin_user
+from app.models.users import User
+from app.schemas.video import PlaybackSessionResponse
+from app.services.minio_service import minio_service
+from app.services.playback_service import (
+    playback_service, ProxiedObject, MASTER_PLAYLIST, MEDIA_PLAYLIST, TRICKPLAY_INDEX, RENDITION_NAME
+)
+from app.services.segment_cache import get_segment_cache
+from app.utils.request_helpers import client_address
+from typing import Optional, Tuple
+import hashlib
+import re
+import logging
+
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+playback_router = APIRouter(
+    prefix="/playback",
+    tags=["Playback"]
+)
+
+
+def _viewer_session_id(request: Request, token: str) -> str:
+    """Tells viewers apart for prefetch: one token is shared by everyone in its window"""
+    client = client_address(request)
+    viewer = f"{token}|{client}|{request.headers.get('user-agent', '')}"
+    return hashlib.sha1(viewer.encode()).hexdigest()
+
+
+def _byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) byte of a single-range `Range: bytes=...` header; None sends the
+    whole object (no header, multiple ranges or a malformed one)
+
+    Raises:
+        HTTPException: 416 if the range starts past the end of the object
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        first, last = max(0, size - int(last)), size - 1
+        if last < first:
+            first = size  # bytes=-0
+    else:
+        if last and int(last) < int(first):
+            return None
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return first, last
+
+
+def _proxied_response(request: Request, segment: ProxiedObject, media_type: str, headers: dict) -> Response:
+    """Answer a (Range) request for an object too large for the segment cache straight from MinIO"""
+    byte_range = _byte_range(request.headers.get("range", ""), segment.size)
+    first, last = byte_range or (0, segment.size - 1)
+    length = last - first + 1
+    headers = {**headers, "Accept-Ranges": "bytes", "Content-Length": str(length)}
+    if byte_range:
+        headers["Content-Range"] = f"bytes {first}-{last}/{segment.size}"
+    try:
+        body = minio_service.stream_object(segment.bucket, segment.object_name, offset=first, length=length)
+    except Exception as e:
+        logger.error(f"Failed to stream {segment.object_name}: {str(e)}")
+        raise HTTPException(status_code=502, detail="Storage unavailable")
+    return StreamingResponse(body, status_code=206 if byte_range else 200, media_type=media_type, headers=headers)
+
+
+def _playlist_response(text: str, max_age: int, media_type: str) -> Response:
+    # Same content for every viewer of the token's window - shared caches may keep it
+    return Response(
+        content=text,
+        media_type=media_type,
+        headers={"Cache-Control": f"public, max-age={max_age}"}
+    )
+
+
+@playback_router.get(
+    "/cache/stats",
+    summary="Segment cache metrics of this API node (admin)"
+)
+def get_segment_cache_stats(current_admin: User = Depends(get_current_admin_user)):
+    """
+    Hits, misses, coalesced misses, evictions, hit ratio and bytes served from
+    disk instead of MinIO, since this process started. `prefetch` has the
+    prefetcher's queued / skipped / failed counts and tracked viewer sessions.
+
+    Requires admin privileges.
+    """
+    return playback_service.segment_cache_stats()
+
+
+@playback_router.get(
+    "/{video_id}",
+    response_model=PlaybackSessionResponse,
+    summary="Start a playback session"
+)
+def create_playback_session(
+    video_id: str,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
+    """
+    Check access to a processed video and return where to play it from.
+
+    - **manifest_url**: master playlist to hand to the player (no auth header needed)
+    - **trickplay_vtt_url**: WebVTT seek thumbnails, when the video has them
+    - Segment URLs in the playlists are presigned and expire with the session (`expires_at`)
+    """
+    user_id = current_user.id if current_user else None
+    return playback_service.create_session(db, video_id, user_id)
+
+
+@playback_router.get(
+    "/{video_id}/{token}/master.m3u8",
+    summary="Master playlist of a playback session"
+)
+def get_master_playlist(video_id: str, token: str, db: Session = Depends(get_db)):
+    text, max_age = playback_service.get_playlist(db, video_id, token, MASTER_PLAYLIST)
+    return _playlist_response(text, max_age, "application/vnd.apple.mpegurl")
+
+
+@playback_router.get(
+    "/{video_id}/{token}/trickplay/thumbnails.vtt",
+    summary="Seek thumbnails of a playback session"
+)
+def get_trickplay_index(video_id: str, token: str, db: Session = Depends(get_db)):
+    text, max_age = playback_service.get_playlist(db, video_id, token, TRICKPLAY_INDEX)
+    return _playlist_response(text, max_age, "text/vtt")
+
+
+@playback_router.get(
+    "/{video_id}/{token}/{rendition}/playlist.m3u8",
+    summary="Media playlist of a playback session"
+)
+def get_media_playlist(video_id: str, token: str, rendition: str, db: Session = Depends(get_db)):
+    """Segment URIs are rewritten to presigned storage URLs (left relative with segment cache delivery)"""
+    if not RENDITION_NAME.match(rendition):
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    text, max_age = playback_service.get_playlist(db, video_id, token, f"{rendition}/{MEDIA_PLAYLIST}")
+    return _playlist_response(text, max_age, "application/vnd.apple.mpegurl")
+
+
+# Declared last: /playlist.m3u8 and /trickplay/thumbnails.vtt above take precedence
+@playback_router.get(
+    "/{video_id}/{token}/{rendition}/{filename}",
+    summary="Segment of a playback session (segment cache delivery)"
+)
+def get_segment(
+    video_id: str,
+    token: str,
+    rendition: str,
+    filename: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Only used when PLAYBACK_SEGMENT_DELIVERY=cache (otherwise playlists point at storage).
+
+    - Served from this node's disk cache, fetched from MinIO once on a miss
+    - `ETag` / `If-None-Match` (304) and `Range` requests are supported
+    - With SEGMENT_CACHE_ACCEL_REDIRECT set, the reverse proxy sends the file
+    - Single-file renditions above SEGMENT_CACHE_MAX_OBJECT_BYTES are proxied from storage per Range request
+    - The next segments (and those of the neighbouring rung) are prefetched into the cache
+    """
+    entry, media_type, max_age = playback_service.get_segment(db, video_id, token, rendition, filename)
+    headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={max_age}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    not_modified = entry.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+    if isinstance(entry, ProxiedObject):
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        return _proxied_response(request, entry, media_type, headers)
+
+    # The file can't be unlinked by an eviction until it is released
+    cache = get_segment_cache()
+    try:
+        playback_service.prefetch_after(
+            _viewer_session_id(request, token), video_id, token, rendition, filename, entry.size
+        )
+        if not_modified:
+            cache.release(entry)
+            return Response(status_code=304, headers=headers)
+
+        if settings.segment_cache_accel_redirect:
+            # The proxy answers Range requests itself; it opens the file within the cache's unlink grace period
+            headers["X-Accel-Redirect"] = f"{settings.segment_cache_accel_redirect.rstrip('/')}/{entry.relative_path}"
+            cache.release(entry)
+            return Response(media_type=media_type, headers=headers)
+
+        return FileResponse(entry.path, media_type=media_type, headers=headers, background=BackgroundTask(cache.release, entry))
+    except Exception:
+        cache.release(entry)
+        raise
@@ -1,14 +1,26 @@
 # /backend/app/apis/routes/video.py
 
-from fastapi import APIRouter, Depends, status, UploadFile, File, Form, HTTPException, Query
+from fastapi import APIRouter, Depends, status, UploadFile, File, Form, HTTPException, Query, Request, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from app.services.progress_service import stream_progress_events
 from app.schemas.video import VideoResponse, VideoCreate, VideoList
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.services.video_service import video_service
-from app.core.dependencies import get_current_user , get_current_admin_user 
+from app.services.upload_service import upload_service
+from app.services.view_counter import unique_viewers
+from app.core.dependencies import get_current_user , get_current_admin_user, get_current_user_optional
 from app.models.users import User  
-from typing import Optional, List
-from app.schemas.video import VideoProcessingStatusResponse,PaginatedResponse, AdminVideoList
+from typing import Optional
+from app.schemas.video import VideoProcessingStatusResponse,PaginatedResponse, AdminVideoList, CursorPage
+from app.schemas.video import UploadSessionCreate, UploadSessionComplete, UploadSessionResponse
+from app.schemas.video import ResumableUploadResponse, ResumableUploadStatus, ProcessingExpediteResponse
+from app.core.config import get_settings
+from app.utils.request_helpers import client_address
+
+
+settings = get_settings()
 
 
 
@@ -50,6 +62,160 @@ async def create_new_video(
     return new_video
 
 
+@video_router.post(
+    "/uploads",
+    response_model=UploadSessionResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Start a direct-to-storage upload"
+)
+def create_upload_session(
+    request: UploadSessionCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Start a multipart upload straight to object storage.
+
+    - Returns one presigned URL per part; PUT each `part_size` slice to its URL
+    - Keep the `ETag` header of every part response for the completion call
+    - **thumbnail_upload_url**: presigned PUT for the optional thumbnail
+    """
+    return upload_service.create_session(request, current_user.id)
+
+
+@video_router.post(
+    "/uploads/{session_id}/complete",
+    response_model=VideoResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Complete a direct-to-storage upload"
+)
+def complete_upload_session(
+    session_id: str,
+    request: UploadSessionComplete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Assemble the uploaded parts, create the video and start processing"""
+    return upload_service.complete_session(db, session_id, request, current_user.id)
+
+
+@video_router.delete(
+    "/uploads/{session_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Abort a direct-to-storage upload"
+)
+def abort_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel an upload and discard the parts stored so far"""
+    upload_service.abort_session(session_id, current_user.id)
+    return None
+
+
+@video_router.post(
+    "/resumable-uploads",
+    response_model=ResumableUploadResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Start a resumable upload"
+)
+def create_resumable_upload(
+    request: UploadSessionCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Start an offset-based upload through the API.
+
+    - PATCH `/resumable-uploads/{session_id}` with `Upload-Offset` and `chunk_size` raw bytes
+    - After a dropped connection, HEAD the upload and continue from `Upload-Offset`
+    - The last chunk completes the upload and starts processing
+    """
+    return upload_service.create_resumable_session(request, current_user.id)
+
+
+@video_router.head(
+    "/resumable-uploads/{session_id}",
+    summary="Get the committed offset of a resumable upload"
+)
+def head_resumable_upload(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    upload_status = upload_service.get_resumable_status(session_id, current_user.id)
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers={
+            "Upload-Offset": str(upload_status.offset),
+            "Upload-Length": str(upload_status.file_size),
+            "Cache-Control": "no-store"
+        }
+    )
+
+
+@video_router.get(
+    "/resumable-uploads/{session_id}",
+    response_model=ResumableUploadStatus,
+    summary="Get resumable upload progress"
+)
+def get_resumable_upload(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    return upload_service.get_resumable_status(session_id, current_user.id)
+
+
+@video_router.patch(
+    "/resumable-uploads/{session_id}",
+    response_model=ResumableUploadStatus,
+    summary="Upload the next chunk of a resumable upload"
+)
+async def append_resumable_upload(
+    session_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Body is the raw chunk (`application/offset+octet-stream`), at most `chunk_size` bytes.
+    Returns 409 if `Upload-Offset` isn't the committed offset - HEAD and resume from there.
+    If the status shows every byte but `completed` false (finalize failed), send an empty
+    body at `Upload-Offset: file_size` to retry the completion.
+    """
+    chunk = bytearray()
+    async for data in request.stream():
+        chunk.extend(data)
+        if len(chunk) > settings.upload_part_size:
+            raise HTTPException(status_code=413, detail="Chunk larger than the upload chunk size")
+
+    # Blocking: runs on the threadpool (finalize does DB work); the part upload
+    # itself goes to the storage pool
+    upload_status = await run_in_threadpool(
+        upload_service.append_chunk,
+        db,
+        session_id,
+        upload_offset,
+        bytes(chunk),
+        current_user.id
+    )
+    response.headers["Upload-Offset"] = str(upload_status.offset)
+    return upload_status
+
+
+@video_router.delete(
+    "/resumable-uploads/{session_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Abort a resumable upload"
+)
+def abort_resumable_upload(
+    session_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel an upload and discard the chunks stored so far"""
+    upload_service.abort_session(session_id, current_user.id)
+    return None
+
+
 @video_router.get(
     "/by-id/{video_id}",
     response_model=VideoResponse,
@@ -63,38 +229,41 @@ def get_video(
     """Get a specific video by ID"""
     user_id = current_user.id if current_user else None
     video = video_service.get_video_by_id(db, video_id, user_id)
+    video.unique_viewers = unique_viewers(video_id)
     return video
 
 
 @video_router.get(
     "/user/me",
-    response_model=List[VideoList],
+    response_model=CursorPage[VideoList],
     summary="Get current user's videos"
 )
 def get_my_videos(
-    skip: int = 0,
-    limit: int = 20,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    skip: int = Query(0, ge=0, description="Offset, ignored with a cursor (slower on deep pages)"),
+    limit: int = Query(20, ge=1, le=100),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all videos uploaded by the current user"""
-    videos = video_service.get_user_videos(db, current_user.id, skip, limit)
-    return videos
+    """Get all videos uploaded by the current user, newest first"""
+    videos, next_cursor = video_service.get_user_videos(db, current_user.id, skip, limit, cursor)
+    return CursorPage(items=videos, limit=limit, next_cursor=next_cursor, has_more=next_cursor is not None)
 
 
 @video_router.get(
     "/",
-    response_model=List[VideoList],
+    response_model=CursorPage[VideoList],
     summary="Get public videos"
 )
 def get_public_videos(
-    skip: int = 0,
-    limit: int = 20,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    skip: int = Query(0, ge=0, description="Offset, ignored with a cursor (slower on deep pages)"),
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
-    """Get all public videos"""
-    videos = video_service.get_public_videos(db, skip, limit)
-    return videos
+    """Get all public videos, newest first"""
+    videos, next_cursor = video_service.get_public_videos(db, skip, limit, cursor)
+    return CursorPage(items=videos, limit=limit, next_cursor=next_cursor, has_more=next_cursor is not None)
 
 
 @video_router.delete(
@@ -119,15 +288,24 @@ def delete_video(
 )
 def increment_video_views(
     video_id: str,
+    request: Request,
+    current_user: Optional[User] = Depends(get_current_user_optional),
     db: Session = Depends(get_db)
 ):
-    """Increment view count when video is played"""
-    video_service.increment_views(db, video_id)
+    """
+    Increment view count when video is played.
+    Buffered in Redis: lists and details include it right away, Postgres within VIEW_FLUSH_INTERVAL_SECONDS.
+    """
+    if current_user:
+        viewer = f"user:{current_user.id}"
+    else:
+        viewer = f"anon:{client_address(request)}|{request.headers.get('user-agent', '')}"
+    video_service.increment_views(db, video_id, viewer)
     return {"message": "View count incremented"}
 
 
 @video_router.get("/{video_id}/status", response_model=VideoProcessingStatusResponse)
-async def get_video_processing_status(
+def get_video_processing_status(
     video_id: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -139,6 +317,56 @@ async def get_video_processing_status(
     )
 
 
+@video_router.get(
+    "/{video_id}/status/stream",
+    summary="Stream processing progress (Server-Sent Events)"
+)
+async def stream_video_processing_status(
+    video_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Live processing progress as Server-Sent Events.
+
+    - One `progress` event per update, same payload as `GET /videos/{video_id}/status`
+    - The stream ends after the `completed` or `failed` event
+    """
+    initial = await run_in_threadpool(
+        video_service.get_video_processing_status_service,
+        db=db,
+        video_id=video_id,
+        current_user=current_user,
+    )
+    # The stream can stay open for an hour - don't hold a pooled DB connection for it
+    db.close()
+
+    return StreamingResponse(
+        stream_progress_events(video_id, initial.model_dump(mode="json"), request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@video_router.post(
+    "/{video_id}/expedite",
+    response_model=ProcessingExpediteResponse,
+    summary="Process a video ahead of the queue (admin)"
+)
+def expedite_video_processing(
+    video_id: str,
+    current_admin: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Gives the video top processing priority and lets it skip its uploader's
+    concurrency cap. A video still waiting for a slot is started immediately.
+
+    Requires admin privileges.
+    """
+    return video_service.expedite_video_processing_service(db=db, video_id=video_id)
+
 
 @video_router.get(
     "/list-all",
@@ -154,6 +382,8 @@ def get_all_videos(
     user_id: Optional[str] = Query(None, description="Filter by user ID"),
     sort_by: str = Query("created_at", description="Sort field: created_at, title, views_count, etc."),
     sort_order: str = Query("desc", description="Sort order: asc or desc"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (sort_by=created_at only)"),
+    count: str = Query("exact", pattern="^(exact|estimated)$", description="exact, or estimated (no full count per request)"),
     current_admin: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
@@ -163,10 +393,12 @@ def get_all_videos(
     - Private videos
     - User information
     - Full metadata
+
+    Page with `cursor` (`next_cursor` of the previous page) for flat latency at any depth.
     
     Requires admin privileges.
     """
-        videos, total = video_service.get_all_videos_admin(
+        page = video_service.get_all_videos_admin(
             db=db,
             skip=skip,
             limit=limit,
@@ -175,12 +407,13 @@ def get_all_videos(
             search=search,
             user_id=user_id,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            count=count
         )
     
         return PaginatedResponse(
-            items=videos,
-            total=total,
+            **page,
             skip=skip,
             limit=limit
         )
\ No newline at end of file
@@ -2,9 +2,22 @@ from app.core.logging_config import setup_logging
 setup_logging()
 
 from celery import Celery
+from celery.signals import celeryd_after_setup, celeryd_init
+from kombu import Queue
 from app.core.config import get_settings
+from app.core import autotune
+import socket
+import logging
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+# Task queues by workload:
+# - encode: libx264 work, CPU bound - few slots per core, acks_late
+# - io:     MinIO downloads/uploads, ffmpeg remux - many slots per node
+# - light:  bookkeeping (manifest, finalize, dispatch) - must never wait behind an encode
+TASK_QUEUES = ("io", "encode", "light")
 
 
 # Build redis URL from settings
@@ -29,8 +42,87 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=3600,  # 1 hour hard limit
     task_soft_time_limit=3000,  # 50 min soft limit
+
+    # Queues - each task declares its queue in video_tasks.py / workflows.py
+    # (see TASK_QUEUES); worker profiles consume them with their own concurrency
+    task_queues=[Queue(name) for name in TASK_QUEUES],
+    task_default_queue="light",
+    # Reserve one task at a time per process: a prefetched encode would sit
+    # behind a running one while another worker idles. Light workers raise it with --prefetch-multiplier.
+    worker_prefetch_multiplier=1,
+    # acks_late tasks are redelivered if their worker dies mid-task
+    task_reject_on_worker_lost=True,
+    # Redis redelivers unacked tasks after this - must outlive the longest task.
+    # priority_steps: one Redis list per priority 0..9 (0 is consumed first), set by app/tasks/scheduler.py
+    broker_transport_options={
+        "visibility_timeout": 2 * 3600,
+        "priority_steps": list(range(10)),
+        "sep": ":",
+    },
+
+    # Periodic tasks - sent by one `celery beat` process per deployment. A flush expires
+    # after one interval, so ticks missed while no light worker runs don't pile up.
+    beat_schedule={
+        "flush-view-counts": {
+            "task": "app.tasks.view_counts.flush_view_counts",
+            "schedule": settings.view_flush_interval_seconds,
+            "options": {"queue": "light", "expires": settings.view_flush_interval_seconds},
+        },
+        "reap-processing-slots": {
+            "task": "app.tasks.scheduler.reap_processing_slots",
+            "schedule": settings.processing_slot_sweep_seconds,
+            "options": {"queue": "light", "expires": settings.processing_slot_sweep_seconds},
+        },
+    },
 )
 
 
 # Auto-discover tasks from the tasks module
-celery_app.autodiscover_tasks(['app.tasks'])
\ No newline at end of file
+celery_app.autodiscover_tasks(['app.tasks'])
+
+
+def scratch_host_id() -> str:
+    """Identifies the scratch directory (processing_temp_dir) this worker writes to"""
+    return settings.scratch_host_id or socket.gethostname()
+
+
+def scratch_host_queue(queue: str, host_id: str = None) -> str:
+    """Host-local variant of a task queue, consumed only by workers on one scratch host"""
+    return f"{queue}.host.{host_id or scratch_host_id()}"
+
+
+@celeryd_after_setup.connect
+def add_scratch_host_queues(sender, instance, **kwargs):
+    """
+    Every worker also consumes the host-local variant of each queue it serves
+    (-Q encode -> encode + encode.host.<id>). prepare_video records the host it
+    downloaded to, and the rest of that video's pipeline is routed there.
+    """
+    if settings.scratch_affinity != "host_queue":
+        return
+
+    queues = instance.app.amqp.queues
+    for queue in list(queues.consume_from):
+        if queue in TASK_QUEUES:
+            queues.select_add(scratch_host_queue(queue))
+            logger.info(f"Consuming scratch host queue: {scratch_host_queue(queue)}")
+
+
+@celeryd_init.connect
+def autotune_encode_concurrency(sender, instance, conf, options, **kwargs):
+    """
+    Encode workers started without --concurrency get one slot per
+    settings.encode_threads_per_slot usable CPUs (cgroup quota and memory aware).
+    The pool processes inherit the slot count to size ffmpeg -threads.
+    """
+    queues = options.get("queues") or TASK_QUEUES
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    if not settings.encode_autotune or "encode" not in queues:
+        return
+
+    slots = options.get("concurrency") or autotune.encode_slots()
+    if not options.get("concurrency"):
+        conf.worker_concurrency = slots
+    autotune.set_worker_slots(slots)
+    logger.info(f"Encode worker {sender}: {slots} concurrent encodes")
@@ -0,0 +1,185 @@
+# /backend/app/core/autotune.py
+"""
+Sizes encode work to the machine it runs on.
+
+- encode_slots():   concurrent encodes per worker, from usable CPUs (affinity + cgroup quota)
+                    and available memory. Applied as the encode worker's concurrency at startup.
+- encode_threads(): ffmpeg -threads for one encode, from the rung's pixel rate and this
+                    slot's share of the CPUs, halved when memory runs low.
+
+Every decision is logged and exported to the Redis hash autotune:<hostname>
+(best effort - a Redis error never fails a task).
+"""
+
+from typing import Iterable, Optional, Tuple
+import json
+import math
+import os
+import socket
+import time
+import logging
+
+import redis
+
+from app.core.config import get_settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+AUTOTUNE_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_FRAME_RATE = 30.0
+# x264 runs ~1.5 threads per core by default: frame threads wait on each other's rows
+THREAD_OVERSUBSCRIPTION = 1.5
+
+# Encode slots of this worker process (set by the encode worker at startup, inherited by its pool)
+_worker_slots: Optional[int] = None
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_quota() -> Optional[float]:
+    """CPUs allowed by the cgroup (docker --cpus), or None if unlimited"""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+
+    # cgroup v1: quota is -1 when unlimited
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def usable_cpus() -> float:
+    """CPUs this process may run on: affinity mask, capped by the cgroup quota"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    quota = cgroup_cpu_quota()
+    return min(cpus, quota) if quota else float(cpus)
+
+
+def available_memory() -> Optional[int]:
+    """Bytes that can still be allocated: MemAvailable, capped by the cgroup's headroom"""
+    candidates = []
+
+    meminfo = _read("/proc/meminfo")
+    if meminfo:
+        for line in meminfo.splitlines():
+            if line.startswith("MemAvailable:"):
+                candidates.append(int(line.split()[1]) * 1024)
+                break
+
+    # cgroup v2, then v1 (an unlimited v1 limit is a huge number, so min() ignores it)
+    limit = _read("/sys/fs/cgroup/memory.max")
+    usage = _read("/sys/fs/cgroup/memory.current")
+    if limit is None:
+        limit = _read("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+        usage = _read("/sys/fs/cgroup/memory/memory.usage_in_bytes")
+    if limit and usage and limit != "max":
+        candidates.append(max(0, int(limit) - int(usage)))
+
+    return min(candidates) if candidates else None
+
+
+def export_decision(field: str, decision: dict):
+    """Log a decision and store it under autotune:<hostname> for operators / dashboards"""
+    logger.info(f"Autotune {field}: {decision}")
+    try:
+        key = f"autotune:{socket.gethostname()}"
+        pipe = get_redis().pipeline()
+        pipe.hset(key, field, json.dumps({**decision, "at": time.time()}))
+        pipe.expire(key, AUTOTUNE_TTL_SECONDS)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Autotune export failed: {str(e)}")
+
+
+def encode_slots() -> int:
+    """
+    Concurrent encodes for this node.
+    - settings.encode_concurrency wins when set (> 0)
+    - else one slot per encode_threads_per_slot CPUs, capped by memory
+    """
+    if settings.encode_concurrency > 0:
+        export_decision("encode_slots", {"slots": settings.encode_concurrency, "limited_by": "config"})
+        return settings.encode_concurrency
+
+    cpus = usable_cpus()
+    by_cpu = max(1, int(cpus // settings.encode_threads_per_slot))
+
+    memory = available_memory()
+    by_memory = None
+    if memory is not None:
+        by_memory = max(1, memory // (settings.encode_memory_per_slot_mb * 1024 * 1024))
+
+    slots = min(by_cpu, by_memory) if by_memory else by_cpu
+    export_decision("encode_slots", {
+        "slots": slots,
+        "cpus": round(cpus, 2),
+        "cgroup_quota": cgroup_cpu_quota(),
+        "memory_available_mb": memory // (1024 * 1024) if memory is not None else None,
+        "limited_by": "memory" if by_memory and by_memory < by_cpu else "cpu",
+    })
+    return slots
+
+
+def set_worker_slots(slots: int):
+    global _worker_slots
+    _worker_slots = slots
+
+
+def encode_threads(
+    rungs: Iterable[Tuple[int, int]],
+    frame_rate: Optional[float] = None,
+    label: str = "encode"
+) -> int:
+    """
+    ffmpeg -threads for one encode.
+
+    Args:
+        rungs: (width, height) of every output this ffmpeg process encodes
+        frame_rate: Source frame rate (defaults to 30)
+        label: Name used in the exported decision (e.g. "720p", "ladder")
+    """
+    if not settings.encode_autotune:
+        return settings.FFMPEG_THREADS
+
+    pixel_rate = sum(width * height for width, height in rungs) * (frame_rate or DEFAULT_FRAME_RATE)
+    wanted = max(1, math.ceil(pixel_rate / settings.encode_pixels_per_thread))
+
+    cpus = usable_cpus()
+    if _worker_slots is None:
+        set_worker_slots(encode_slots())
+    share = max(1, math.ceil(cpus / _worker_slots * THREAD_OVERSUBSCRIPTION))
+    threads = min(wanted, share, settings.encode_max_threads)
+
+    # Every x264 frame thread holds its own frames in flight
+    memory = available_memory()
+    low_memory = memory is not None and memory < settings.encode_memory_per_slot_mb * 1024 * 1024
+    if low_memory:
+        threads = max(1, threads // 2)
+
+    export_decision(f"threads:{label}", {
+        "threads": threads,
+        "wanted": wanted,
+        "slot_share": share,
+        "pixel_rate": int(pixel_rate),
+        "low_memory": low_memory,
+    })
+    return threads
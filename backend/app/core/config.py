@@ -2,6 +2,7 @@
 from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+from typing import Optional
 
 class Settings(BaseSettings):
     # Async URL (postgresql+asyncpg://) — used if you ever add async SQLAlchemy queries
@@ -25,7 +26,63 @@ class Settings(BaseSettings):
     }
     # NOTE: no trailing comma after the value — "= 1," makes Python read it as a tuple (1,)
     # which then fails Pydantic's int validation. This was causing the FFMPEG_THREADS error.
-    FFMPEG_THREADS: int = 2
+    FFMPEG_THREADS: int = 2  # used as-is when encode_autotune is off
+    # Encode autotuning (app/core/autotune.py): per-encode threads from the rung's pixel rate,
+    # encode worker concurrency from the CPUs / cgroup quota / memory of the node
+    encode_autotune: bool = True
+    encode_concurrency: int = 0                    # fixed encode slots per worker (0 = autotune)
+    encode_threads_per_slot: int = 2               # CPUs budgeted per concurrent encode
+    encode_memory_per_slot_mb: int = 1024          # memory budgeted per concurrent encode
+    encode_pixels_per_thread: int = 14_000_000     # px/s one x264 thread is given (~720p30 on 2 threads)
+    encode_max_threads: int = 16
+    # Rate control is capped CRF: encode_crf sets the quality, the rung bitrate is only a ceiling
+    encode_crf: int = 23
+    # Per-title ladder: plan_ladder probes how hard each title is to compress (CRF encodes of
+    # a few short samples) and lowers the QUALITY_SETTINGS bitrates / drops redundant rungs
+    per_title_ladder: bool = True
+    ladder_probe_samples: int = 4
+    ladder_probe_sample_seconds: int = 4
+    ladder_probe_max_height: int = 720    # probe resolution (source height if lower)
+    ladder_bitrate_headroom: float = 1.5  # rung cap over the CRF average bitrate
+    ladder_min_bitrate_ratio: float = 0.2 # floor, as a fraction of the QUALITY_SETTINGS bitrate
+    ladder_min_step_ratio: float = 1.4    # a rung must need this much more bitrate than the one below
+    # "per_quality"   -> one transcode_quality task (and one ffmpeg decode) per rung
+    # "single_decode" -> one transcode_ladder task decodes the source once and encodes every rung
+    # "chunked"       -> prepare_video cuts the source into keyframe-aligned chunks and every
+    #                      (chunk, quality) pair is encoded as its own task, then stitched back
+    transcode_mode: str = "per_quality"
+    # Target chunk length for "chunked" mode (cuts land on the next keyframe after this)
+    transcode_chunk_seconds: int = 60
+    # When True the transcoders write HLS segments + media playlist directly (GOPs forced on
+    # segment boundaries), so no transcoded/*.mp4 intermediates and no segment_videos pass
+    hls_direct_output: bool = False
+    hls_segment_seconds: int = 6  # Apple recommendation
+    # "mpegts" -> segment_NNNN.ts (HLS only)
+    # "fmp4"   -> CMAF-style init.mp4 + segment_NNNN.m4s, served to HLS (EXT-X-MAP) and DASH
+    #             (manifest.mpd) from the same objects. segment_videos packages audio once in
+    #             its own audio/ rendition; direct HLS output keeps audio muxed in every rung.
+    hls_segment_type: str = "mpegts"
+    # One media file per rendition (media.ts / media.m4s) addressed by EXT-X-BYTERANGE, instead of
+    # hundreds of segment objects: a few large multipart uploads per title. Players fetch segments
+    # with HTTP Range requests, which MinIO serves directly.
+    hls_single_file: bool = False
+    # Trickplay (create_trickplay): one decode of a low rung samples a frame every
+    # trickplay_interval_seconds into an I-frame-only rendition (EXT-X-I-FRAME-STREAM-INF)
+    # and JPEG sprite sheets indexed by a WebVTT file, stored next to the HLS output
+    trickplay_enabled: bool = True
+    trickplay_interval_seconds: int = 5
+    trickplay_iframe_height: int = 360    # decodes the smallest rung at least this tall
+    trickplay_tile_width: int = 160
+    trickplay_sprite_columns: int = 10
+    trickplay_sprite_rows: int = 10
+    # Every stage after prepare_video works in processing_temp_dir/<video_id> on the worker that
+    # ran prepare_video. How later stages find that scratch dir:
+    # "host_queue" -> the rest of the pipeline is routed to a queue only that host consumes
+    # "minio_sync" -> stages run anywhere and sync the scratch dir through MinIO (scratch/<video_id>/)
+    # "none"       -> no routing (single worker, or a scratch dir on a shared volume)
+    scratch_affinity: str = "host_queue"
+    # Workers sharing one scratch volume should share this ID (default: the hostname)
+    scratch_host_id: Optional[str] = None
 
     # JWT Settings
     jwt_secret_key: str
@@ -46,6 +103,94 @@ class Settings(BaseSettings):
     minio_bucket_thumbnails: str
     minio_bucket_processed_videos: str
     minio_secure: bool = False  # True in production with HTTPS
+    # Host[:port] browsers use to reach MinIO. Presigned URLs are signed for this host,
+    # so it must be the public one (defaults to minio_endpoint for local dev).
+    minio_public_endpoint: Optional[str] = None
+    minio_public_secure: Optional[bool] = None  # defaults to minio_secure
+    minio_region: str = "us-east-1"  # fixed so signing never needs a region lookup
+    # Bulk uploads of HLS output (MinIOService.upload_files)
+    minio_upload_concurrency: int = 8       # parallel PUTs per upload_files call
+    minio_upload_max_retries: int = 3       # retries per object after the first attempt
+    minio_upload_retry_backoff: float = 0.5 # seconds, doubled after every failed attempt
+    minio_upload_resume: bool = True        # skip objects already stored with same size/ETag
+    # Objects above this size (single-file renditions) go up as multipart uploads of this part size
+    minio_upload_part_size: int = 64 * 1024 * 1024
+    minio_upload_part_concurrency: int = 4  # parallel parts per multipart object
+    # Raw source downloads (MinIOService.download_video_to_file)
+    minio_download_part_size: int = 16 * 1024 * 1024  # bytes per ranged GET
+    minio_download_concurrency: int = 8               # parallel ranged GETs
+    # Streaming input: ffprobe/ffmpeg read the raw upload from a presigned URL instead of a
+    # local copy. Other extensions (and sources that fail to probe over HTTP) are downloaded.
+    stream_source_input: bool = False
+    stream_source_extensions: list = [".mp4", ".m4v", ".mov", ".mkv", ".webm", ".ts"]
+    # Each task signs its own URL; it has to outlive one encode (task_time_limit is 1 hour)
+    stream_source_url_expiry_minutes: int = 70
+    # Content-hash dedup: a new upload whose SHA-256 matches a completed video reuses its
+    # HLS output instead of running the pipeline again. Uploads through the API are hashed
+    # on the way in; direct/resumable uploads are hashed by prepare_video from the local copy.
+    # With stream_source_input that would mean reading the whole source before encoding, so
+    # a streamed source is hashed by a hash_source task alongside the pipeline instead: it is
+    # always encoded itself, and only later uploads of the same content are deduplicated.
+    content_dedup_enabled: bool = True
+    # Live progress (Redis): minimum seconds between ffmpeg percent updates per task
+    progress_report_interval_seconds: float = 2.0
+    # Status reads ignore an in-flight progress snapshot this old and read Postgres instead.
+    # Longer than any stage runs without an update (task_time_limit is 1 hour).
+    progress_stale_seconds: int = 90 * 60
+    # Processing scheduler (app/tasks/scheduler.py)
+    processing_max_jobs_per_user: int = 2  # pipelines in flight per uploader, the rest wait (<= 0: no cap)
+    # A slot is freed anyway if its pipeline never reports completed/failed (e.g. killed worker)
+    processing_slot_timeout_seconds: int = 6 * 60 * 60
+    processing_slot_sweep_seconds: int = 5 * 60  # reap_processing_slots interval (Celery beat)
+    # Celery priority 1..9 (lower runs first): one step per bucket the source passes
+    processing_priority_duration_buckets: list = [60, 300, 900, 1800, 3600]  # seconds
+    processing_priority_size_buckets_mb: list = [50, 200, 500, 1000, 4000]   # used when duration is unknown too
+
+    # Playback (app/services/playback_service.py): the API serves the playlists with presigned
+    # segment URLs. Tokens and URLs are signed per window, so all viewers of a window share one
+    # cached playlist; a URL stays valid 1-2 windows after it is handed out, which has to cover
+    # a viewing session (VOD players fetch a media playlist once).
+    playback_url_window_seconds: int = 2 * 60 * 60
+    playback_cache_entries: int = 1024  # rewritten playlists kept in process memory (LRU)
+    # "presigned" -> playlists point segments at MinIO (presigned URLs)
+    # "cache"     -> segments are served by the API from the local disk cache (app/services/segment_cache.py)
+    playback_segment_delivery: str = "presigned"
+    segment_cache_dir: str = base_dir + "/tmp" + "/segment_cache"  # one per API process
+    segment_cache_max_bytes: int = 10 * 1024 * 1024 * 1024
+    segment_cache_fetch_timeout_seconds: float = 30.0  # how long a coalesced miss waits for the download
+    # Evicted files are unlinked once no response holds them and this long after they were last
+    # handed out (X-Accel-Redirect: the proxy opens the file after the API has answered)
+    segment_cache_unlink_grace_seconds: float = 60.0
+    # Single-file renditions (hls_single_file) larger than this are proxied from MinIO per Range request
+    segment_cache_max_object_bytes: int = 64 * 1024 * 1024
+    # Internal location the reverse proxy maps to segment_cache_dir. When set, cached files are
+    # sent by the proxy (sendfile) via X-Accel-Redirect instead of streamed by the API.
+    segment_cache_accel_redirect: Optional[str] = None
+    # Predictive prefetch (app/services/prefetch_service.py, cache delivery only): after serving
+    # segment N, download the next segments of the rendition and of the neighbouring rung
+    prefetch_enabled: bool = True
+    prefetch_segments: int = 3              # ahead in the viewer's current rendition
+    prefetch_neighbour_segments: int = 1    # ahead in the rung the viewer would switch to
+    prefetch_bandwidth_mbps: float = 200.0  # MinIO bandwidth prefetch may use per API process
+    prefetch_workers: int = 4
+    prefetch_session_idle_seconds: int = 120
+
+    # View counts (app/services/view_counter.py): plays are counted in Redis and flushed to
+    # videos.views_count by the flush_view_counts beat task
+    view_flush_interval_seconds: int = 30
+    view_flush_batch_size: int = 1000  # videos per UPDATE ... FROM (VALUES ...)
+    view_flush_lock_seconds: int = 300
+    view_unique_ttl_seconds: int = 30 * 24 * 60 * 60  # unique-viewer HLL kept this long after the last play
+    # Admin video list with count=estimated: filtered counts are reused for this long
+    admin_count_cache_seconds: int = 60
+
+    # Direct-to-storage uploads (browser PUTs parts straight to MinIO)
+    upload_part_size: int = 16 * 1024 * 1024           # S3 minimum is 5 MB (except the last part)
+    upload_max_video_size: int = 20 * 1024 * 1024 * 1024  # 20 GB
+    upload_session_ttl_minutes: int = 360               # session + presigned part URL lifetime
+    # API-side storage I/O (put_object/stat_object from request handlers) runs here,
+    # separate from the threadpool FastAPI uses for sync routes and DB work
+    storage_io_threads: int = 16
 
     # Redis Settings
     redis_host: str
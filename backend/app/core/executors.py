@@ -0,0 +1,44 @@
+# app/core/executors.py
+"""
+Thread pools for blocking work that is called from async code.
+
+The MinIO client is synchronous. Calling it directly from an `async def`
+handler blocks the event loop - one large upload stalls every other request
+on that worker, /health included. Storage calls from async code go through
+run_storage_io instead, on a dedicated pool, so a burst of uploads can't
+use up the threadpool that sync routes and their DB sessions run on.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+
+from app.core.config import get_settings
+
+
+settings = get_settings()
+
+
+storage_executor = ThreadPoolExecutor(
+    max_workers=settings.storage_io_threads,
+    thread_name_prefix="storage-io"
+)
+
+
+async def run_storage_io(func, *args, **kwargs):
+    """Run a blocking storage call on the storage pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(storage_executor, partial(func, *args, **kwargs))
+
+
+def call_storage_io(func, *args, **kwargs):
+    """
+    Same as run_storage_io, for sync code already running on the threadpool
+    (a handler that mixes DB work with a storage call): blocks until it is done
+    """
+    return storage_executor.submit(partial(func, *args, **kwargs)).result()
+
+
+def shutdown_executors():
+    """Called from the app lifespan on shutdown"""
+    storage_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,39 @@
+# app/core/redis_client.py
+"""
+Shared Redis connection for the API process.
+
+Celery already uses Redis as its broker; the API uses the same instance for
+short-lived state that doesn't belong in Postgres (upload sessions, progress, caches).
+"""
+
+from functools import lru_cache
+import redis
+import redis.asyncio
+from app.core.config import get_settings
+
+
+settings = get_settings()
+
+
+# lru_cache: one client (and one connection pool) per process, like get_settings()
+@lru_cache
+def get_redis() -> redis.Redis:
+    return redis.Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        password=settings.redis_password,
+        db=settings.redis_db,
+        decode_responses=True
+    )
+
+
+@lru_cache
+def get_async_redis() -> redis.asyncio.Redis:
+    """Async client for long-lived async endpoints (progress streams)"""
+    return redis.asyncio.Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        password=settings.redis_password,
+        db=settings.redis_db,
+        decode_responses=True
+    )
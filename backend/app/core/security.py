@@ -68,7 +68,7 @@ def verify_password(plain_password:str, hashed_password:str)->bool:
 
 
 
-async def get_current_user(
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
@@ -10,9 +10,10 @@ from fastapi.middleware.cors import CORSMiddleware
 # Database
 from app.models import User, Video
 from app.core.database import engine, Base
+from app.core.executors import shutdown_executors
 
 # Routers
-from app.apis.routes import auth_router, healthRouter, video_router, user_router
+from app.apis.routes import auth_router, healthRouter, video_router, user_router, playback_router
 
 # Helpers
 from app.utils.origin_helpers import parse_origins
@@ -58,8 +59,8 @@ async def lifespan(app: FastAPI):
     # but called in the right place — after the app is initialized, not at import time.
     Base.metadata.create_all(bind=engine)
     yield
-    # Shutdown: nothing needed here for now, but this is where you'd
-    # close connection pools, flush caches, etc. if required later.
+    # Shutdown: stop the storage I/O pool (see app/core/executors.py)
+    shutdown_executors()
 
 
 # App setup
@@ -77,6 +78,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Upload-Offset", "Upload-Length"],  # resumable uploads read these
 )
 
 # Include routers
@@ -84,6 +86,7 @@ app.include_router(healthRouter)
 app.include_router(auth_router)
 app.include_router(video_router)
 app.include_router(user_router)
+app.include_router(playback_router)
 
 
 # Default route
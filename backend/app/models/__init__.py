@@ -5,5 +5,6 @@ from app.models.videos import Video
 from app.models.tokens import RefreshToken
 from app.models.email_verification import EmailVerificationToken
 from app.models.password_reset import PasswordResetToken
+from app.models.view_flush import ViewFlush
 
-__all__ = ["User", "Video", "UserRole","RefreshToken","EmailVerificationToken","PasswordResetToken"]
\ No newline at end of file
+__all__ = ["User", "Video", "UserRole","RefreshToken","EmailVerificationToken","PasswordResetToken","ViewFlush"]
\ No newline at end of file
@@ -1,5 +1,5 @@
 # /app/models/videos.py 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date, JSON, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 import uuid
@@ -22,6 +22,7 @@ class Video(Base):
     # MinIo paths for raw upload 
     raw_video_path = Column(String(500), nullable=False)
     thumbnail_url = Column(String(500), nullable=True)
+    content_sha256 = Column(String(64), nullable=True, index=True)  # SHA-256 of the raw upload, for dedup
     
     # Video Metadata
     # will extract this from video itself , duration = Column(Integer, nullable=True)  # Duration in minutes
@@ -80,4 +81,10 @@ class Video(Base):
     user_id = Column(String(100), ForeignKey("users.id"), nullable=False, index=True)
     
     # Relationship
-    user = relationship("User", back_populates="videos")
\ No newline at end of file
+    user = relationship("User", back_populates="videos")
+
+    # Keyset pagination (app/utils/pagination.py): listings page on (created_at, id)
+    __table_args__ = (
+        Index("ix_videos_created_at_id", "created_at", "id"),
+        Index("ix_videos_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
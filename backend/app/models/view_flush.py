@@ -0,0 +1,22 @@
+# app/models/view_flush.py
+"""
+Ledger of applied view-count flushes (app/services/view_counter.py).
+
+Each flush of the Redis buffer inserts its flush ID in the same transaction as
+its UPDATEs, so a batch that is retried after its commit went through (lock
+expired mid-flush, Redis cleanup failed) is recognised and not counted twice.
+Rows older than a day are pruned by the flush itself.
+"""
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class ViewFlush(Base):
+    __tablename__ = "view_flushes"
+
+    id = Column(String(32), primary_key=True)  # flush ID (views:flushing:id)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ViewFlush(id={self.id}, applied_at={self.applied_at})>"
@@ -20,6 +20,25 @@ class VideoMetadata(BaseModel):
     tags: Optional[List[str]] = None
 
 
+class UploadSessionCreate(BaseModel):
+    """Start a direct-to-storage upload: the browser PUTs the file parts to MinIO itself"""
+    filename: str = Field(..., min_length=1, max_length=255)
+    content_type: str
+    file_size: int = Field(..., gt=0)  # bytes, decides how many part URLs are issued
+    metadata: VideoMetadata
+    thumbnail_content_type: Optional[str] = None  # set to also get a thumbnail PUT URL
+
+
+class UploadPartETag(BaseModel):
+    """ETag header MinIO returned for one uploaded part"""
+    part_number: int = Field(..., ge=1, le=10000)
+    etag: str
+
+
+class UploadSessionComplete(BaseModel):
+    parts: List[UploadPartETag] = Field(..., min_length=1)
+
+
 class VideoFFmpegMetadata(BaseModel):
     duration_seconds: Optional[float] = None
     width: Optional[int] = None
@@ -76,6 +95,7 @@ class VideoResponse(BaseModel):
     cast: Optional[List[str]]=None
     tags: Optional[List[str]]
     views_count: int
+    unique_viewers: Optional[int] = None  # HyperLogLog estimate (app/services/view_counter.py)
     likes_count: int
     is_public: bool
     status: str
@@ -153,10 +173,17 @@ class PaginatedResponse(BaseModel, Generic[T]):
     total: int          # Total count in DB
     skip: int           # Current offset
     limit: int          # Page size
-    
-    @property
-    def has_more(self) -> bool:
-        return self.skip + self.limit < self.total
+    has_more: bool
+    total_is_estimate: bool = False     # count=estimated
+    next_cursor: Optional[str] = None   # pass as ?cursor= for the next page (sort_by=created_at)
+
+
+class CursorPage(BaseModel, Generic[T]):
+    """Keyset-paginated list: follow next_cursor until it is null"""
+    items: List[T]
+    limit: int
+    next_cursor: Optional[str] = None
+    has_more: bool
 
 
 class VideoList(BaseModel):
@@ -176,11 +203,62 @@ class VideoList(BaseModel):
 
 
 
+class UploadPartURL(BaseModel):
+    part_number: int
+    url: str
+
+
+class UploadSessionResponse(BaseModel):
+    """Everything the browser needs to upload straight to storage"""
+    session_id: str
+    object_name: str
+    part_size: int
+    parts: List[UploadPartURL]
+    thumbnail_upload_url: Optional[str] = None
+    expires_at: datetime
+
+
+class ResumableUploadResponse(BaseModel):
+    """Offset-based upload through the API: PATCH chunk_size slices starting at offset"""
+    session_id: str
+    object_name: str
+    chunk_size: int
+    offset: int
+    file_size: int
+    thumbnail_upload_url: Optional[str] = None
+    expires_at: datetime
+
+
+class ResumableUploadStatus(BaseModel):
+    session_id: str
+    offset: int  # bytes committed so far - resume from here
+    file_size: int
+    completed: bool = False
+    video_id: Optional[str] = None  # set once the last chunk created the video
+
+
+
 class VideoProcessingStatusResponse(BaseModel):
     video_id: str
     status: ProcessingStatus
     progress: int = Field(ge=0, le=100)
+    stage_progress: Optional[int] = Field(None, ge=0, le=100)  # percent of the current stage, when known
     message: str
     error: Optional[str] = None
     is_completed: bool
-    is_failed: bool
\ No newline at end of file
+    is_failed: bool
+
+
+class ProcessingExpediteResponse(BaseModel):
+    """Admin override of the processing scheduler"""
+    video_id: str
+    state: str  # "running" - dispatched now, or already in flight with priority raised for later stages
+    priority: int
+    celery_task_id: Optional[str] = None
+
+class PlaybackSessionResponse(BaseModel):
+    """Where to play a video from - the URLs carry their own access token"""
+    video_id: str
+    manifest_url: str  # master.m3u8 served by the API, segments are presigned storage URLs
+    trickplay_vtt_url: Optional[str] = None
+    expires_at: datetime
@@ -3,11 +3,17 @@ FFmpeg/FFprobe utilities for video processing.
 """
 
 import os
+import re
+import math
+import shutil
 import subprocess
+import tempfile
+import time
 import json
 import logging
-from typing import Optional
+from typing import Optional, Tuple
 from dataclasses import dataclass
+import xml.etree.ElementTree as ET
 
 logger = logging.getLogger(__name__)
 
@@ -41,12 +47,43 @@ class VideoMetadata:
         }
     
 
+def is_remote_input(source: str) -> bool:
+    """True when the source is a URL (streaming input) rather than a local file."""
+    return source.startswith(("http://", "https://"))
+
+
+def build_input_args(source: str) -> list:
+    """
+    FFmpeg input arguments for a local path or a presigned URL.
+
+    For URLs the HTTP protocol is told to reconnect (with a Range request from
+    the last position) if the storage connection drops mid-encode.
+    """
+    if is_remote_input(source):
+        return [
+            '-reconnect', '1',
+            '-reconnect_streamed', '1',
+            '-reconnect_on_network_error', '1',
+            '-reconnect_delay_max', '10',
+            '-i', source,
+        ]
+    return ['-i', source]
+
+
+def format_command_for_log(cmd: list) -> str:
+    """Join an FFmpeg command for logging, dropping presigned URL query strings (credentials)."""
+    return ' '.join(
+        arg.split('?', 1)[0] + '?<signed>' if is_remote_input(arg) and '?' in arg else arg
+        for arg in cmd
+    )
+
+
 def extract_metadata(file_path:str) ->VideoMetadata:
     """
         Extract video metadata using FFprobe.
         
         Args:
-            file_path: Path to local video file
+            file_path: Path to local video file, or a presigned URL
             
         Returns:
             VideoMetadata object with all extracted info
@@ -63,7 +100,7 @@ def extract_metadata(file_path:str) ->VideoMetadata:
         file_path
     ]
     
-    logger.info(f"Running FFprobe on: {file_path}")
+    logger.info(f"Running FFprobe on: {format_command_for_log([file_path])}")
 
     try:
         result = subprocess.run(
@@ -164,4 +201,845 @@ def _parse_frame_rate(frame_rate_str: str) -> float:
             return float(num) / float(den)
         return float(frame_rate_str)
     except (ValueError, ZeroDivisionError):
-        return 0.0
\ No newline at end of file
+        return 0.0
+
+def parse_bitrate(bitrate: str) -> int:
+    """'5000k' / '5M' / '800000' -> bits per second"""
+    bitrate = str(bitrate).strip().lower()
+    if bitrate.endswith("k"):
+        return int(float(bitrate[:-1]) * 1000)
+    if bitrate.endswith("m"):
+        return int(float(bitrate[:-1]) * 1000 * 1000)
+    return int(float(bitrate))
+
+
+def format_bitrate(bits_per_second: float) -> str:
+    """bits per second -> '5000k' (FFmpeg / QUALITY_SETTINGS format)"""
+    return f"{max(1, round(bits_per_second / 1000))}k"
+
+
+def build_encode_args(q_settings: dict, threads: int, audio: bool = True, crf: int = 23) -> list:
+    """
+    Codec arguments for a single ladder rung.
+
+    Shared by transcode_quality, transcode_ladder and transcode_chunk so every
+    mode produces comparable renditions. Chunk encodes pass audio=False because
+    audio is encoded once, when the chunks are stitched back together.
+
+    Capped CRF: the encoder targets constant quality and the rung's bitrate is only
+    a ceiling (VBV maxrate, 2x buffer), so easy scenes don't burn the full bitrate.
+    """
+    maxrate = parse_bitrate(q_settings['bitrate'])
+    args = [
+        '-c:v', 'libx264',              # Video codec
+        '-threads', f'{threads}',       # Thread limit per encoder
+        '-preset', 'medium',            # Encoding speed
+        '-crf', f'{crf}',               # Quality (lower = better, 18-28 range)
+        '-maxrate', format_bitrate(maxrate),      # Bitrate ceiling
+        '-bufsize', format_bitrate(maxrate * 2),  # VBV buffer
+    ]
+    if audio:
+        args += [
+            '-c:a', 'aac',              # Audio codec
+            '-b:a', '128k',             # Audio bitrate
+        ]
+    else:
+        args.append('-an')
+    return args
+
+
+def measure_crf_bitrate(
+    source: str,
+    duration_seconds: float,
+    height: int,
+    work_dir: str,
+    crf: int = 23,
+    samples: int = 4,
+    sample_seconds: int = 4,
+    threads: int = 2
+) -> float:
+    """
+    Fast complexity probe: encode a few short samples spread over the source at a
+    fixed CRF (veryfast preset, scaled to `height`) and measure the bitrate that
+    quality needed. Static talking heads come out low, grainy action high.
+
+    veryfast spends somewhat more bits than the real (medium) encode, so the
+    estimate errs on the generous side.
+
+    Returns:
+        Average bitrate of the samples in bits per second
+
+    Raises:
+        Exception if an FFmpeg probe encode fails
+    """
+    sample_seconds = min(sample_seconds, duration_seconds) if duration_seconds else sample_seconds
+    if not duration_seconds or duration_seconds <= samples * sample_seconds:
+        starts = [0.0]
+    else:
+        # Centre of each of `samples` equal slices, skipping intros/credits at the very ends
+        starts = [
+            duration_seconds * (i + 0.5) / samples - sample_seconds / 2
+            for i in range(samples)
+        ]
+
+    total_bits = 0
+    total_seconds = 0.0
+    for start in starts:
+        with tempfile.NamedTemporaryFile(suffix=".mkv", dir=work_dir) as sample_file:
+            command = [
+                'ffmpeg',
+                '-y',
+                '-ss', f'{start:.2f}',
+                '-t', f'{sample_seconds}',
+                *build_input_args(source),
+                '-map', '0:v:0',
+                '-vf', f'scale=-2:{height}',
+                '-c:v', 'libx264',
+                '-preset', 'veryfast',
+                '-crf', f'{crf}',
+                '-threads', f'{threads}',
+                '-an',
+                sample_file.name
+            ]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise Exception(f"Complexity probe failed: {result.stderr[-500:]}")
+
+            total_bits += os.path.getsize(sample_file.name) * 8
+            total_seconds += sample_seconds
+
+    return total_bits / total_seconds
+
+
+def plan_per_title_ladder(
+    rungs: dict,
+    source_width: int,
+    source_height: int,
+    probe_height: int,
+    probe_bitrate: float,
+    detail_exponent: float,
+    headroom: float = 1.5,
+    min_bitrate_ratio: float = 0.2,
+    min_step_ratio: float = 1.4
+) -> dict:
+    """
+    Per-title bitrate caps from a complexity probe.
+
+    Each rung's bitrate is the probe bitrate scaled by pixel count,
+    (rung_pixels / probe_pixels) ** detail_exponent, times `headroom` (the cap sits
+    above the CRF average). The static bitrate is the ceiling, min_bitrate_ratio of
+    it the floor. Working up from the lowest rung, a rung is dropped when it would
+    need less than min_step_ratio times the bitrate of the last rung kept, or more than
+    1 / min_step_ratio of the top rung's: for soft or simple content the extra pixels
+    add no visible quality. The lowest and the highest rung are always kept, so the
+    output never tops out below the source resolution.
+
+    Args:
+        rungs: {quality: q_settings} for the candidate rungs (no upscaling)
+        probe_height: Height the probe encoded at
+        probe_bitrate: measure_crf_bitrate() result at probe_height
+        detail_exponent: How bitrate grows with resolution for this title
+            (~0.75 for detailed content, lower for soft / upscaled sources)
+
+    Returns:
+        {quality: "NNNk"} for the rungs to encode
+    """
+    probe_width = source_width * probe_height / source_height
+    probe_pixels = probe_width * probe_height
+
+    by_size = sorted(rungs.items(), key=lambda item: item[1]["width"] * item[1]["height"])
+    bitrates = []
+    for quality, q_settings in by_size:
+        ceiling = parse_bitrate(q_settings["bitrate"])
+        pixels = q_settings["width"] * q_settings["height"]
+        estimate = probe_bitrate * (pixels / probe_pixels) ** detail_exponent * headroom
+        bitrates.append((quality, min(max(estimate, ceiling * min_bitrate_ratio), ceiling)))
+
+    # The lowest rung (slowest connections) and the highest one (the source's resolution)
+    # are always kept; only the rungs in between are dropped
+    ladder = {}
+    last_kept = None
+    top_bitrate = bitrates[-1][1] if bitrates else None
+    for index, (quality, bitrate) in enumerate(bitrates):
+        intermediate = 0 < index < len(bitrates) - 1
+        if intermediate and bitrate < last_kept * min_step_ratio:
+            logger.info(f"[{quality}] Dropped from ladder - {format_bitrate(bitrate)} is too close to the rung below")
+            continue
+        if intermediate and top_bitrate < bitrate * min_step_ratio:
+            logger.info(f"[{quality}] Dropped from ladder - {format_bitrate(bitrate)} is too close to the top rung")
+            continue
+
+        ladder[quality] = format_bitrate(bitrate)
+        last_kept = bitrate
+
+    return ladder
+
+
+def detail_exponent(bitrate_full: float, bitrate_half: float, min_value: float = 0.3, max_value: float = 1.0) -> float:
+    """
+    How bitrate scales with pixel count, from two probes of the same samples
+    at full and half height (4x the pixels). Clamped to [min_value, max_value].
+    """
+    if bitrate_full <= 0 or bitrate_half <= 0:
+        return 0.75
+    return min(max(math.log(bitrate_full / bitrate_half) / math.log(4), min_value), max_value)
+
+
+def build_keyframe_args(segment_seconds: int) -> list:
+    """
+    Force an IDR frame on every segment boundary and disable scene-cut keyframes.
+
+    This makes every rung cut at exactly the same timestamps, which is what
+    lets the encoder write HLS segments directly and keeps rungs switchable.
+    """
+    return [
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+        '-sc_threshold', '0',
+    ]
+
+
+# Segment file extension per HLS segment type (settings.hls_segment_type)
+HLS_SEGMENT_EXTENSIONS = {"mpegts": ".ts", "fmp4": ".m4s"}
+# fMP4 init segment (EXT-X-MAP / DASH initialization), one per rendition directory
+HLS_INIT_SEGMENT = "init.mp4"
+# Single-file mode: the whole rendition in media.ts / media.m4s, segments addressed by EXT-X-BYTERANGE
+HLS_SINGLE_FILE_NAME = "media"
+
+
+def is_hls_segment(filename: str) -> bool:
+    """True for media segment files of either segment type (not playlists or init segments)."""
+    return filename.endswith(tuple(HLS_SEGMENT_EXTENSIONS.values()))
+
+
+def build_hls_output_args(
+    quality_dir: str,
+    segment_seconds: int,
+    segment_type: str = "mpegts",
+    single_file: bool = False
+) -> list:
+    """
+    HLS muxer arguments writing segments and the media playlist into quality_dir.
+
+    Used both when segmenting an existing MP4 (stream copy) and when the encoder
+    writes HLS directly.
+
+    segment_type "fmp4" writes CMAF-style fragmented MP4: an init.mp4 (referenced by
+    EXT-X-MAP) plus .m4s fragments, which a DASH MPD can reference as well.
+
+    single_file writes one media.ts / media.m4s per rendition and a playlist of
+    EXT-X-BYTERANGE entries into it (in fMP4 the init segment is the file's first range).
+    """
+    args = [
+        '-f', 'hls',                                 # Output format: HLS
+        '-hls_time', str(segment_seconds),           # Seconds per segment
+        '-hls_list_size', '0',                       # Include all segments in playlist
+    ]
+    if segment_type == "fmp4":
+        args += [
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', HLS_INIT_SEGMENT,
+        ]
+    extension = HLS_SEGMENT_EXTENSIONS[segment_type]
+    if single_file:
+        args += ['-hls_flags', 'single_file']
+        segment_filename = f"{HLS_SINGLE_FILE_NAME}{extension}"
+    else:
+        segment_filename = f"segment_%4d{extension}"
+    return args + [
+        '-hls_segment_filename', os.path.join(quality_dir, segment_filename),
+        os.path.join(quality_dir, "playlist.m3u8")
+    ]
+
+
+def build_ladder_command(
+    input_path: str,
+    rungs: list,
+    threads: int,
+    hls_segment_seconds: int = None,
+    crf: int = 23,
+    hls_segment_type: str = "mpegts",
+    hls_single_file: bool = False
+) -> list:
+    """
+    Build one FFmpeg command that decodes the source once and encodes every rung.
+
+    The decoded video is fanned out with a split filter, each branch is scaled
+    to its rung's resolution and mapped to its own output file.
+
+    Args:
+        input_path: Source video (local path or presigned URL)
+        rungs: List of (quality, q_settings, output_path) tuples. When
+            hls_segment_seconds is set, output_path is the rung's segment directory.
+        threads: Thread limit passed to each encoder
+        hls_segment_seconds: Write HLS directly with this segment length instead of MP4
+        crf: Quality target of every rung (see build_encode_args)
+        hls_segment_type: "mpegts" or "fmp4" (see build_hls_output_args)
+        hls_single_file: One byte-range media file per rung (see build_hls_output_args)
+
+    Returns:
+        FFmpeg argument list ready for subprocess
+    """
+    if not rungs:
+        raise ValueError("At least one rung is required")
+
+    split_labels = "".join(f"[s{i}]" for i in range(len(rungs)))
+    filters = [f"[0:v]split={len(rungs)}{split_labels}"]
+    for i, (_, q_settings, _) in enumerate(rungs):
+        filters.append(f"[s{i}]scale={q_settings['width']}:{q_settings['height']}[v{i}]")
+
+    cmd = [
+        'ffmpeg',
+        '-y',                           # Overwrite output files
+        *build_input_args(input_path),
+        '-filter_complex', ";".join(filters),
+    ]
+
+    for i, (_, q_settings, output_path) in enumerate(rungs):
+        cmd += ['-map', f'[v{i}]', '-map', '0:a?']
+        cmd += build_encode_args(q_settings, threads, crf=crf)
+        if hls_segment_seconds:
+            cmd += build_keyframe_args(hls_segment_seconds)
+            cmd += build_hls_output_args(output_path, hls_segment_seconds, hls_segment_type, hls_single_file)
+        else:
+            cmd.append(output_path)
+
+    return cmd
+
+
+# ffprobe profile name -> (profile_idc, constraint flags) for RFC 6381 avc1 codec strings
+AVC_PROFILES = {
+    "baseline": (0x42, 0xE0),               # x264 emits constrained baseline
+    "constrained baseline": (0x42, 0xE0),
+    "main": (0x4D, 0x40),
+    "extended": (0x58, 0x00),
+    "high": (0x64, 0x00),
+    "high 10": (0x6E, 0x00),
+    "high 4:2:2": (0x7A, 0x00),
+    "high 4:4:4 predictive": (0xF4, 0x00),
+}
+
+# ffprobe AAC profile -> mp4a object type
+AAC_OBJECT_TYPES = {"lc": 2, "he-aac": 5, "he-aacv2": 29}
+
+
+def probe_streams(file_path: str) -> dict:
+    """First video and audio stream of a file as ffprobe reports them ({} if absent)."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_streams", file_path],
+        capture_output=True,
+        text=True,
+        timeout=30
+    )
+    if result.returncode != 0:
+        raise Exception(f"FFprobe failed: {result.stderr}")
+
+    streams = {}
+    for stream in json.loads(result.stdout).get("streams", []):
+        streams.setdefault(stream.get("codec_type"), stream)
+    return {"video": streams.get("video", {}), "audio": streams.get("audio", {})}
+
+
+def codecs_attribute(video_stream: dict, audio_stream: dict) -> Optional[str]:
+    """
+    RFC 6381 CODECS value, e.g. "avc1.64001f,mp4a.40.2".
+
+    Returns None for codecs this can't describe - a wrong CODECS makes players
+    refuse the rendition, a missing one only makes them probe it.
+    """
+    codecs = []
+
+    if video_stream.get("codec_name") == "h264":
+        profile = AVC_PROFILES.get(str(video_stream.get("profile", "")).lower())
+        level = video_stream.get("level")
+        if not profile or not level or level < 0:
+            return None
+        codecs.append(f"avc1.{profile[0]:02x}{profile[1]:02x}{level:02x}")
+    elif video_stream:
+        return None
+
+    if audio_stream.get("codec_name") == "aac":
+        object_type = AAC_OBJECT_TYPES.get(str(audio_stream.get("profile", "")).lower())
+        if not object_type:
+            return None
+        codecs.append(f"mp4a.40.{object_type}")
+    elif audio_stream.get("codec_name") == "mp3":
+        codecs.append("mp4a.40.34")
+    elif audio_stream:
+        return None
+
+    return ",".join(codecs) or None
+
+
+def _parse_byterange(value: str, next_offset: int) -> Tuple[int, int]:
+    """EXT-X-BYTERANGE "<length>[@<offset>]" -> (offset, length); no offset continues the previous range"""
+    length, _, offset = value.partition("@")
+    return (int(offset) if offset else next_offset), int(length)
+
+
+def read_media_playlist(playlist_path: str) -> list:
+    """
+    (duration_seconds, segment_path, byterange) for every segment of an HLS media playlist.
+    byterange is (offset, length) for single-file playlists, None for one file per segment.
+    """
+    base_dir = os.path.dirname(playlist_path)
+    segments = []
+    duration = None
+    byterange = None
+    next_offset = 0
+    with open(playlist_path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            elif line.startswith("#EXT-X-BYTERANGE:"):
+                byterange = _parse_byterange(line[len("#EXT-X-BYTERANGE:"):], next_offset)
+                next_offset = sum(byterange)
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((duration, os.path.join(base_dir, line), byterange))
+                duration = None
+                byterange = None
+    return segments
+
+
+def read_init_segment(playlist_path: str) -> Optional[Tuple[str, Optional[Tuple[int, int]]]]:
+    """(path, byterange) of the playlist's EXT-X-MAP (fMP4 init segment), or None for MPEG-TS."""
+    with open(playlist_path) as f:
+        for line in f:
+            if not line.startswith("#EXT-X-MAP:"):
+                continue
+            attributes = dict(re.findall(r'([A-Z-]+)="([^"]*)"', line))
+            byterange = _parse_byterange(attributes["BYTERANGE"], 0) if "BYTERANGE" in attributes else None
+            return os.path.join(os.path.dirname(playlist_path), attributes["URI"]), byterange
+    return None
+
+
+def measure_hls_rendition(playlist_path: str) -> dict:
+    """
+    Measure what a rendition actually is, for its EXT-X-STREAM-INF line.
+
+    - bandwidth:         peak segment bitrate (segment bytes incl. TS overhead / EXTINF duration;
+                         the byte range's length in single-file playlists)
+    - average_bandwidth: all segment bytes / total duration
+    - width, height, frame_rate, codecs, channels: ffprobe of the first segment
+
+    Raises:
+        Exception if the playlist has no segments or ffprobe fails
+    """
+    segments = read_media_playlist(playlist_path)
+    if not segments:
+        raise Exception(f"No segments in {playlist_path}")
+
+    total_bits = 0
+    total_seconds = 0.0
+    peak = 0.0
+    for duration, segment_path, byterange in segments:
+        bits = (byterange[1] if byterange else os.path.getsize(segment_path)) * 8
+        total_bits += bits
+        total_seconds += duration
+        # Very short tail segments give meaningless rates - fold them into the average only
+        if duration >= 0.5:
+            peak = max(peak, bits / duration)
+
+    average = total_bits / total_seconds if total_seconds else 0
+
+    # An fMP4 fragment can't be probed on its own - prepend its init segment
+    # (a single-file rendition starts with it, so the file probes as is)
+    init = read_init_segment(playlist_path)
+    init_path = init[0] if init else None
+    if init_path and init_path != segments[0][1]:
+        with tempfile.NamedTemporaryFile(suffix=".mp4", dir=os.path.dirname(playlist_path)) as probe_file:
+            for path in (init_path, segments[0][1]):
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, probe_file)
+            probe_file.flush()
+            streams = probe_streams(probe_file.name)
+    else:
+        streams = probe_streams(segments[0][1])
+    video_stream = streams["video"]
+
+    return {
+        "playlist_path": playlist_path,
+        "bandwidth": math.ceil(max(peak, average)),
+        "average_bandwidth": math.ceil(average),
+        "duration": total_seconds,
+        "width": int(video_stream.get("width", 0)),
+        "height": int(video_stream.get("height", 0)),
+        "frame_rate": _parse_frame_rate(video_stream.get("avg_frame_rate") or video_stream.get("r_frame_rate", "0/1")),
+        "codecs": codecs_attribute(video_stream, streams["audio"]),
+        "channels": int(streams["audio"].get("channels") or 0) or None,
+    }
+
+
+def format_media_tag(audio: dict, group_id: str, uri: str) -> str:
+    """EXT-X-MEDIA tag for a separately packaged audio rendition (a measure_hls_rendition() result)"""
+    channels = f'CHANNELS="{audio["channels"]}",' if audio.get("channels") else ""
+    return (
+        f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{group_id}",NAME="default",'
+        f'DEFAULT=YES,AUTOSELECT=YES,{channels}URI="{uri}"'
+    )
+
+
+def format_stream_inf(rendition: dict, audio: Optional[dict] = None, audio_group: Optional[str] = None) -> str:
+    """
+    EXT-X-STREAM-INF tag for a measure_hls_rendition() result (attributes it couldn't
+    measure are left out). With a separate audio rendition, BANDWIDTH and CODECS
+    cover video + audio as the spec requires.
+    """
+    bandwidth = rendition["bandwidth"]
+    average = rendition.get("average_bandwidth")
+    codecs = rendition.get("codecs")
+    if audio:
+        bandwidth += audio["bandwidth"]
+        average = average + audio["average_bandwidth"] if average and audio.get("average_bandwidth") else None
+        codecs = f"{codecs},{audio['codecs']}" if codecs and audio.get("codecs") else None
+
+    attributes = [f"BANDWIDTH={bandwidth}"]
+    if average:
+        attributes.append(f"AVERAGE-BANDWIDTH={average}")
+    if codecs:
+        attributes.append(f'CODECS="{codecs}"')
+    if rendition.get("width") and rendition.get("height"):
+        attributes.append(f"RESOLUTION={rendition['width']}x{rendition['height']}")
+    if rendition.get("frame_rate"):
+        attributes.append(f"FRAME-RATE={rendition['frame_rate']:.3f}")
+    if audio and audio_group:
+        attributes.append(f'AUDIO="{audio_group}"')
+    return "#EXT-X-STREAM-INF:" + ",".join(attributes)
+
+
+def _segment_timeline(durations: list, timescale: int) -> ET.Element:
+    """<SegmentTimeline> with runs of equal durations folded into r="..."."""
+    timeline = ET.Element("SegmentTimeline")
+    previous = None
+    for duration in (round(d * timescale) for d in durations):
+        if previous is not None and duration == int(previous.get("d")):
+            previous.set("r", str(int(previous.get("r", "0")) + 1))
+        else:
+            previous = ET.SubElement(timeline, "S", {"d": str(duration)})
+    if len(timeline):
+        timeline[0].set("t", "0")
+    return timeline
+
+
+def _dash_representation(parent: ET.Element, rendition_id: str, rendition: dict, timescale: int):
+    attributes = {"id": rendition_id, "bandwidth": str(rendition["bandwidth"])}
+    if rendition.get("codecs"):
+        attributes["codecs"] = rendition["codecs"]
+    if rendition.get("width") and rendition.get("height"):
+        attributes["width"] = str(rendition["width"])
+        attributes["height"] = str(rendition["height"])
+    if rendition.get("frame_rate"):
+        attributes["frameRate"] = f"{rendition['frame_rate']:.3f}".rstrip("0").rstrip(".")
+
+    representation = ET.SubElement(parent, "Representation", attributes)
+    segments = read_media_playlist(rendition["playlist_path"])
+    durations = [duration for duration, _, _ in segments]
+
+    init = read_init_segment(rendition["playlist_path"])
+    if init and init[1]:
+        # Single file: one BaseURL, every segment is a byte range of it (ranges are inclusive)
+        ET.SubElement(representation, "BaseURL").text = f"{rendition_id}/{os.path.basename(init[0])}"
+        segment_list = ET.SubElement(representation, "SegmentList", {"timescale": str(timescale)})
+        init_offset, init_length = init[1]
+        ET.SubElement(segment_list, "Initialization", {"range": f"{init_offset}-{init_offset + init_length - 1}"})
+        segment_list.append(_segment_timeline(durations, timescale))
+        for _, _, (offset, length) in segments:
+            ET.SubElement(segment_list, "SegmentURL", {"mediaRange": f"{offset}-{offset + length - 1}"})
+        return
+
+    template = ET.SubElement(representation, "SegmentTemplate", {
+        "timescale": str(timescale),
+        "initialization": f"{rendition_id}/{HLS_INIT_SEGMENT}",
+        "media": f"{rendition_id}/segment_$Number%04d${HLS_SEGMENT_EXTENSIONS['fmp4']}",
+        "startNumber": "0",
+    })
+    template.append(_segment_timeline(durations, timescale))
+
+
+def build_dash_manifest(video_renditions: dict, audio_rendition: Optional[dict] = None, timescale: int = 1000) -> str:
+    """
+    DASH MPD (static, CMAF profile) over the same fMP4 segments the HLS playlists use.
+
+    Args:
+        video_renditions: {quality: measure_hls_rendition() result}, highest first.
+            Segments live in <quality>/init.mp4 + <quality>/segment_NNNN.m4s, or as
+            byte ranges of <quality>/media.m4s (single-file playlists, SegmentList)
+        audio_rendition: The shared audio track in audio/, when audio is packaged
+            separately. Without it the renditions are muxed (audio + video per segment).
+
+    Returns:
+        The MPD document as a string
+    """
+    duration = max(rendition["duration"] for rendition in video_renditions.values())
+    mpd = ET.Element("MPD", {
+        "xmlns": "urn:mpeg:dash:schema:mpd:2011",
+        "profiles": "urn:mpeg:dash:profile:isoff-live:2011,urn:mpeg:dash:profile:cmaf:2019",
+        "type": "static",
+        "mediaPresentationDuration": f"PT{duration:.3f}S",
+        "minBufferTime": "PT2S",
+    })
+    period = ET.SubElement(mpd, "Period", {"id": "0", "start": "PT0S"})
+
+    video_set = ET.SubElement(period, "AdaptationSet", {
+        "id": "0",
+        "mimeType": "video/mp4",
+        "segmentAlignment": "true",
+        "startWithSAP": "1",
+    })
+    if audio_rendition:
+        video_set.set("contentType", "video")
+    for quality, rendition in video_renditions.items():
+        _dash_representation(video_set, quality, rendition, timescale)
+
+    if audio_rendition:
+        audio_set = ET.SubElement(period, "AdaptationSet", {
+            "id": "1",
+            "contentType": "audio",
+            "mimeType": "audio/mp4",
+            "segmentAlignment": "true",
+            "startWithSAP": "1",
+        })
+        _dash_representation(audio_set, "audio", audio_rendition, timescale)
+
+    # isoff-live requires SegmentTemplate; byte-range SegmentLists fall under the main profile
+    if mpd.find(".//SegmentList") is not None:
+        mpd.set("profiles", "urn:mpeg:dash:profile:isoff-main:2011,urn:mpeg:dash:profile:cmaf:2019")
+
+    ET.indent(mpd)
+    return '<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(mpd, encoding="unicode") + "\n"
+
+
+# Trickplay sprite sheets (image2 numbering starts at 1)
+TRICKPLAY_SPRITE_PATTERN = "sprite_%03d.jpg"
+
+
+def build_trickplay_command(
+    input_path: str,
+    iframes_dir: str,
+    sprites_dir: str,
+    interval_seconds: int,
+    iframe_height: int,
+    tile_width: int,
+    columns: int,
+    rows: int,
+    threads: int
+) -> list:
+    """
+    One decode pass feeding both trickplay outputs, sampled every interval_seconds:
+
+    - iframes_dir: an all-intra H.264 rendition, one frame per byte range of a single
+      media.ts (the EXT-X-I-FRAME-STREAM-INF playlist, see mark_iframes_only)
+    - sprites_dir: JPEG sheets of columns x rows thumbnails, tile_width wide
+
+    Args:
+        input_path: A low rung of the ladder (its media playlist or MP4), not the source
+    """
+    filters = (
+        f"[0:v]fps=1/{interval_seconds},scale=-2:{iframe_height},split=2[i][t];"
+        f"[t]scale={tile_width}:-2,tile={columns}x{rows}[s]"
+    )
+    return [
+        'ffmpeg',
+        '-y',
+        '-i', input_path,
+        '-filter_complex', filters,
+        '-map', '[i]',
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-crf', '28',
+        '-g', '1',                 # every frame is an IDR frame
+        '-bf', '0',
+        '-threads', str(threads),
+        *build_hls_output_args(iframes_dir, interval_seconds, "mpegts", single_file=True),
+        '-map', '[s]',
+        '-q:v', '5',
+        os.path.join(sprites_dir, TRICKPLAY_SPRITE_PATTERN),
+    ]
+
+
+def mark_iframes_only(playlist_path: str):
+    """Turn a media playlist of one-frame byte ranges into an I-frame playlist (EXT-X-I-FRAMES-ONLY)"""
+    with open(playlist_path) as f:
+        lines = [line.rstrip("\n") for line in f]
+
+    lines = [line for line in lines if not line.startswith("#EXT-X-VERSION")]
+    # I-frame playlists need protocol version 4
+    lines[1:1] = ["#EXT-X-VERSION:4", "#EXT-X-I-FRAMES-ONLY"]
+    with open(playlist_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def format_iframe_stream_inf(rendition: dict, uri: str) -> str:
+    """EXT-X-I-FRAME-STREAM-INF tag for a measure_hls_rendition() result"""
+    attributes = [f"BANDWIDTH={rendition['bandwidth']}"]
+    if rendition.get("average_bandwidth"):
+        attributes.append(f"AVERAGE-BANDWIDTH={rendition['average_bandwidth']}")
+    if rendition.get("codecs"):
+        attributes.append(f'CODECS="{rendition["codecs"]}"')
+    if rendition.get("width") and rendition.get("height"):
+        attributes.append(f"RESOLUTION={rendition['width']}x{rendition['height']}")
+    attributes.append(f'URI="{uri}"')
+    return "#EXT-X-I-FRAME-STREAM-INF:" + ",".join(attributes)
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    return f"{hours:02d}:{minutes:02d}:{milliseconds // 1000:02d}.{milliseconds % 1000:03d}"
+
+
+def build_trickplay_vtt(durations: list, tile_width: int, tile_height: int, columns: int, rows: int) -> str:
+    """
+    WebVTT thumbnail index: one cue per sampled frame pointing at its tile
+    (sprite_NNN.jpg#xywh=x,y,w,h, relative to the .vtt).
+
+    Args:
+        durations: Seconds each sampled frame stands for, in order (the I-frame playlist's EXTINFs)
+    """
+    per_sheet = columns * rows
+    cues = ["WEBVTT", ""]
+    start = 0.0
+    for index, duration in enumerate(durations):
+        sheet, position = divmod(index, per_sheet)
+        row, column = divmod(position, columns)
+        cues += [
+            f"{_vtt_timestamp(start)} --> {_vtt_timestamp(start + duration)}",
+            f"{TRICKPLAY_SPRITE_PATTERN % (sheet + 1)}#xywh="
+            f"{column * tile_width},{row * tile_height},{tile_width},{tile_height}",
+            "",
+        ]
+        start += duration
+    return "\n".join(cues)
+
+
+def split_into_chunks(input_path: str, chunks_dir: str, chunk_seconds: int) -> list:
+    """
+    Cut the source video stream into keyframe-aligned chunks without re-encoding.
+
+    The segment muxer can only cut on keyframes when stream-copying, so each
+    chunk starts on the first keyframe at or after every chunk_seconds boundary.
+    Audio is dropped here and encoded once during the stitch step, which avoids
+    AAC priming gaps at chunk boundaries.
+
+    Returns:
+        Sorted list of chunk file paths
+    """
+    os.makedirs(chunks_dir, exist_ok=True)
+    chunk_pattern = os.path.join(chunks_dir, "chunk_%05d.mkv")
+
+    command = [
+        "ffmpeg",
+        "-y",
+        *build_input_args(input_path),
+        "-map", "0:v:0",
+        "-c", "copy",
+        "-an",
+        "-f", "segment",
+        "-segment_time", str(chunk_seconds),
+        "-reset_timestamps", "1",
+        chunk_pattern
+    ]
+
+    logger.info(f"Splitting {input_path} into ~{chunk_seconds}s chunks")
+
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Chunk split failed: {result.stderr[-500:]}")
+
+    chunks = sorted(
+        os.path.join(chunks_dir, f)
+        for f in os.listdir(chunks_dir)
+        if f.startswith("chunk_") and f.endswith(".mkv")
+    )
+
+    if not chunks:
+        raise Exception("Chunk split produced no chunks")
+
+    logger.info(f"Created {len(chunks)} chunks in {chunks_dir}")
+    return chunks
+
+
+def build_concat_command(
+    concat_list_path: str,
+    audio_source: str,
+    output_path: str,
+    hls_segment_seconds: int = None,
+    hls_segment_type: str = "mpegts",
+    hls_single_file: bool = False
+) -> list:
+    """
+    Build the FFmpeg command that joins encoded chunks without re-encoding video.
+
+    Video comes from the concat demuxer (stream copy), audio is taken from the
+    original source and encoded once so it stays continuous across chunks.
+    When hls_segment_seconds is set, output_path is a segment directory and the
+    joined stream is written as HLS directly.
+    """
+    cmd = [
+        'ffmpeg',
+        '-y',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', concat_list_path,
+        *build_input_args(audio_source),
+        '-map', '0:v:0',
+        '-map', '1:a:0?',
+        '-c:v', 'copy',
+        '-c:a', 'aac',
+        '-b:a', '128k',
+    ]
+    if hls_segment_seconds:
+        cmd += build_hls_output_args(output_path, hls_segment_seconds, hls_segment_type, hls_single_file)
+    else:
+        cmd.append(output_path)
+    return cmd
+
+
+def run_ffmpeg_with_progress(cmd: list, duration_seconds: float, on_progress=None, interval: float = 2.0) -> str:
+    """
+    Run an ffmpeg command with `-progress pipe:1` and report how far it got.
+
+    Args:
+        cmd: ffmpeg command as for subprocess.run (starting with 'ffmpeg')
+        duration_seconds: Source duration, to turn out_time into a percentage
+        on_progress: Called with percent done (0-100), at most once per `interval` seconds
+        
+    Returns:
+        ffmpeg's stderr output
+
+    Raises:
+        subprocess.CalledProcessError: Like subprocess.run(check=True), with stderr attached
+    """
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+    last_report = 0.0
+
+    # stderr goes to a file: with both pipes open, a chatty stderr could fill up and block ffmpeg
+    with tempfile.TemporaryFile(mode="w+") as stderr_file:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            # out_time_ms is in microseconds too (long-standing ffmpeg quirk)
+            if key not in ("out_time_us", "out_time_ms") or not on_progress or not duration_seconds:
+                continue
+            try:
+                seconds = int(value) / 1_000_000
+            except ValueError:
+                continue  # "N/A" before the first frame
+
+            now = time.monotonic()
+            if now - last_report >= interval:
+                last_report = now
+                on_progress(min(99.0, seconds / duration_seconds * 100))
+
+        returncode = process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+
+    if on_progress:
+        on_progress(100.0)
+    return stderr
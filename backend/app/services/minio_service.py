@@ -2,16 +2,81 @@
 
 from minio import Minio
 from minio.error import S3Error
+from minio.datatypes import Part
+from minio.deleteobjects import DeleteObject
 from app.core.config import get_settings
+from app.core.executors import run_storage_io
 from fastapi import UploadFile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import urllib3
+import certifi
+import hashlib
+import inspect
+import json
 import uuid
+import os
+import time
 import logging
-from datetime import timedelta
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+# Content-Type of processed output, so players (and range responses) get the right type
+OUTPUT_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".mpd": "application/dash+xml",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".jpg": "image/jpeg",
+    ".vtt": "text/vtt",
+}
+
+
+# Presigned multipart uploads need the upload ID / part calls minio-py keeps private.
+# Their signatures are checked here, so a minio upgrade that changes them fails at
+# import instead of in the middle of a user's upload (minio is pinned in requirements.txt).
+_MULTIPART_METHODS = {
+    "_create_multipart_upload": ["bucket_name", "object_name", "headers"],
+    "_upload_part": ["bucket_name", "object_name", "data", "headers", "upload_id", "part_number"],
+    "_complete_multipart_upload": ["bucket_name", "object_name", "upload_id", "parts"],
+    "_abort_multipart_upload": ["bucket_name", "object_name", "upload_id"],
+}
+
+
+def _check_multipart_api():
+    for name, expected in _MULTIPART_METHODS.items():
+        method = getattr(Minio, name, None)
+        params = list(inspect.signature(method).parameters)[1:] if method else None
+        if params != expected:
+            raise ImportError(
+                f"Installed minio does not provide Minio.{name}({', '.join(expected)}) "
+                f"(found {params}); install the version pinned in requirements.txt"
+            )
+
+
+_check_multipart_api()
+
+
+class HashingReader:
+    """File wrapper that hashes everything read through it (put_object only calls read)"""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        self._sha256.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
 class MinIOService:
     def __init__(self):
         logger.info("Initializing MinIO service")
@@ -22,7 +87,16 @@ class MinIOService:
                 settings.minio_endpoint,
                 access_key=settings.minio_access_key,
                 secret_key=settings.minio_secret_key,
-                secure=settings.minio_secure
+                secure=settings.minio_secure,
+                http_client=self._build_http_client()
+            )
+            # Signs URLs handed to browsers - public host, fixed region, never talks to MinIO
+            self.presign_client = Minio(
+                settings.minio_public_endpoint or settings.minio_endpoint,
+                access_key=settings.minio_access_key,
+                secret_key=settings.minio_secret_key,
+                secure=settings.minio_secure if settings.minio_public_secure is None else settings.minio_public_secure,
+                region=settings.minio_region
             )
             logger.info("MinIO client initialized successfully")
         except Exception as e:
@@ -32,6 +106,26 @@ class MinIOService:
         self._ensure_buckets_exists()
 
     
+    @staticmethod
+    def _build_http_client() -> urllib3.PoolManager:
+        """
+        Same defaults as the MinIO SDK, but with a connection pool large enough
+        for upload_files' worker threads and their multipart part uploads (the SDK
+        default of 10 would make extra threads open and discard connections).
+        """
+        timeout = timedelta(minutes=5).seconds
+        return urllib3.PoolManager(
+            timeout=urllib3.Timeout(connect=timeout, read=timeout),
+            maxsize=max(10, settings.minio_upload_concurrency * settings.minio_upload_part_concurrency),
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+            retries=urllib3.Retry(
+                total=5,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
+
     def _ensure_buckets_exists(self):
         """Create buckets if they don't exist"""
         logger.info("Checking MinIO buckets")
@@ -63,8 +157,14 @@ class MinIOService:
             self,
             file: UploadFile,
             user_id: str
-    ) -> str:
-        """Upload video file to MinIO"""
+    ) -> Tuple[str, str]:
+        """
+        Upload video file to MinIO.
+        The SHA-256 of the file is computed while put_object reads it (used for dedup).
+
+        Returns:
+            (object name, hex SHA-256 of the uploaded bytes)
+        """
         
         logger.info("=" * 60)
         logger.info("MinIO upload_video called")
@@ -104,10 +204,12 @@ class MinIOService:
             # Perform upload
             logger.info("Calling MinIO put_object")
             
-            result = self.client.put_object(
+            hashing_reader = HashingReader(file.file)
+            result = await run_storage_io(
+                self.client.put_object,
                 bucket_name=settings.minio_bucket_videos,
                 object_name=unique_filename,
-                data=file.file,
+                data=hashing_reader,
                 length=-1,
                 part_size=10*1024*1024,
                 content_type=file.content_type
@@ -117,7 +219,8 @@ class MinIOService:
             
             # Verify upload
             try:
-                stat = self.client.stat_object(
+                stat = await run_storage_io(
+                    self.client.stat_object,
                     bucket_name=settings.minio_bucket_videos,
                     object_name=unique_filename
                 )
@@ -126,10 +229,11 @@ class MinIOService:
                 logger.error(f"Verification failed: {str(e)}")
                 raise Exception(f"Upload succeeded but file not found: {str(e)}")
             
-            logger.info(f"Video upload successful: {unique_filename}")
+            content_sha256 = hashing_reader.hexdigest()
+            logger.info(f"Video upload successful: {unique_filename} (sha256 {content_sha256})")
             logger.info("=" * 60)
             
-            return unique_filename
+            return unique_filename, content_sha256
         
         except S3Error as e:
             logger.error("=" * 60)
@@ -178,7 +282,8 @@ class MinIOService:
             # Upload
             logger.info("Calling MinIO put_object for thumbnail")
             
-            self.client.put_object(
+            await run_storage_io(
+                self.client.put_object,
                 bucket_name=settings.minio_bucket_thumbnails,
                 object_name=unique_filename,
                 data=file.file,
@@ -200,12 +305,15 @@ class MinIOService:
              
 
     def upload_file(self, bucket_name: str, object_name: str, file_path: str):  
-        """Upload a local file to MinIO"""
+        """
+        Upload a local file to MinIO.
+        Files above settings.minio_upload_part_size go up as a multipart upload
+        (parts sent in parallel); the content type follows the extension.
+        """
         logger.info(f"Uploading file: {file_path} -> {bucket_name}/{object_name}")
         
         try:
             # Get file size
-            import os
             file_size = os.path.getsize(file_path)
             
             # Upload file
@@ -214,7 +322,12 @@ class MinIOService:
                     bucket_name=bucket_name,
                     object_name=object_name,
                     data=file_data,
-                    length=file_size
+                    length=file_size,
+                    content_type=OUTPUT_CONTENT_TYPES.get(
+                        os.path.splitext(file_path)[1].lower(), "application/octet-stream"
+                    ),
+                    part_size=settings.minio_upload_part_size,
+                    num_parallel_uploads=settings.minio_upload_part_concurrency
                 )
             
             logger.info(f"File uploaded successfully: {object_name}")
@@ -229,6 +342,330 @@ class MinIOService:
             raise Exception(f"Failed to upload file: {str(e)}")
 
 
+    def upload_files(
+            self,
+            bucket_name: str,
+            files: list,
+            max_workers: int = None,
+            max_retries: int = None,
+            resume: bool = None
+    ) -> dict:
+        """
+        Upload many local files concurrently through a bounded thread pool.
+
+        Every object is retried on its own with exponential backoff, so one
+        flaky PUT does not restart the whole batch. With resume enabled, objects
+        already stored with a matching size/ETag are skipped, which makes a
+        Celery retry of the calling task cheap.
+
+        Callers that need ordering (e.g. playlists after segments) should call
+        this once per wave - a call returns only when its whole batch is stored.
+
+        Args:
+            bucket_name: Target bucket
+            files: List of (file_path, object_name) tuples
+            max_workers: Parallel uploads (default settings.minio_upload_concurrency)
+            max_retries: Retries per object (default settings.minio_upload_max_retries)
+            resume: Skip objects already present (default settings.minio_upload_resume)
+
+        Returns:
+            {"uploaded": [object names], "skipped": [object names], "bytes": bytes sent}
+
+        Raises:
+            Exception if any object still fails after its retries
+        """
+        max_workers = max_workers or settings.minio_upload_concurrency
+        max_retries = settings.minio_upload_max_retries if max_retries is None else max_retries
+        resume = settings.minio_upload_resume if resume is None else resume
+
+        uploaded = []
+        skipped = []
+        failed = []
+        bytes_sent = 0
+
+        if not files:
+            return {"uploaded": uploaded, "skipped": skipped, "bytes": bytes_sent}
+
+        logger.info(f"Uploading {len(files)} files to {bucket_name} "
+                    f"(workers={max_workers}, retries={max_retries}, resume={resume})")
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="minio-upload") as executor:
+            futures = {
+                executor.submit(
+                    self._upload_file_with_retry,
+                    bucket_name, file_path, object_name, max_retries, resume
+                ): object_name
+                for file_path, object_name in files
+            }
+
+            for future in as_completed(futures):
+                object_name = futures[future]
+                try:
+                    was_uploaded, size = future.result()
+                except Exception as e:
+                    logger.error(f"Giving up on {object_name}: {str(e)}")
+                    failed.append((object_name, str(e)))
+                    continue
+
+                if was_uploaded:
+                    uploaded.append(object_name)
+                    bytes_sent += size
+                else:
+                    skipped.append(object_name)
+
+        logger.info(f"Batch done: {len(uploaded)} uploaded, {len(skipped)} skipped, "
+                    f"{len(failed)} failed, {bytes_sent / (1024*1024):.2f} MB sent")
+
+        if failed:
+            object_name, error = failed[0]
+            raise Exception(f"Failed to upload {len(failed)} objects (first: {object_name}: {error})")
+
+        return {"uploaded": uploaded, "skipped": skipped, "bytes": bytes_sent}
+
+    def _upload_file_with_retry(
+            self,
+            bucket_name: str,
+            file_path: str,
+            object_name: str,
+            max_retries: int,
+            resume: bool
+    ) -> tuple:
+        """
+        Upload one file, retrying with exponential backoff.
+        Returns (uploaded, size) - uploaded is False when resume found the object already stored.
+        """
+        file_size = os.path.getsize(file_path)
+
+        if resume and self._object_matches(bucket_name, object_name, file_path, file_size):
+            logger.debug(f"Already stored, skipping: {object_name}")
+            return False, file_size
+
+        for attempt in range(max_retries + 1):
+            try:
+                self.upload_file(
+                    bucket_name=bucket_name,
+                    object_name=object_name,
+                    file_path=file_path
+                )
+                return True, file_size
+            except Exception as e:
+                if attempt >= max_retries:
+                    raise
+                delay = settings.minio_upload_retry_backoff * (2 ** attempt)
+                logger.warning(f"Upload of {object_name} failed (attempt {attempt + 1}/{max_retries + 1}), "
+                               f"retrying in {delay:.1f}s: {str(e)}")
+                time.sleep(delay)
+
+    def _object_matches(self, bucket_name: str, object_name: str, file_path: str, file_size: int) -> bool:
+        """
+        Check whether object_name already holds the contents of file_path.
+
+        Single-part uploads have the MD5 of the content as ETag, so it is compared
+        directly. Multipart ETags ("<hash>-<parts>") are not content hashes; for
+        those a matching size is accepted.
+        """
+        try:
+            stat = self.client.stat_object(bucket_name=bucket_name, object_name=object_name)
+        except S3Error:
+            return False
+
+        if stat.size != file_size:
+            return False
+
+        etag = (stat.etag or "").strip('"')
+        if not etag or "-" in etag:
+            return True
+
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+
+        return md5.hexdigest() == etag
+
+
+    # ---------- Direct-to-storage (presigned multipart) uploads ----------
+
+    def create_video_multipart_upload(self, object_name: str, content_type: str) -> str:
+        """Start a multipart upload in the videos bucket and return its upload ID"""
+        logger.info(f"Creating multipart upload: {object_name}")
+        try:
+            return self.client._create_multipart_upload(
+                settings.minio_bucket_videos,
+                object_name,
+                {"Content-Type": content_type}
+            )
+        except S3Error as e:
+            logger.error(f"Failed to create multipart upload: {str(e)}")
+            raise Exception(f"Failed to create multipart upload: {str(e)}")
+
+    def presign_video_part_upload(
+            self,
+            object_name: str,
+            upload_id: str,
+            part_number: int,
+            expires: timedelta
+    ) -> str:
+        """Presigned PUT URL the browser uses to upload one part straight to MinIO"""
+        return self.presign_client.get_presigned_url(
+            "PUT",
+            settings.minio_bucket_videos,
+            object_name,
+            expires=expires,
+            extra_query_params={"partNumber": str(part_number), "uploadId": upload_id}
+        )
+
+    def upload_video_part(self, object_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """Upload one part of a multipart upload from the API process and return its ETag"""
+        try:
+            return self.client._upload_part(
+                settings.minio_bucket_videos,
+                object_name,
+                data,
+                None,
+                upload_id,
+                part_number
+            )
+        except S3Error as e:
+            logger.error(f"Failed to upload part {part_number} of {object_name}: {str(e)}")
+            raise Exception(f"Failed to upload part {part_number}: {str(e)}")
+
+    def complete_video_multipart_upload(self, object_name: str, upload_id: str, parts: list):
+        """
+        Assemble the uploaded parts into the final object.
+
+        Args:
+            parts: List of (part_number, etag) tuples as reported by the client
+        """
+        logger.info(f"Completing multipart upload: {object_name} ({len(parts)} parts)")
+        try:
+            self.client._complete_multipart_upload(
+                settings.minio_bucket_videos,
+                object_name,
+                upload_id,
+                [Part(part_number, etag.strip('"')) for part_number, etag in sorted(parts)]
+            )
+        except S3Error as e:
+            logger.error(f"Failed to complete multipart upload: {str(e)}")
+            raise Exception(f"Failed to complete multipart upload: {str(e)}")
+
+    def abort_video_multipart_upload(self, object_name: str, upload_id: str):
+        """Abort a multipart upload so MinIO drops the stored parts"""
+        logger.info(f"Aborting multipart upload: {object_name}")
+        try:
+            self.client._abort_multipart_upload(settings.minio_bucket_videos, object_name, upload_id)
+        except S3Error as e:
+            logger.error(f"Failed to abort multipart upload: {str(e)}")
+            raise Exception(f"Failed to abort multipart upload: {str(e)}")
+
+    def presign_thumbnail_upload(self, object_name: str, expires: timedelta) -> str:
+        """Presigned PUT URL for a thumbnail (small, single request)"""
+        return self.presign_client.presigned_put_object(
+            settings.minio_bucket_thumbnails,
+            object_name,
+            expires=expires
+        )
+
+    def get_object_size(self, bucket_name: str, object_name: str):
+        """Size of an object in bytes, or None if it doesn't exist"""
+        try:
+            return self.client.stat_object(bucket_name=bucket_name, object_name=object_name).size
+        except S3Error:
+            return None
+
+
+    def hash_video_object(self, object_name: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+        """SHA-256 of a raw video, streamed from MinIO without a local copy"""
+        sha256 = hashlib.sha256()
+        response = self.client.get_object(settings.minio_bucket_videos, object_name)
+        try:
+            for chunk in response.stream(chunk_size):
+                sha256.update(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+        return sha256.hexdigest()
+
+    def read_object(self, bucket_name: str, object_name: str) -> bytes:
+        """Whole object in memory (playlists and other small objects)"""
+        response = self.client.get_object(bucket_name, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def presign_object(
+            self,
+            bucket_name: str,
+            object_name: str,
+            expires: timedelta,
+            request_date: Optional[datetime] = None
+    ) -> str:
+        """
+        Presigned GET for the public endpoint. A fixed request_date makes the URL
+        deterministic, so documents embedding it can be cached until it expires.
+        """
+        return self.presign_client.presigned_get_object(
+            bucket_name,
+            object_name,
+            expires=expires,
+            request_date=request_date
+        )
+
+    def list_object_sizes(self, bucket_name: str, prefix: str) -> dict:
+        """{object name: size} for everything under a prefix"""
+        return {
+            obj.object_name: obj.size
+            for obj in self.client.list_objects(bucket_name, prefix=prefix, recursive=True)
+        }
+
+    def download_file(self, bucket_name: str, object_name: str, file_path: str):
+        """Download one object to a local file (small/medium objects; see download_video_to_file for sources)"""
+        self.client.fget_object(bucket_name, object_name, file_path)
+
+    def object_info(self, bucket_name: str, object_name: str) -> Tuple[int, str]:
+        """(size, unquoted ETag) of an object; raises S3Error (NoSuchKey) if it doesn't exist"""
+        stat = self.client.stat_object(bucket_name=bucket_name, object_name=object_name)
+        return stat.size, stat.etag.strip('"')
+
+    def stream_object(
+            self,
+            bucket_name: str,
+            object_name: str,
+            offset: int = 0,
+            length: int = 0,
+            chunk_size: int = 1024 * 1024
+    ):
+        """
+        Iterate over an object (or `length` bytes from `offset`) without buffering it;
+        the GET is opened right away, so a missing object raises here, not mid-stream
+        """
+        response = self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+
+        def chunks():
+            try:
+                yield from response.stream(chunk_size)
+            finally:
+                response.close()
+                response.release_conn()
+
+        return chunks()
+
+    def download_object(self, bucket_name: str, object_name: str, file_path: str) -> str:
+        """Same as download_file, returns the object's ETag (unquoted)"""
+        return self.client.fget_object(bucket_name, object_name, file_path).etag.strip('"')
+
+    def delete_prefix(self, bucket_name: str, prefix: str) -> int:
+        """Delete every object under a prefix, returns how many were removed"""
+        objects = [DeleteObject(name) for name in self.list_object_sizes(bucket_name, prefix)]
+        if not objects:
+            return 0
+        errors = list(self.client.remove_objects(bucket_name, objects))
+        for error in errors:
+            logger.error(f"Failed to delete {error.name}: {error.message}")
+        return len(objects) - len(errors)
+
     def get_video_url(self, object_name: str, expires: timedelta = timedelta(hours=1)) -> str:
         """Generate presigned URL for private video access"""
         try:
@@ -272,29 +709,102 @@ class MinIOService:
             logger.error(f"Failed to delete thumbnail: {str(e)}")
             raise Exception(f"Failed to delete thumbnail: {str(e)}")
 
-    def download_video_to_file(self, object_name: str, local_path: str, chunk_size: int = 8*1024*1024):
-        """Stream video from MinIO directly to local file"""
-        
+    def download_video_to_file(
+            self,
+            object_name: str,
+            local_path: str,
+            chunk_size: int = 8*1024*1024,
+            part_size: int = None,
+            max_workers: int = None
+    ):
+        """
+        Download a raw video with parallel ranged GETs straight into local_path.
+
+        The file is preallocated to the object size and every part is written at
+        its own offset with os.pwrite, so parts can land in any order. Finished
+        parts are recorded in "<local_path>.parts"; if the task is retried with the
+        same object (size + ETag) only the missing parts are fetched again.
+
+        Returns:
+            Total object size in bytes
+        """
+        part_size = part_size or settings.minio_download_part_size
+        max_workers = max_workers or settings.minio_download_concurrency
+        progress_path = f"{local_path}.parts"
+
         logger.info(f"Downloading: {object_name} -> {local_path}")
-        
+
         try:
-            response = self.client.get_object(
+            stat = self.client.stat_object(
                 bucket_name=settings.minio_bucket_videos,
                 object_name=object_name
             )
+            total_size = stat.size
+            etag = (stat.etag or "").strip('"')
 
-            bytes_downloaded = 0
+            parts = [
+                (index, offset, min(part_size, total_size - offset))
+                for index, offset in enumerate(range(0, total_size, part_size))
+            ]
 
-            with open(local_path, 'wb') as f:
-                for chunk in response.stream(chunk_size):
-                    f.write(chunk)
-                    bytes_downloaded += len(chunk)
+            completed = self._load_download_progress(progress_path, local_path, etag, total_size, part_size)
+            pending = [part for part in parts if part[0] not in completed]
 
-            response.close()
-            response.release_conn()
-            
-            logger.info(f"Download complete: {bytes_downloaded} bytes")
-            return bytes_downloaded
+            if completed:
+                logger.info(f"Resuming download: {len(completed)}/{len(parts)} parts already on disk")
+
+            fd = os.open(local_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if not completed:
+                    # Fresh download: (re)size the file once and start a new progress log
+                    os.ftruncate(fd, total_size)
+                    with open(progress_path, 'w') as f:
+                        f.write(json.dumps({"etag": etag, "size": total_size, "part_size": part_size}) + "\n")
+
+                started = time.monotonic()
+                bytes_fetched = 0
+
+                failed = []
+
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="minio-download") as executor:
+                    futures = {
+                        executor.submit(self._download_part, object_name, fd, offset, length, chunk_size): (index, length)
+                        for index, offset, length in pending
+                    }
+                    for future in as_completed(futures):
+                        index, length = futures[future]
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logger.error(f"Part {index} failed: {str(e)}")
+                            failed.append(e)
+                            continue
+
+                        bytes_fetched += length
+                        # Record finished parts so a retry only fetches what's missing
+                        with open(progress_path, 'a') as f:
+                            f.write(f"{index}\n")
+
+                if failed:
+                    raise Exception(f"{len(failed)}/{len(pending)} parts failed (first: {str(failed[0])})")
+
+                elapsed = max(time.monotonic() - started, 1e-6)
+
+                # Verify total size against the object metadata
+                written_size = os.fstat(fd).st_size
+                if written_size != total_size:
+                    raise Exception(f"Size mismatch: expected {total_size} bytes, file has {written_size}")
+            finally:
+                os.close(fd)
+
+            os.remove(progress_path)
+
+            logger.info(
+                f"Download complete: {total_size} bytes, fetched {bytes_fetched / (1024*1024):.2f} MB "
+                f"in {elapsed:.2f}s ({bytes_fetched / (1024*1024) / elapsed:.2f} MB/s) "
+                f"using {len(pending)} parts of {part_size / (1024*1024):.0f} MB over {max_workers} connections"
+            )
+            return total_size
 
         except S3Error as e:
             logger.error(f"Failed to download {object_name}: {str(e)}")
@@ -303,6 +813,44 @@ class MinIOService:
             logger.error(f"Error downloading {object_name}: {str(e)}")
             raise Exception(f"Failed to download video: {str(e)}")
 
+    def _download_part(self, object_name: str, fd: int, offset: int, length: int, chunk_size: int):
+        """Fetch one byte range and write it at its offset in the open file."""
+        response = self.client.get_object(
+            bucket_name=settings.minio_bucket_videos,
+            object_name=object_name,
+            offset=offset,
+            length=length
+        )
+        try:
+            position = offset
+            for chunk in response.stream(chunk_size):
+                os.pwrite(fd, chunk, position)
+                position += len(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+
+        if position - offset != length:
+            raise Exception(f"Short read at offset {offset}: got {position - offset} of {length} bytes")
+
+    @staticmethod
+    def _load_download_progress(progress_path: str, local_path: str, etag: str, total_size: int, part_size: int) -> set:
+        """
+        Return the part indexes already written by a previous attempt.
+        Anything that doesn't match the current object/part layout starts from scratch.
+        """
+        if not (os.path.exists(progress_path) and os.path.exists(local_path)):
+            return set()
+
+        try:
+            with open(progress_path) as f:
+                header = json.loads(f.readline())
+                if header != {"etag": etag, "size": total_size, "part_size": part_size}:
+                    return set()
+                return {int(line) for line in f if line.strip()}
+        except (ValueError, OSError):
+            return set()
+
 
 # Singleton instance
 logger.info("Creating MinIO service singleton")
@@ -0,0 +1,478 @@
+# Service layer - playback delivery
+# /backend/app/services/playback_service.py
+"""
+Serves the HLS output of processed videos through the API.
+
+- Access is checked once per playback session (GET /playback/{video_id}), which
+  returns a master playlist URL with a token in its path.
+- Playlists under that URL only check the token (HMAC, no DB). Every segment,
+  init segment and sprite URI in them is rewritten to a presigned MinIO URL,
+  so segment GETs never reach the API.
+- Time is cut into windows of settings.playback_url_window_seconds. Tokens and
+  presigned URLs are signed at the window start, so a rewritten playlist is the
+  same for every viewer of that window. It is cached in process (LRU) and in Redis,
+  so steady-state playlist requests touch neither Postgres nor MinIO.
+
+- Location: string  playback:video:{video_id}                     (bucket + path of the HLS output)
+- Playlist: string  playback:playlist:{video_id}:{window}:{delivery}:{path}  (rewritten playlist)
+
+With settings.playback_segment_delivery = "cache", segment URIs are left relative
+instead: they resolve under the token path and are served by the API from the
+local segment cache (app/services/segment_cache.py), checked against the token only.
+Serving a segment also prefetches the next ones (app/services/prefetch_service.py).
+Single-file renditions (hls_single_file) above settings.segment_cache_max_object_bytes
+are not cached: each Range request is proxied to MinIO.
+
+Redis errors are logged and the playlist is rendered from MinIO instead.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+import hashlib
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import logging
+
+import redis
+from fastapi import HTTPException
+from minio.error import S3Error
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.redis_client import get_redis
+from app.models.videos import Video
+from app.services.ffmpeg_service import HLS_SINGLE_FILE_NAME
+from app.services.minio_service import minio_service, OUTPUT_CONTENT_TYPES
+from app.services.prefetch_service import get_prefetcher
+from app.services.segment_cache import get_segment_cache, SegmentFetchTimeout
+from app.services.video_service import video_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+MASTER_PLAYLIST = "master.m3u8"
+MEDIA_PLAYLIST = "playlist.m3u8"
+TRICKPLAY_INDEX = "trickplay/thumbnails.vtt"
+# Rendition directories written by the pipeline: 720p, audio, iframes, ...
+RENDITION_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+SEGMENT_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+# Served from the segment cache; playlists and indexes always go through get_playlist
+SEGMENT_EXTENSIONS = {".ts", ".m4s", ".mp4", ".jpg"}
+_URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+_BANDWIDTH_ATTRIBUTE = re.compile(r"(?:^|[:,])BANDWIDTH=(\d+)")
+
+
+@dataclass
+class ProxiedObject:
+    """A segment served straight from MinIO (too large for the segment cache)"""
+    bucket: str
+    object_name: str
+    size: int
+    etag: str  # quoted, ready for the ETag header
+
+
+class PlaylistCache:
+    """Small thread-safe LRU (sync routes run on the threadpool)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def rewrite_media_playlist(text: str, sign: Callable[[str], str]) -> str:
+    """Replace every segment URI (and the EXT-X-MAP init segment) with sign(uri)"""
+    lines = []
+    for line in text.splitlines():
+        if line.startswith("#EXT-X-MAP:"):
+            line = _URI_ATTRIBUTE.sub(lambda match: f'URI="{sign(match.group(1))}"', line)
+        elif line and not line.startswith("#"):
+            line = sign(line)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def rewrite_trickplay_index(text: str, sign: Callable[[str], str]) -> str:
+    """Replace the sprite sheet of every "sprite_NNN.jpg#xywh=..." cue with sign(sheet)"""
+    lines = []
+    for line in text.splitlines():
+        if "#xywh=" in line and "-->" not in line:
+            sheet, _, fragment = line.partition("#")
+            line = f"{sign(sheet)}#{fragment}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def media_playlist_segments(text: str) -> dict:
+    """{"init": EXT-X-MAP URI or None, "segments": unique segment URIs in playback order}"""
+    init = None
+    segments = []
+    for line in text.splitlines():
+        if line.startswith("#EXT-X-MAP:"):
+            match = _URI_ATTRIBUTE.search(line)
+            init = match.group(1) if match else None
+        elif line and not line.startswith("#") and (not segments or segments[-1] != line):
+            segments.append(line)
+    return {"init": init, "segments": segments}
+
+
+def master_playlist_renditions(text: str) -> dict:
+    """
+    {"variants": video rendition dirs, highest BANDWIDTH first,
+     "media": EXT-X-MEDIA (audio) rendition dirs}
+    """
+    variants = []
+    media = []
+    bandwidth = None
+    for line in text.splitlines():
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            match = _BANDWIDTH_ATTRIBUTE.search(line)
+            bandwidth = int(match.group(1)) if match else 0
+        elif line.startswith("#EXT-X-MEDIA:"):
+            match = _URI_ATTRIBUTE.search(line)
+            if match:
+                media.append(os.path.dirname(match.group(1)))
+        elif line and not line.startswith("#") and bandwidth is not None:
+            variants.append((bandwidth, os.path.dirname(line)))
+            bandwidth = None
+    return {
+        "variants": [rendition for _, rendition in sorted(variants, key=lambda variant: -variant[0])],
+        "media": media,
+    }
+
+
+class PlaybackService:
+    """Playback sessions, tokenized playlists and (in "cache" mode) segments"""
+
+    def __init__(self):
+        self._cache = PlaylistCache(settings.playback_cache_entries)
+        # Playback tokens are not JWTs, but reuse the app secret under their own label
+        self._token_key = hmac.new(
+            settings.jwt_secret_key.encode(), b"playback-token", hashlib.sha256
+        ).digest()
+
+    # ---------- Windows and tokens ----------
+
+    @staticmethod
+    def _current_window() -> int:
+        return int(time.time() // settings.playback_url_window_seconds)
+
+    @staticmethod
+    def _window_start(window: int) -> datetime:
+        return datetime.fromtimestamp(window * settings.playback_url_window_seconds, tz=timezone.utc)
+
+    def _window_expiry(self, window: int) -> datetime:
+        """Tokens and URLs of a window stay valid until the end of the next one"""
+        return self._window_start(window + 2)
+
+    def _token(self, video_id: str, window: int) -> str:
+        digest = hmac.new(self._token_key, f"{video_id}:{window}".encode(), hashlib.sha256).hexdigest()
+        return f"{window}-{digest[:32]}"
+
+    def _verify_token(self, video_id: str, token: str) -> int:
+        """The token's window, or 403 if it is forged or expired"""
+        window, _, _ = token.partition("-")
+        if not window.isdigit():
+            raise HTTPException(status_code=403, detail="Invalid playback token")
+
+        window = int(window)
+        if not hmac.compare_digest(token, self._token(video_id, window)):
+            raise HTTPException(status_code=403, detail="Invalid playback token")
+        if window < self._current_window() - 1:
+            raise HTTPException(status_code=403, detail="Playback token expired")
+        return window
+
+    # ---------- Where the HLS output lives ----------
+
+    @staticmethod
+    def _location_key(video_id: str) -> str:
+        return f"playback:video:{video_id}"
+
+    @staticmethod
+    def _parse_manifest_url(manifest_url: str) -> dict:
+        """'/{bucket}/{path}/master.m3u8' -> {"bucket", "base_path"}"""
+        bucket, _, object_name = manifest_url.lstrip("/").partition("/")
+        return {"bucket": bucket, "base_path": os.path.dirname(object_name)}
+
+    def _store_location(self, video_id: str, location: dict):
+        self._cache.set(self._location_key(video_id), json.dumps(location))
+        try:
+            get_redis().set(
+                self._location_key(video_id),
+                json.dumps(location),
+                ex=2 * settings.playback_url_window_seconds
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Playback location cache write failed for {video_id}: {str(e)}")
+
+    def _location(self, db: Session, video_id: str) -> dict:
+        """
+        Bucket and path of a video's HLS output (deduplicated videos point at
+        another video's objects). Postgres only when both caches miss.
+        """
+        key = self._location_key(video_id)
+        cached = self._cache.get(key)
+        if cached is None:
+            try:
+                cached = get_redis().get(key)
+            except redis.RedisError as e:
+                logger.warning(f"Playback location cache read failed for {video_id}: {str(e)}")
+        if cached is not None:
+            return json.loads(cached)
+
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if not video or not video.manifest_url:
+            raise HTTPException(status_code=404, detail="Video not found")
+
+        location = self._parse_manifest_url(video.manifest_url)
+        self._store_location(video_id, location)
+        return location
+
+    # ---------- Sessions ----------
+
+    def create_session(self, db: Session, video_id: str, user_id: Optional[str] = None) -> dict:
+        """
+        Check access and hand out the tokenized master playlist URL.
+
+        Args:
+            user_id: ID of the signed-in user (private videos play for their owner only)
+
+        Returns:
+            {"video_id", "manifest_url", "trickplay_vtt_url", "expires_at"}
+
+        Raises:
+            HTTPException: 404 unknown video, 403 private, 409 not processed yet
+        """
+        video = video_service.get_video_by_id(db, video_id, user_id)
+        if video.processing_status != "completed" or not video.manifest_url:
+            raise HTTPException(status_code=409, detail="Video is not ready for playback")
+
+        self._store_location(video_id, self._parse_manifest_url(video.manifest_url))
+
+        window = self._current_window()
+        base_url = f"/playback/{video_id}/{self._token(video_id, window)}"
+        has_trickplay = bool((video.processing_metadata or {}).get("trickplay_vtt_url"))
+
+        return {
+            "video_id": video_id,
+            "manifest_url": f"{base_url}/{MASTER_PLAYLIST}",
+            "trickplay_vtt_url": f"{base_url}/{TRICKPLAY_INDEX}" if has_trickplay else None,
+            "expires_at": self._window_expiry(window),
+        }
+
+    # ---------- Playlists ----------
+
+    def get_playlist(self, db: Session, video_id: str, token: str, path: str) -> tuple:
+        """
+        A playlist under a playback session, rewritten for this token's window.
+
+        Args:
+            path: "master.m3u8", "<rendition>/playlist.m3u8" or "trickplay/thumbnails.vtt"
+
+        Returns:
+            (text, seconds it stays valid)
+
+        Raises:
+            HTTPException: 403 bad/expired token, 404 unknown playlist
+        """
+        window = self._verify_token(video_id, token)
+        max_age = max(1, int(self._window_expiry(window).timestamp() - time.time()))
+
+        cache_key = f"{video_id}:{window}:{settings.playback_segment_delivery}:{path}"
+        text = self._cache.get(cache_key)
+        if text is not None:
+            return text, max_age
+
+        redis_key = f"playback:playlist:{cache_key}"
+        try:
+            text = get_redis().get(redis_key)
+        except redis.RedisError as e:
+            logger.warning(f"Playlist cache read failed for {cache_key}: {str(e)}")
+
+        if text is None:
+            text = self._render(db, video_id, window, path)
+            try:
+                get_redis().set(redis_key, text, ex=max_age)
+            except redis.RedisError as e:
+                logger.warning(f"Playlist cache write failed for {cache_key}: {str(e)}")
+
+        self._cache.set(cache_key, text)
+        return text, max_age
+
+    def _render(self, db: Session, video_id: str, window: int, path: str) -> str:
+        """Fetch a playlist from MinIO and presign what it references"""
+        location = self._location(db, video_id)
+        object_name = f"{location['base_path']}/{path}"
+        try:
+            text = minio_service.read_object(location["bucket"], object_name).decode()
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise HTTPException(status_code=404, detail="Playlist not found")
+            logger.error(f"Failed to read {object_name}: {str(e)}")
+            raise HTTPException(status_code=502, detail="Storage unavailable")
+
+        # Variant / audio / I-frame URIs are relative and resolve under the token path,
+        # and so do segment URIs when the API serves them (get_segment)
+        if path == MASTER_PLAYLIST or settings.playback_segment_delivery == "cache":
+            return text
+
+        directory = os.path.dirname(object_name)
+        request_date = self._window_start(window)
+        expires = timedelta(seconds=2 * settings.playback_url_window_seconds)
+        signed = {}
+
+        def sign(uri: str) -> str:
+            # Single-file renditions repeat one URI for every byte range
+            if uri not in signed:
+                signed[uri] = minio_service.presign_object(
+                    location["bucket"], f"{directory}/{uri}", expires, request_date
+                )
+            return signed[uri]
+
+        if path == TRICKPLAY_INDEX:
+            return rewrite_trickplay_index(text, sign)
+        return rewrite_media_playlist(text, sign)
+
+    # ---------- Segments (playback_segment_delivery = "cache") ----------
+
+    def get_segment(self, db: Session, video_id: str, token: str, rendition: str, filename: str) -> tuple:
+        """
+        A segment / init segment / sprite sheet from the local segment cache.
+        The caller passes a CacheEntry to get_segment_cache().release() once it is sent.
+
+        Returns:
+            (CacheEntry or ProxiedObject, media type, seconds the URL stays valid)
+
+        Raises:
+            HTTPException: 403 bad/expired token, 404 unknown file, 502/504 storage errors
+        """
+        window = self._verify_token(video_id, token)
+        extension = os.path.splitext(filename)[1].lower()
+        if (
+            settings.playback_segment_delivery != "cache"
+            or not RENDITION_NAME.match(rendition)
+            or not SEGMENT_NAME.match(filename)
+            or extension not in SEGMENT_EXTENSIONS
+        ):
+            raise HTTPException(status_code=404, detail="Segment not found")
+
+        location = self._location(db, video_id)
+        object_name = f"{location['base_path']}/{rendition}/{filename}"
+        cache = get_segment_cache()
+        try:
+            entry = None
+            if os.path.splitext(filename)[0] == HLS_SINGLE_FILE_NAME and not cache.contains(location["bucket"], object_name):
+                # One object per rendition: don't download gigabytes to answer the first Range request
+                size, etag = minio_service.object_info(location["bucket"], object_name)
+                if size > settings.segment_cache_max_object_bytes:
+                    entry = ProxiedObject(location["bucket"], object_name, size, f'"{etag}"')
+            if entry is None:
+                entry = cache.get(location["bucket"], object_name)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise HTTPException(status_code=404, detail="Segment not found")
+            logger.error(f"Failed to fetch {object_name}: {str(e)}")
+            raise HTTPException(status_code=502, detail="Storage unavailable")
+        except SegmentFetchTimeout as e:
+            logger.error(str(e))
+            raise HTTPException(status_code=504, detail="Storage timeout")
+
+        max_age = max(1, int(self._window_expiry(window).timestamp() - time.time()))
+        return entry, OUTPUT_CONTENT_TYPES[extension], max_age
+
+    # ---------- Prefetch (playback_segment_delivery = "cache") ----------
+
+    def _parsed_playlist(self, db: Session, video_id: str, token: str, path: str, parse: Callable[[str], dict]) -> dict:
+        """parse() of a playlist as get_playlist serves it (unrewritten in "cache" mode), kept per window"""
+        window = self._verify_token(video_id, token)
+        cache_key = f"parsed:{video_id}:{window}:{path}"
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+
+        parsed = parse(self.get_playlist(db, video_id, token, path)[0])
+        self._cache.set(cache_key, json.dumps(parsed))
+        return parsed
+
+    def prefetch_after(self, session_id: str, video_id: str, token: str, rendition: str, filename: str, size: int):
+        """
+        Queue the segments a viewer who just got rendition/filename is likely to ask
+        for next: the following settings.prefetch_segments of the rendition, and the
+        next settings.prefetch_neighbour_segments (+ init segment) of the rung they'd
+        switch to. Returns right away: planning and downloads run on the prefetch pool,
+        and failures only cost the prefetch.
+
+        Args:
+            session_id: Stable per viewer (see the segment route)
+            size: Bytes of the segment just served, the estimate for the ones queued
+        """
+        if not settings.prefetch_enabled or settings.playback_segment_delivery != "cache":
+            return
+        get_prefetcher().plan(self._plan_prefetch, session_id, video_id, token, rendition, filename, size)
+
+    def _plan_prefetch(self, session_id: str, video_id: str, token: str, rendition: str, filename: str, size: int):
+        # Off the request: the request's session may be closed by now
+        db = SessionLocal()
+        try:
+            renditions = self._parsed_playlist(db, video_id, token, MASTER_PLAYLIST, master_playlist_renditions)
+            variants = renditions["variants"]
+            if rendition not in variants and rendition not in renditions["media"]:
+                return  # trickplay sprites, I-frame playlist
+
+            current = self._parsed_playlist(db, video_id, token, f"{rendition}/{MEDIA_PLAYLIST}", media_playlist_segments)
+            segments = current["segments"]
+            if len(segments) < 2:
+                return  # single-file rendition: players fetch byte ranges of one object
+            index = segments.index(filename) if filename in segments else -1  # -1: the init segment
+
+            location = self._location(db, video_id)
+            prefix = f"{location['base_path']}/{rendition}"
+            wanted = [f"{prefix}/{uri}" for uri in segments[index + 1:index + 1 + settings.prefetch_segments]]
+
+            prefetcher = get_prefetcher()
+            if rendition in variants:
+                direction = prefetcher.record_position(session_id, video_id, rendition, index, variants)
+                position = variants.index(rendition) - direction  # highest first: "up" is a lower index
+                if 0 <= position < len(variants) and settings.prefetch_neighbour_segments > 0:
+                    neighbour = variants[position]
+                    other = self._parsed_playlist(db, video_id, token, f"{neighbour}/{MEDIA_PLAYLIST}", media_playlist_segments)
+                    start = index + 1  # segment numbers line up across rungs
+                    uris = other["segments"][start:start + settings.prefetch_neighbour_segments]
+                    if other["init"]:
+                        uris.insert(0, other["init"])
+                    if len(other["segments"]) >= 2:
+                        wanted += [f"{location['base_path']}/{neighbour}/{uri}" for uri in uris]
+
+            prefetcher.schedule(location["bucket"], wanted, size)
+        except Exception as e:
+            logger.debug(f"Prefetch planning failed for {video_id}/{rendition}/{filename}: {str(e)}")
+        finally:
+            db.close()
+
+    def segment_cache_stats(self) -> dict:
+        return {**get_segment_cache().stats(), "prefetch": get_prefetcher().stats()}
+
+
+playback_service = PlaybackService()
@@ -0,0 +1,205 @@
+# Service layer - predictive segment prefetch
+# /backend/app/services/prefetch_service.py
+"""
+Warms the segment cache ahead of viewers (playback_segment_delivery = "cache").
+
+After a viewer gets segment N of a rendition, the next settings.prefetch_segments
+segments of that rendition and the next settings.prefetch_neighbour_segments of
+the neighbouring rung are downloaded in the background, so the requests that
+follow within seconds are disk hits instead of MinIO round trips.
+
+- Sessions:  per-viewer position (rendition, segment index), kept in process memory
+             for settings.prefetch_session_idle_seconds. The neighbour is the rung the
+             viewer last switched towards (the one above if they haven't switched).
+- Budget:    a token bucket of settings.prefetch_bandwidth_mbps shared by all prefetches.
+             Prefetches that don't fit are dropped, never queued, so they can't delay
+             demand fetches; neither can a full prefetch pool (settings.prefetch_workers).
+- Planning:  working out what to prefetch (playlist lookups) runs on the same pool,
+             after the segment that triggered it has been handed to the viewer.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import threading
+import time
+import logging
+
+from app.core.config import get_settings
+from app.services.segment_cache import get_segment_cache
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+# Prefetches allowed to wait for a worker, per worker
+QUEUED_PER_WORKER = 2
+MAX_SESSIONS = 10000
+
+
+class TokenBucket:
+    """Bytes per second with a burst allowance; thread-safe"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, amount: float) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < amount:
+                return False
+            self._tokens -= amount
+            return True
+
+    def charge(self, amount: float):
+        """Correct an estimate once the real size is known (may go below zero)"""
+        with self._lock:
+            self._tokens -= amount
+
+
+class Prefetcher:
+
+    def __init__(self):
+        rate = settings.prefetch_bandwidth_mbps * 1_000_000 / 8
+        self._budget = TokenBucket(rate, burst=2 * rate)
+        self._executor = ThreadPoolExecutor(max_workers=settings.prefetch_workers, thread_name_prefix="prefetch")
+        self._sessions = OrderedDict()  # session id -> {"video_id", "rendition", "index", "direction", "seen"}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "scheduled": 0,
+            "failed": 0,
+            "bytes": 0,
+            "skipped_cached": 0,
+            "skipped_budget": 0,
+            "skipped_busy": 0,
+        }
+
+    def record_position(self, session_id: str, video_id: str, rendition: str, index: int, ranks: list) -> int:
+        """
+        Store where a viewer is and return the direction of their last rung switch
+        (-1 towards lower rungs, +1 towards higher ones). ranks: renditions, highest first.
+        """
+        now = time.monotonic()
+        with self._lock:
+            previous = self._sessions.pop(session_id, None)
+            direction = previous["direction"] if previous else 1
+            if previous and previous["video_id"] == video_id and previous["rendition"] != rendition:
+                if previous["rendition"] in ranks and rendition in ranks:
+                    direction = 1 if ranks.index(rendition) < ranks.index(previous["rendition"]) else -1
+
+            self._sessions[session_id] = {
+                "video_id": video_id,
+                "rendition": rendition,
+                "index": index,
+                "direction": direction,
+                "seen": now,
+            }
+
+            # Oldest first: drop idle sessions, and the oldest ones past the cap
+            idle_before = now - settings.prefetch_session_idle_seconds
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if oldest["seen"] >= idle_before and len(self._sessions) <= MAX_SESSIONS:
+                    break
+                self._sessions.popitem(last=False)
+        return direction
+
+    def plan(self, planner: Callable, *args):
+        """Run planner(*args) on the pool; dropped (skipped_busy) if the pool is full"""
+        if not self._reserve():
+            self._count("skipped_busy")
+            return
+        self._executor.submit(self._plan, planner, *args)
+
+    def _plan(self, planner: Callable, *args):
+        try:
+            planner(*args)
+        except Exception as e:
+            logger.debug(f"Prefetch planning failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _reserve(self) -> bool:
+        """Take a place in the pool's queue"""
+        with self._lock:
+            if self._pending >= settings.prefetch_workers * QUEUED_PER_WORKER:
+                return False
+            self._pending += 1
+            return True
+
+    def schedule(self, bucket_name: str, object_names: list, estimate: int):
+        """
+        Download these objects into the segment cache in the background, in order,
+        as far as the bandwidth budget and the worker pool allow.
+
+        Args:
+            estimate: Expected bytes per object (the segment just served)
+        """
+        cache = get_segment_cache()
+        for object_name in object_names:
+            if cache.contains(bucket_name, object_name):
+                self._count("skipped_cached")
+                continue
+
+            if not self._reserve():
+                self._count("skipped_busy")
+                return
+
+            if not self._budget.try_take(estimate):
+                with self._lock:
+                    self._pending -= 1
+                self._count("skipped_budget")
+                return
+
+            self._count("scheduled")
+            self._executor.submit(self._prefetch, bucket_name, object_name, estimate)
+
+    def _prefetch(self, bucket_name: str, object_name: str, estimate: int):
+        try:
+            cache = get_segment_cache()
+            if cache.contains(bucket_name, object_name):
+                # A viewer got there first
+                self._budget.charge(-estimate)
+                return
+            entry = cache.get(bucket_name, object_name, prefetch=True)
+            cache.release(entry)
+            self._budget.charge(entry.size - estimate)
+            self._count("bytes", entry.size)
+        except Exception as e:
+            self._budget.charge(-estimate)
+            self._count("failed")
+            logger.debug(f"Prefetch of {object_name} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "sessions": len(self._sessions), "pending": self._pending}
+
+
+_prefetcher: Optional[Prefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
@@ -0,0 +1,267 @@
+# Service layer - live processing progress
+# /backend/app/services/progress_service.py
+"""
+Live processing progress, kept in Redis instead of Postgres.
+
+Workers publish every stage change and percent update here. Postgres only
+sees terminal states (completed / failed), so hundreds of videos in flight
+don't turn into a steady stream of UPDATEs and status-poll SELECTs.
+
+- Snapshot:  hash    video:{id}:progress         (status, progress, owner, updated_at, ...)
+- Parts:     hash    video:{id}:progress:parts   (percent per rung / chunk of the current stage)
+- Updates:   channel video:{id}:progress:events  (full snapshot as JSON per message)
+
+Every write refreshes updated_at. A non-terminal snapshot not updated for
+settings.progress_stale_seconds is stale (the pipeline may have died): status
+reads fall back to Postgres for it.
+
+Redis errors are logged and swallowed: progress is best effort and must
+never fail a processing task.
+"""
+
+from typing import AsyncIterator, Optional
+import json
+import time
+import logging
+
+import redis
+
+from app.core.config import get_settings
+from app.core.redis_client import get_redis, get_async_redis
+from app.utils.video_helpers import STATUS_META, DEFAULT_META, ProcessingStatus
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+PROGRESS_TTL_SECONDS = 24 * 60 * 60
+TERMINAL_STATUSES = {ProcessingStatus.completed.value, ProcessingStatus.failed.value}
+
+# Pipeline order; a stage's percent is spread between the previous stage's and its own STATUS_META value
+_STAGE_ORDER = [stage for stage in ProcessingStatus if stage != ProcessingStatus.failed]
+
+
+def progress_key(video_id: str) -> str:
+    return f"video:{video_id}:progress"
+
+
+def progress_parts_key(video_id: str) -> str:
+    return f"video:{video_id}:progress:parts"
+
+
+def progress_channel(video_id: str) -> str:
+    return f"video:{video_id}:progress:events"
+
+
+def normalize_status(status: str) -> str:
+    """'Failed' / 'uploading to storage' -> ProcessingStatus values"""
+    return status.strip().lower().replace(" ", "_")
+
+
+def _stage_band(status: str):
+    """(overall percent when the stage starts, overall percent when it is done)"""
+    try:
+        stage = ProcessingStatus(status)
+    except ValueError:
+        return 0, 0
+
+    if stage == ProcessingStatus.failed:
+        return 0, 0
+
+    index = _STAGE_ORDER.index(stage)
+    start = STATUS_META[_STAGE_ORDER[index - 1]]["progress"] if index else 0
+    return start, STATUS_META[stage]["progress"]
+
+
+def _message(status: str) -> str:
+    try:
+        return STATUS_META.get(ProcessingStatus(status), DEFAULT_META)["message"]
+    except ValueError:
+        return DEFAULT_META["message"]
+
+
+def progress_snapshot(video_id: str, fields: dict) -> dict:
+    """Redis hash -> same shape as VideoProcessingStatusResponse"""
+    status = fields.get("status", ProcessingStatus.queued.value)
+    stage_progress = fields.get("stage_progress")
+    return {
+        "video_id": video_id,
+        "status": status,
+        "progress": int(float(fields.get("progress", 0))),
+        "stage_progress": int(float(stage_progress)) if stage_progress not in (None, "") else None,
+        "message": fields.get("message") or _message(status),
+        "error": fields.get("error") or None,
+        "is_completed": status == ProcessingStatus.completed.value,
+        "is_failed": status == ProcessingStatus.failed.value,
+    }
+
+
+def _write(video_id: str, fields: dict, reset_parts: bool = False):
+    """HSET the fields, refresh the TTL and publish the resulting snapshot"""
+    redis_client = get_redis()
+    key = progress_key(video_id)
+
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={**fields, "updated_at": time.time()})
+    pipe.expire(key, PROGRESS_TTL_SECONDS)
+    if reset_parts:
+        pipe.delete(progress_parts_key(video_id))
+    pipe.hgetall(key)
+    current = pipe.execute()[-1]
+
+    redis_client.publish(progress_channel(video_id), json.dumps(progress_snapshot(video_id, current)))
+
+
+def init_progress(video_id: str, user_id: str):
+    """Start a fresh progress record; the owner lets the status endpoints skip Postgres"""
+    try:
+        get_redis().delete(progress_key(video_id), progress_parts_key(video_id))
+        _write(video_id, {
+            "user_id": str(user_id),
+            "status": ProcessingStatus.queued.value,
+            "progress": STATUS_META[ProcessingStatus.queued]["progress"],
+            "stage_progress": "",
+            "message": _message(ProcessingStatus.queued.value),
+            "error": "",
+        })
+    except redis.RedisError as e:
+        logger.warning(f"Progress init failed for {video_id}: {str(e)}")
+
+
+def set_parts_total(video_id: str, total: int):
+    """Number of parallel parts (rungs, chunk encodes) the current stage is split into"""
+    try:
+        get_redis().hset(progress_key(video_id), "parts_total", total)
+    except redis.RedisError as e:
+        logger.warning(f"Progress update failed for {video_id}: {str(e)}")
+
+
+def publish_status(video_id: str, status: str, error_message: Optional[str] = None) -> str:
+    """
+    Publish a stage change. Repeating the current stage (parallel rung tasks
+    all announce "transcoding") keeps the progress made so far.
+
+    Returns:
+        The normalized status
+    """
+    status = normalize_status(status)
+    try:
+        previous = get_redis().hget(progress_key(video_id), "status")
+        fields = {"status": status, "message": _message(status)}
+
+        if status != previous:
+            if status in TERMINAL_STATUSES:
+                fields["progress"] = STATUS_META[ProcessingStatus(status)]["progress"]
+            else:
+                fields["progress"] = _stage_band(status)[0]
+            fields["stage_progress"] = ""
+
+        if error_message:
+            fields["error"] = error_message[:1000]
+
+        _write(video_id, fields, reset_parts=status != previous)
+    except redis.RedisError as e:
+        logger.warning(f"Progress update failed for {video_id}: {str(e)}")
+
+    return status
+
+
+def publish_stage_progress(video_id: str, status: str, percent: float, part: Optional[str] = None):
+    """
+    Publish percent-complete of the current stage.
+
+    Args:
+        part: Name of one parallel unit (e.g. "720p", "720p#3"). The stage percent is
+              then the average over parts_total units, counting unreported ones as 0.
+    """
+    status = normalize_status(status)
+    percent = max(0.0, min(100.0, percent))
+    try:
+        redis_client = get_redis()
+
+        if part:
+            redis_client.hset(progress_parts_key(video_id), part, percent)
+            redis_client.expire(progress_parts_key(video_id), PROGRESS_TTL_SECONDS)
+            parts = redis_client.hgetall(progress_parts_key(video_id))
+            parts_total = int(redis_client.hget(progress_key(video_id), "parts_total") or 0)
+            stage_percent = sum(float(value) for value in parts.values()) / max(parts_total, len(parts))
+        else:
+            stage_percent = percent
+
+        start, end = _stage_band(status)
+        _write(video_id, {
+            "status": status,
+            "stage_progress": round(stage_percent),
+            "progress": int(start + (end - start) * stage_percent / 100),
+            "message": _message(status),
+        })
+    except redis.RedisError as e:
+        logger.warning(f"Progress update failed for {video_id}: {str(e)}")
+
+
+def read_progress(video_id: str) -> Optional[dict]:
+    """Raw progress hash (includes user_id), or None if there is none / Redis is down"""
+    try:
+        fields = get_redis().hgetall(progress_key(video_id))
+    except redis.RedisError as e:
+        logger.warning(f"Progress read failed for {video_id}: {str(e)}")
+        return None
+    return fields or None
+
+
+def is_stale(fields: dict) -> bool:
+    """No update for settings.progress_stale_seconds (heartbeat: updated_at)"""
+    try:
+        updated_at = float(fields.get("updated_at") or 0)
+    except ValueError:
+        return True
+    return time.time() - updated_at > settings.progress_stale_seconds
+
+
+def clear_progress(video_id: str):
+    """Drop the progress of a deleted video"""
+    try:
+        get_redis().delete(progress_key(video_id), progress_parts_key(video_id))
+    except redis.RedisError as e:
+        logger.warning(f"Progress cleanup failed for {video_id}: {str(e)}")
+
+
+def _sse(snapshot: dict) -> str:
+    return f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+
+
+async def stream_progress_events(
+    video_id: str,
+    initial: dict,
+    is_disconnected,
+    keepalive_seconds: float = 15.0
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one video: the current snapshot, then every update,
+    until the video completes/fails or the client goes away.
+
+    Args:
+        initial: Current snapshot (already access-checked by the caller)
+        is_disconnected: Request.is_disconnected
+    """
+    pubsub = get_async_redis().pubsub()
+    # Subscribe before sending the snapshot so no update falls in between
+    await pubsub.subscribe(progress_channel(video_id))
+    try:
+        yield _sse(initial)
+        if initial["status"] in TERMINAL_STATUSES:
+            return
+
+        while not await is_disconnected():
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=keepalive_seconds)
+            if message is None:
+                yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+                continue
+
+            snapshot = json.loads(message["data"])
+            yield _sse(snapshot)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
@@ -0,0 +1,235 @@
+# Service layer - segment edge cache
+# /backend/app/services/segment_cache.py
+"""
+Read-through cache of processed-video objects (HLS segments, init segments,
+sprite sheets) on the API node's local disk.
+
+- Size-bounded LRU: settings.segment_cache_max_bytes, least recently served evicted first
+- Coalescing: concurrent misses for one object wait for a single MinIO download
+- Files are immutable and named <sha1 of bucket/object>.<MinIO ETag>, so the index
+  (and every ETag) is rebuilt from the directory after a restart
+- Callers hold an entry from get() until its response is sent and then release() it.
+  Evicted files are unlinked once no request holds them and the reverse proxy had
+  settings.segment_cache_unlink_grace_seconds to open them (X-Accel-Redirect)
+
+One index per process: API workers sharing a host need a cache dir each.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+
+from app.core.config import get_settings
+from app.services.minio_service import minio_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+@dataclass
+class CacheEntry:
+    path: str           # absolute path of the cached file
+    relative_path: str  # path below the cache dir (X-Accel-Redirect)
+    size: int
+    etag: str           # quoted, ready for the ETag header
+    refs: int = field(default=0, compare=False)           # get() calls not released yet
+    served_at: float = field(default=0.0, compare=False)  # time.monotonic() of the last get()
+
+
+class SegmentFetchTimeout(TimeoutError):
+    """Another request's download of the object didn't finish in time"""
+
+
+class SegmentCache:
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key hash -> CacheEntry, least recently served first
+        self._size = 0
+        self._inflight = {}            # key hash -> threading.Event of the download in progress
+        self._retired = []             # evicted / replaced entries whose files are still on disk
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,     # misses that waited for another request's download
+            "evictions": 0,
+            "bytes_saved": 0,   # bytes served from disk instead of MinIO
+            "bytes_fetched": 0,
+            "prefetch_misses": 0,  # downloads started by app/services/prefetch_service.py
+        }
+        self._load()
+
+    def _load(self):
+        """Index what a previous process left behind (oldest first), drop partial downloads"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for directory, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if filename.startswith(".tmp-"):
+                    os.remove(path)
+                    continue
+                key_hash, _, etag = filename.partition(".")
+                stat = os.stat(path)
+                found.append((stat.st_mtime, key_hash, path, stat.st_size, etag))
+
+        for _, key_hash, path, size, etag in sorted(found):
+            self._entries[key_hash] = CacheEntry(path, os.path.relpath(path, self.cache_dir), size, f'"{etag}"')
+            self._size += size
+        self._evict()
+        logger.info(f"Segment cache: {len(self._entries)} files, {self._size / (1024*1024):.1f} MB in {self.cache_dir}")
+
+    @staticmethod
+    def _key_hash(bucket_name: str, object_name: str) -> str:
+        return hashlib.sha1(f"{bucket_name}/{object_name}".encode()).hexdigest()
+
+    def contains(self, bucket_name: str, object_name: str) -> bool:
+        """Cached or being downloaded"""
+        key_hash = self._key_hash(bucket_name, object_name)
+        with self._lock:
+            return key_hash in self._entries or key_hash in self._inflight
+
+    def get(self, bucket_name: str, object_name: str, prefetch: bool = False) -> CacheEntry:
+        """
+        The cached copy of an object, downloading it on a miss. The file stays on
+        disk until the entry is passed to release().
+
+        Args:
+            prefetch: Warming the cache, not serving a viewer - kept out of the hit/miss counts
+
+        Raises:
+            S3Error (e.g. NoSuchKey) from the download
+            SegmentFetchTimeout: A coalesced miss waited settings.segment_cache_fetch_timeout_seconds
+        """
+        key_hash = self._key_hash(bucket_name, object_name)
+        deadline = time.monotonic() + settings.segment_cache_fetch_timeout_seconds
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key_hash)
+                if entry is not None:
+                    self._entries.move_to_end(key_hash)
+                    self._hold(entry)
+                    if not prefetch:
+                        self._stats["hits"] += 1
+                        self._stats["bytes_saved"] += entry.size
+                    return entry
+
+                download = self._inflight.get(key_hash)
+                if download is None:
+                    download = self._inflight[key_hash] = threading.Event()
+                    self._stats["prefetch_misses" if prefetch else "misses"] += 1
+                    break
+                if not prefetch:
+                    self._stats["coalesced"] += 1
+
+            # Another request is downloading it - served from disk once it lands
+            # (if that download failed, the next round downloads it here)
+            if not download.wait(max(0.0, deadline - time.monotonic())):
+                raise SegmentFetchTimeout(f"Timed out waiting for the download of {object_name}")
+
+        try:
+            return self._fetch(key_hash, bucket_name, object_name)
+        finally:
+            with self._lock:
+                self._inflight.pop(key_hash).set()
+
+    def _fetch(self, key_hash: str, bucket_name: str, object_name: str) -> CacheEntry:
+        directory = os.path.join(self.cache_dir, key_hash[:2])
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+        try:
+            etag = minio_service.download_object(bucket_name, object_name, tmp_path)
+            path = os.path.join(directory, f"{key_hash}.{etag}")
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        size = os.path.getsize(path)
+        entry = CacheEntry(path, os.path.relpath(path, self.cache_dir), size, f'"{etag}"')
+        with self._lock:
+            previous = self._entries.pop(key_hash, None)
+            if previous is not None:
+                self._size -= previous.size
+                if previous.path != path:
+                    self._retired.append(previous)  # object changed in MinIO (new ETag)
+            self._entries[key_hash] = entry
+            self._size += size
+            self._stats["bytes_fetched"] += size
+            self._hold(entry)
+            self._evict()
+        return entry
+
+    @staticmethod
+    def _hold(entry: CacheEntry):
+        entry.refs += 1
+        entry.served_at = time.monotonic()
+
+    def release(self, entry: CacheEntry):
+        """The response that got this entry from get() is done with the file"""
+        with self._lock:
+            entry.refs -= 1
+            self._unlink_retired()
+
+    def _evict(self):
+        """Drop least recently served files until the cache fits (called with the lock held)"""
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            self._stats["evictions"] += 1
+            self._retired.append(entry)
+        self._unlink_retired()
+
+    def _unlink_retired(self):
+        """Remove the files of retired entries nobody can still be reading (called with the lock held)"""
+        if not self._retired:
+            return
+        grace_before = time.monotonic() - settings.segment_cache_unlink_grace_seconds
+        still_used = []
+        for entry in self._retired:
+            if entry.refs > 0 or entry.served_at > grace_before:
+                still_used.append(entry)
+                continue
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                logger.warning(f"Segment cache eviction of {entry.path} failed: {str(e)}")
+        self._retired = still_used
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["size_bytes"] = self._size
+            stats["retired_files"] = len(self._retired)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "host": socket.gethostname(),
+            **stats,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+_segment_cache: Optional[SegmentCache] = None
+_segment_cache_lock = threading.Lock()
+
+
+def get_segment_cache() -> SegmentCache:
+    """Created on first use, so only processes that serve segments scan the cache dir"""
+    global _segment_cache
+    with _segment_cache_lock:
+        if _segment_cache is None:
+            _segment_cache = SegmentCache(settings.segment_cache_dir, settings.segment_cache_max_bytes)
+        return _segment_cache
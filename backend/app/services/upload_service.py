@@ -0,0 +1,400 @@
+# Service layer - direct-to-storage uploads
+# /backend/app/services/upload_service.py
+
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import json
+import math
+import uuid
+import logging
+
+from app.core.config import get_settings
+from app.core.executors import call_storage_io
+from app.core.redis_client import get_redis
+from app.models.videos import Video
+from app.schemas.video import (
+    UploadSessionCreate,
+    UploadSessionComplete,
+    UploadSessionResponse,
+    UploadPartURL,
+    ResumableUploadResponse,
+    ResumableUploadStatus,
+    VideoMetadata
+)
+from app.services.minio_service import minio_service
+from app.services.video_service import video_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+# S3 allows at most 10,000 parts per multipart upload
+MAX_UPLOAD_PARTS = 10000
+
+
+class UploadService:
+    """
+    Presigned multipart uploads.
+
+    The API only hands out signed part URLs and assembles the parts at the end -
+    the video bytes go browser -> MinIO and never pass through a uvicorn worker.
+    Session state lives in Redis and expires with the presigned URLs.
+    """
+
+    def create_session(self, request: UploadSessionCreate, user_id: str) -> UploadSessionResponse:
+        """
+        Validate the upload, start a MinIO multipart upload and presign one URL per part.
+
+        Args:
+            request: File info and video metadata
+            user_id: ID of the uploading user
+
+        Returns:
+            Session ID, part size and the presigned part URLs
+
+        Raises:
+            HTTPException: On validation or storage errors
+        """
+        logger.info(f"Creating upload session for user {user_id}: {request.filename} ({request.file_size} bytes)")
+
+        session_id, session, expires = self._start_multipart(request, user_id)
+        object_name = session["object_name"]
+        upload_id = session["upload_id"]
+
+        try:
+            parts = [
+                UploadPartURL(
+                    part_number=part_number,
+                    url=minio_service.presign_video_part_upload(object_name, upload_id, part_number, expires)
+                )
+                for part_number in range(1, session["part_count"] + 1)
+            ]
+        except Exception as e:
+            logger.error(f"Failed to presign upload parts: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to prepare upload: {str(e)}")
+
+        thumbnail_upload_url = self._thumbnail_upload_url(session, expires)
+        self._save_session(session_id, session, expires)
+
+        logger.info(f"Upload session {session_id} created: {session['part_count']} parts of {settings.upload_part_size} bytes")
+
+        return UploadSessionResponse(
+            session_id=session_id,
+            object_name=object_name,
+            part_size=settings.upload_part_size,
+            parts=parts,
+            thumbnail_upload_url=thumbnail_upload_url,
+            expires_at=datetime.now(timezone.utc) + expires
+        )
+
+    def complete_session(
+        self,
+        db: Session,
+        session_id: str,
+        request: UploadSessionComplete,
+        user_id: str
+    ) -> Video:
+        """
+        Assemble the uploaded parts, then create the Video row and start processing.
+
+        Raises:
+            HTTPException: Unknown/expired session, missing parts, or size mismatch
+        """
+        redis_client = get_redis()
+        session = self._get_session(session_id, user_id)
+        if session.get("resumable"):
+            # Parts of a resumable upload are tracked by the API, the last PATCH completes it
+            raise HTTPException(status_code=400, detail="Resumable uploads are completed by their last chunk")
+
+        # Only one completion per session (double-clicks, client retries)
+        lock_key = f"{self._session_key(session_id)}:completing"
+        if not redis_client.set(lock_key, "1", nx=True, ex=300):
+            raise HTTPException(status_code=409, detail="Upload is already being completed")
+
+        try:
+            parts = {(p.part_number, p.etag) for p in request.parts}
+            expected = set(range(1, session["part_count"] + 1))
+            if {part_number for part_number, _ in parts} != expected or len(parts) != len(expected):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Expected ETags for parts 1-{session['part_count']}"
+                )
+
+            return self._finalize_session(db, session_id, session, list(parts), user_id)
+        finally:
+            redis_client.delete(lock_key)
+
+    def _finalize_session(self, db: Session, session_id: str, session: dict, parts: list, user_id: str) -> Video:
+        """Assemble the multipart object, verify it and hand it to the processing pipeline"""
+        object_name = session["object_name"]
+        try:
+            minio_service.complete_video_multipart_upload(object_name, session["upload_id"], parts)
+        except Exception as e:
+            # A retry after a later step failed: the upload is already assembled
+            if minio_service.get_object_size(settings.minio_bucket_videos, object_name) != session["file_size"]:
+                raise HTTPException(status_code=400, detail=f"Failed to assemble upload: {str(e)}")
+            logger.info(f"Upload {session_id} was already assembled, continuing")
+
+        stored_size = minio_service.get_object_size(settings.minio_bucket_videos, object_name)
+        if stored_size != session["file_size"]:
+            logger.error(f"Size mismatch for {object_name}: declared {session['file_size']}, stored {stored_size}")
+            self._delete_quietly(object_name)
+            self._delete_session(session_id)
+            raise HTTPException(status_code=400, detail="Uploaded size does not match the declared file size")
+
+        thumbnail_path = self._uploaded_thumbnail(session.get("thumbnail_path"))
+
+        try:
+            video = video_service.create_video_record(
+                db=db,
+                metadata=VideoMetadata(**session["metadata"]),
+                video_path=object_name,
+                thumbnail_path=thumbnail_path,
+                user_id=user_id,
+                file_size=stored_size
+            )
+        except HTTPException:
+            # Same rollback rule as the form upload: no DB row -> no orphaned object
+            self._delete_quietly(object_name)
+            raise
+
+        self._delete_session(session_id)
+        logger.info(f"Upload session {session_id} completed as video {video.id}")
+        return video
+
+    # ---------- Resumable (offset-based) uploads ----------
+
+    def create_resumable_session(self, request: UploadSessionCreate, user_id: str) -> ResumableUploadResponse:
+        """
+        Start an offset-based upload that goes through the API.
+
+        For clients that can't PUT to storage directly. Each PATCH carries one
+        chunk_size slice which is written straight into the MinIO multipart upload
+        as one part, so a dropped connection only costs the chunk in flight.
+
+        Raises:
+            HTTPException: On validation or storage errors
+        """
+        logger.info(f"Creating resumable upload for user {user_id}: {request.filename} ({request.file_size} bytes)")
+
+        session_id, session, expires = self._start_multipart(request, user_id)
+        session["resumable"] = True
+        session["offset"] = 0
+        thumbnail_upload_url = self._thumbnail_upload_url(session, expires)
+        self._save_session(session_id, session, expires)
+
+        return ResumableUploadResponse(
+            session_id=session_id,
+            object_name=session["object_name"],
+            chunk_size=settings.upload_part_size,
+            offset=0,
+            file_size=session["file_size"],
+            thumbnail_upload_url=thumbnail_upload_url,
+            expires_at=datetime.now(timezone.utc) + expires
+        )
+
+    def get_resumable_status(self, session_id: str, user_id: str) -> ResumableUploadStatus:
+        """Committed offset of an upload - where the client resumes after a drop"""
+        session = self._get_session(session_id, user_id)
+        return ResumableUploadStatus(
+            session_id=session_id,
+            offset=session.get("offset", 0),
+            file_size=session["file_size"]
+        )
+
+    def append_chunk(
+        self,
+        db: Session,
+        session_id: str,
+        offset: int,
+        data: bytes,
+        user_id: str
+    ) -> ResumableUploadStatus:
+        """
+        Write one chunk at the given offset. The last chunk also completes the upload.
+
+        Chunk N always maps to multipart part N+1, so re-sending a chunk whose
+        offset was never committed (e.g. response lost) just overwrites that part.
+        Once every byte is committed, an empty chunk at offset == file_size only
+        retries the completion (after a failed finalize).
+
+        Raises:
+            HTTPException: 409 on offset mismatch or a concurrent request, 400 on bad chunk size
+        """
+        redis_client = get_redis()
+        session = self._get_session(session_id, user_id)
+        if not session.get("resumable"):
+            raise HTTPException(status_code=400, detail="Upload session is not resumable")
+
+        lock_key = f"{self._session_key(session_id)}:lock"
+        if not redis_client.set(lock_key, "1", nx=True, ex=300):
+            raise HTTPException(status_code=409, detail="Another chunk for this upload is in progress")
+
+        try:
+            # Re-read under the lock: the offset may have moved since the first read
+            session = self._get_session(session_id, user_id)
+            committed = session["offset"]
+            if offset != committed:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Offset mismatch: upload is at {committed}, got {offset}"
+                )
+
+            chunk_size = settings.upload_part_size
+            remaining = session["file_size"] - committed
+            expected = min(chunk_size, remaining)
+            if len(data) != expected:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Chunk at offset {offset} must be exactly {expected} bytes, got {len(data)}"
+                )
+
+            if remaining > 0:
+                part_number = committed // chunk_size + 1
+                try:
+                    etag = call_storage_io(
+                        minio_service.upload_video_part, session["object_name"], session["upload_id"], part_number, data
+                    )
+                except Exception as e:
+                    raise HTTPException(status_code=502, detail=f"Failed to store chunk: {str(e)}")
+
+                # Part ETags live next to the session and expire with it
+                session_ttl = redis_client.ttl(self._session_key(session_id))
+                session["offset"] = committed + len(data)
+                pipe = redis_client.pipeline()
+                pipe.hset(self._parts_key(session_id), str(part_number), etag)
+                pipe.expire(self._parts_key(session_id), max(session_ttl, 1))
+                pipe.set(self._session_key(session_id), json.dumps(session), keepttl=True)
+                pipe.execute()
+                logger.info(f"Upload {session_id}: part {part_number} stored, offset {session['offset']}/{session['file_size']}")
+            else:
+                logger.info(f"Upload {session_id}: retrying completion")
+
+            if session["offset"] < session["file_size"]:
+                return ResumableUploadStatus(
+                    session_id=session_id,
+                    offset=session["offset"],
+                    file_size=session["file_size"]
+                )
+
+            parts = [
+                (int(part_number), etag)
+                for part_number, etag in redis_client.hgetall(self._parts_key(session_id)).items()
+            ]
+            video = self._finalize_session(db, session_id, session, parts, user_id)
+            return ResumableUploadStatus(
+                session_id=session_id,
+                offset=session["file_size"],
+                file_size=session["file_size"],
+                completed=True,
+                video_id=str(video.id)
+            )
+        finally:
+            redis_client.delete(lock_key)
+
+    def abort_session(self, session_id: str, user_id: str):
+        """Cancel an upload and let MinIO drop the parts stored so far"""
+        session = self._get_session(session_id, user_id)
+
+        try:
+            minio_service.abort_video_multipart_upload(session["object_name"], session["upload_id"])
+        except Exception as e:
+            logger.warning(f"Abort failed for session {session_id} (parts expire with MinIO lifecycle): {str(e)}")
+
+        self._delete_session(session_id)
+        logger.info(f"Upload session {session_id} aborted")
+
+    def _start_multipart(self, request: UploadSessionCreate, user_id: str):
+        """Validate the declared file and open the MinIO multipart upload both upload modes write into"""
+        video_service.validate_video_content_type(request.content_type)
+        if request.thumbnail_content_type:
+            video_service.validate_thumbnail_content_type(request.thumbnail_content_type)
+
+        if request.file_size > settings.upload_max_video_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Video too large. Maximum size is {settings.upload_max_video_size // (1024**3)} GB"
+            )
+
+        part_count = math.ceil(request.file_size / settings.upload_part_size)
+        if part_count > MAX_UPLOAD_PARTS:
+            raise HTTPException(status_code=400, detail="Video needs more than 10000 parts at the configured part size")
+
+        file_extension = request.filename.split(".")[-1]
+        object_name = f"user-{user_id}/{uuid.uuid4()}.{file_extension}"
+        expires = timedelta(minutes=settings.upload_session_ttl_minutes)
+
+        try:
+            upload_id = minio_service.create_video_multipart_upload(object_name, request.content_type)
+        except Exception as e:
+            logger.error(f"Failed to prepare upload session: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to prepare upload: {str(e)}")
+
+        thumbnail_path = None
+        if request.thumbnail_content_type:
+            thumbnail_extension = request.thumbnail_content_type.split("/")[-1]
+            thumbnail_path = f"user-{user_id}/{uuid.uuid4()}.{thumbnail_extension}"
+
+        session = {
+            "user_id": str(user_id),
+            "object_name": object_name,
+            "upload_id": upload_id,
+            "file_size": request.file_size,
+            "part_count": part_count,
+            "thumbnail_path": thumbnail_path,
+            "metadata": request.metadata.model_dump(),
+        }
+        return str(uuid.uuid4()), session, expires
+
+    def _thumbnail_upload_url(self, session: dict, expires: timedelta) -> Optional[str]:
+        if not session["thumbnail_path"]:
+            return None
+        try:
+            return minio_service.presign_thumbnail_upload(session["thumbnail_path"], expires)
+        except Exception as e:
+            logger.error(f"Failed to presign thumbnail upload: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to prepare upload: {str(e)}")
+
+    def _session_key(self, session_id: str) -> str:
+        return f"upload:session:{session_id}"
+
+    def _parts_key(self, session_id: str) -> str:
+        return f"upload:session:{session_id}:parts"
+
+    def _save_session(self, session_id: str, session: dict, expires: timedelta):
+        get_redis().set(self._session_key(session_id), json.dumps(session), ex=int(expires.total_seconds()))
+
+    def _delete_session(self, session_id: str):
+        get_redis().delete(self._session_key(session_id), self._parts_key(session_id))
+
+    def _get_session(self, session_id: str, user_id: str) -> dict:
+        raw = get_redis().get(self._session_key(session_id))
+        if not raw:
+            raise HTTPException(status_code=404, detail="Upload session not found or expired")
+
+        session = json.loads(raw)
+        if session["user_id"] != str(user_id):
+            raise HTTPException(status_code=403, detail="Not authorized to access this upload")
+
+        return session
+
+    def _uploaded_thumbnail(self, thumbnail_path: Optional[str]) -> Optional[str]:
+        """Thumbnail is optional: keep the path only if the browser actually uploaded it"""
+        if not thumbnail_path:
+            return None
+        if minio_service.get_object_size(settings.minio_bucket_thumbnails, thumbnail_path) is None:
+            logger.warning(f"Thumbnail was not uploaded, continuing without it: {thumbnail_path}")
+            return None
+        return thumbnail_path
+
+    def _delete_quietly(self, object_name: str):
+        try:
+            minio_service.delete_video(object_name)
+        except Exception as e:
+            logger.error(f"Manual cleanup may be required for video: {object_name} ({str(e)})")
+
+
+# Singleton instance
+upload_service = UploadService()
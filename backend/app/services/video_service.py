@@ -2,21 +2,34 @@
 # /backend/app/services/video_service.py
 
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, desc, asc
+from sqlalchemy import or_, desc, asc, update, text
 from app.schemas.video import VideoCreate, VideoMetadata
 from app.models.videos import Video
 from app.services.minio_service import minio_service
 from app.models.users import User  
 from app.schemas.video import VideoProcessingStatusResponse
-from app.utils.video_helpers import DEFAULT_META, STATUS_META, ProcessingStatus
+from app.utils.video_helpers import DEFAULT_META, STATUS_META, ProcessingStatus, reuse_processed_duplicate
+from app.core.config import get_settings
+from app.services.progress_service import (
+    init_progress, read_progress, progress_snapshot, is_stale, clear_progress, TERMINAL_STATUSES
+)
+from app.services.view_counter import record_view, overlay_views, forget_views
+from app.core.redis_client import get_redis
+from app.utils.pagination import keyset_page
 
 from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.core.executors import run_storage_io
 from typing import Optional, List, Tuple
 import json
+import hashlib
+import uuid
+import redis
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 class VideoService:
     """Business logic for video operations"""
@@ -96,7 +109,7 @@ class VideoService:
             # Step 4: Upload video to MinIO
             logger.info("Step 4: Uploading video to MinIO")
             try:
-                video_path = await minio_service.upload_video(video_file, user_id)
+                video_path, content_sha256 = await minio_service.upload_video(video_file, user_id)
                 logger.info(f"Video uploaded successfully to MinIO: {video_path}")
             except Exception as e:
                 logger.error(f"Video upload to MinIO failed: {str(e)}")
@@ -126,74 +139,19 @@ class VideoService:
             else:
                 logger.info("Step 5: No thumbnail provided, skipping thumbnail upload")
             
-            # Step 6: Parse release date
-            logger.info("Step 6: Processing release date")
-            release_date = None
-            if metadata.releaseDate:
-                try:
-                    release_date = datetime.fromisoformat(
-                        metadata.releaseDate.replace('Z', '+00:00')
-                    ).date()
-                    logger.info(f"Release date parsed: {release_date}")
-                except Exception as e:
-                    logger.warning(f"Failed to parse release date: {str(e)}")
-                    logger.warning("Continuing without release date")
-                    release_date = None
-            else:
-                logger.info("No release date provided")
-            
-            # Step 7: Prepare database record
-            logger.info("Step 7: Preparing database record")
-            is_public = metadata.status == "published"
-            logger.info(f"Video visibility: {'public' if is_public else 'private'}")
-            
-            db_video = Video(
-                title=metadata.title,
-                description=metadata.description,
-                category=metadata.category,
-                raw_video_path=video_path,
-                thumbnail_url=thumbnail_path,
-                age_rating=metadata.ageRating,
-                release_date=release_date,
-                director=metadata.director,
-                cast=metadata.cast,
-                tags=metadata.tags if metadata.tags else [],
-                is_public=is_public,
-                status=metadata.status,
-                processing_status="queued",
+            # Steps 6-8: Create the database record and start processing
+            # (sync DB + broker calls, so off the event loop)
+            db_video = await run_in_threadpool(
+                self.create_video_record,
+                db=db,
+                metadata=metadata,
+                video_path=video_path,
+                thumbnail_path=thumbnail_path,
                 user_id=user_id,
-                views_count=0,
-                likes_count=0
+                content_sha256=content_sha256,
+                file_size=video_file.size
             )
-            
-            # Step 8: Insert into database
-            logger.info("Step 8: Inserting record into database")
-            try:
-                db.add(db_video)
-                db.commit()
-                db_committed = True
-                db.refresh(db_video)
-                logger.info(f"Database record created successfully: video_id={db_video.id}")
-
-                if db_committed:
-                   from app.tasks.workflows import start_video_processing
-                   
-                   try:
-                    task_result = start_video_processing(db_video.id)
-                    db_video.celery_task_id = task_result.id
-                    db.commit()
-                    logger.info(f"Video processing pipeline started for video_id: {task_result.id}")
-                   except Exception as e:
-                       logger.error(f"Failed to start processing workflow: {str(e)}")
-                    
-            except Exception as e:
-                logger.error(f"Database insertion failed: {str(e)}")
-                db.rollback()
-                logger.info("Database transaction rolled back")
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Failed to save video metadata to database: {str(e)}"
-                )
+            db_committed = True
             
             # Success
             logger.info("Video creation process completed successfully")
@@ -225,7 +183,7 @@ class VideoService:
                 if video_path:
                     logger.info(f"Attempting to delete video from MinIO: {video_path}")
                     try:
-                        minio_service.delete_video(video_path)
+                        await run_storage_io(minio_service.delete_video, video_path)
                         logger.info("Video deleted from MinIO successfully")
                     except Exception as cleanup_error:
                         logger.error(f"Failed to cleanup video from MinIO: {str(cleanup_error)}")
@@ -235,7 +193,7 @@ class VideoService:
                 if thumbnail_path:
                     logger.info(f"Attempting to delete thumbnail from MinIO: {thumbnail_path}")
                     try:
-                        minio_service.delete_thumbnail(thumbnail_path)
+                        await run_storage_io(minio_service.delete_thumbnail, thumbnail_path)
                         logger.info("Thumbnail deleted from MinIO successfully")
                     except Exception as cleanup_error:
                         logger.error(f"Failed to cleanup thumbnail from MinIO: {str(cleanup_error)}")
@@ -243,6 +201,121 @@ class VideoService:
             else:
                 logger.info("Database commit successful, no cleanup required")
     
+    def create_video_record(
+        self,
+        db: Session,
+        metadata: VideoMetadata,
+        video_path: str,
+        thumbnail_path: Optional[str],
+        user_id: str,
+        content_sha256: Optional[str] = None,
+        file_size: Optional[int] = None
+    ) -> Video:
+        """
+        Save a video whose files are already in MinIO and start its processing workflow.
+        Shared by the form upload (create_video_with_files) and direct-to-storage uploads.
+        
+        Args:
+            db: Database session
+            metadata: Validated video metadata
+            video_path: Object name of the raw video in the videos bucket
+            thumbnail_path: Object name of the thumbnail (optional)
+            user_id: ID of the uploading user
+            content_sha256: SHA-256 of the raw video if known; otherwise prepare_video computes it
+            file_size: Size of the raw video in bytes, used for the processing priority
+            
+        Returns:
+            Created Video object
+            
+        Raises:
+            HTTPException: If the database insert fails
+        """
+        # Step 6: Parse release date
+        logger.info("Step 6: Processing release date")
+        release_date = None
+        if metadata.releaseDate:
+            try:
+                release_date = datetime.fromisoformat(
+                    metadata.releaseDate.replace('Z', '+00:00')
+                ).date()
+                logger.info(f"Release date parsed: {release_date}")
+            except Exception as e:
+                logger.warning(f"Failed to parse release date: {str(e)}")
+                logger.warning("Continuing without release date")
+                release_date = None
+        else:
+            logger.info("No release date provided")
+        
+        # Step 7: Prepare database record
+        logger.info("Step 7: Preparing database record")
+        is_public = metadata.status == "published"
+        logger.info(f"Video visibility: {'public' if is_public else 'private'}")
+        
+        db_video = Video(
+            title=metadata.title,
+            description=metadata.description,
+            category=metadata.category,
+            raw_video_path=video_path,
+            thumbnail_url=thumbnail_path,
+            content_sha256=content_sha256,
+            age_rating=metadata.ageRating,
+            release_date=release_date,
+            director=metadata.director,
+            cast=metadata.cast,
+            tags=metadata.tags if metadata.tags else [],
+            is_public=is_public,
+            status=metadata.status,
+            processing_status="queued",
+            user_id=user_id,
+            views_count=0,
+            likes_count=0
+        )
+        
+        # Step 8: Insert into database
+        logger.info("Step 8: Inserting record into database")
+        try:
+            db.add(db_video)
+            db.commit()
+            db.refresh(db_video)
+            logger.info(f"Database record created successfully: video_id={db_video.id}")
+        except Exception as e:
+            logger.error(f"Database insertion failed: {str(e)}")
+            db.rollback()
+            logger.info("Database transaction rolled back")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to save video metadata to database: {str(e)}"
+            )
+        
+        # Same bytes already processed -> reuse those renditions, no pipeline run
+        if settings.content_dedup_enabled and reuse_processed_duplicate(db, db_video):
+            logger.info(f"Duplicate content, processing skipped for video_id: {db_video.id}")
+            return db_video
+        
+        # Start the processing pipeline (non-critical: the video row stays "queued").
+        # The scheduler may hold it back while the uploader is at their concurrency cap.
+        from app.tasks.scheduler import schedule_video_processing
+        
+        init_progress(db_video.id, user_id)
+        
+        try:
+            task_result = schedule_video_processing(
+                db_video.id,
+                user_id,
+                file_size=file_size,
+                metadata=db_video.processing_metadata
+            )
+            if task_result is None:
+                logger.info(f"Video {db_video.id} queued until one of the user's videos finishes")
+                return db_video
+            db_video.celery_task_id = task_result.id
+            db.commit()
+            logger.info(f"Video processing pipeline started for video_id: {task_result.id}")
+        except Exception as e:
+            logger.error(f"Failed to start processing workflow: {str(e)}")
+        
+        return db_video
+
     def _validate_video_file(self, file: UploadFile):
         """
         Validate video file type
@@ -305,6 +378,22 @@ class VideoService:
         video_id: str,
         current_user: User,
     ) -> VideoProcessingStatusResponse:
+        # In-flight videos: answer from the live progress in Redis, no Postgres query
+        # (unless it stopped updating - a dead pipeline, see is_stale)
+        progress = read_progress(video_id)
+        if (
+            progress
+            and progress.get("user_id")
+            and progress.get("status") not in TERMINAL_STATUSES
+            and not is_stale(progress)
+        ):
+            if progress["user_id"] != str(current_user.id):
+                raise HTTPException(status_code=403, detail="Not authorized to access this video")
+            try:
+                return VideoProcessingStatusResponse(**progress_snapshot(video_id, progress))
+            except ValueError:
+                logger.warning(f"Unexpected progress record for {video_id}, falling back to the database")
+
         video = db.query(Video).filter(Video.id == video_id).first()
 
         if not video:
@@ -337,6 +426,38 @@ class VideoService:
             is_failed=is_failed,
         )
 
+    def expedite_video_processing_service(self, db: Session, video_id: str) -> dict:
+        """
+        Admin override: run this video next, ignoring its uploader's concurrency cap
+        
+        Raises:
+            HTTPException: 404 if the video doesn't exist, 409 if it isn't waiting or processing
+        """
+        from app.tasks.scheduler import expedite_video_processing
+
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if not video:
+            raise HTTPException(status_code=404, detail="Video not found")
+
+        if str(video.processing_status) in TERMINAL_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Video is already {video.processing_status}")
+
+        try:
+            result = expedite_video_processing(video_id)
+        except Exception as e:
+            logger.error(f"Failed to expedite {video_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to expedite video: {str(e)}")
+
+        if result is None:
+            raise HTTPException(status_code=409, detail="Video is not scheduled for processing")
+
+        if result["celery_task_id"]:
+            video.celery_task_id = result["celery_task_id"]
+            db.commit()
+
+        logger.info(f"Video {video_id} expedited by admin ({result['state']})")
+        return {"video_id": video_id, **result}
+
     
     def get_video_by_id(self, db: Session, video_id: str, user_id: Optional[str] = None) -> Video:
         """Get video by ID with optional access control"""
@@ -349,29 +470,32 @@ class VideoService:
         if not video.is_public and video.user_id != user_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
+        overlay_views([video])
         return video
     
-    def get_user_videos(self, db: Session, user_id: str, skip: int = 0, limit: int = 20) -> List[Video]:
-        """Get all videos for a specific user"""
-        return (
-            db.query(Video)
-            .filter(Video.user_id == user_id)
-            .order_by(Video.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+    def get_user_videos(
+        self, db: Session, user_id: str, skip: int = 0, limit: int = 20, cursor: Optional[str] = None
+    ) -> Tuple[List[Video], Optional[str]]:
+        """
+        A page of a user's videos, newest first.
+        Returns tuple of (videos, next_cursor) - see app/utils/pagination.py
+        """
+        query = db.query(Video).filter(Video.user_id == user_id)
+        videos, next_cursor = keyset_page(query, limit, cursor, skip=skip)
+        overlay_views(videos)
+        return videos, next_cursor
     
-    def get_public_videos(self, db: Session, skip: int = 0, limit: int = 20) -> List[Video]:
-        """Get all public videos"""
-        return (
-            db.query(Video)
-            .filter(Video.is_public == True, Video.status == "published")
-            .order_by(Video.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+    def get_public_videos(
+        self, db: Session, skip: int = 0, limit: int = 20, cursor: Optional[str] = None
+    ) -> Tuple[List[Video], Optional[str]]:
+        """
+        A page of public videos, newest first.
+        Returns tuple of (videos, next_cursor) - see app/utils/pagination.py
+        """
+        query = db.query(Video).filter(Video.is_public == True, Video.status == "published")
+        videos, next_cursor = keyset_page(query, limit, cursor, skip=skip)
+        overlay_views(videos)
+        return videos, next_cursor
     
     def delete_video(self, db: Session, video_id: str, user_id: str) -> bool:
         """Delete video and associated files"""
@@ -393,35 +517,67 @@ class VideoService:
             # Delete database record
             db.delete(video)
             db.commit()
+            forget_views(video_id)
+            clear_progress(video_id)
+
+            # A queued video must not be dispatched, an in-flight one must not keep its slot
+            from app.tasks.scheduler import release_processing_slot
+            release_processing_slot(video_id)
             
             return True
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to delete video: {str(e)}")
     
-    def increment_views(self, db: Session, video_id: str):
-        """Increment video view count"""
-        video = db.query(Video).filter(Video.id == video_id).first()
-        if video:
-            video.views_count += 1
+    def increment_views(self, db: Session, video_id: str, viewer: str):
+        """
+        Count a play in Redis (flushed to Postgres by flush_view_counts).
+
+        Args:
+            viewer: User ID, or client address + user agent (unique viewer estimate)
+        """
+        try:
+            uuid.UUID(video_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Video not found")
+        # Primary key lookup, no row lock: keeps made-up IDs out of the Redis buffer
+        if db.query(Video.id).filter(Video.id == video_id).first() is None:
+            raise HTTPException(status_code=404, detail="Video not found")
+
+        try:
+            record_view(video_id, viewer)
+        except redis.RedisError as e:
+            logger.warning(f"View buffer unavailable, counting {video_id} in Postgres: {str(e)}")
+            db.execute(
+                update(Video)
+                .where(Video.id == video_id)
+                .values(views_count=Video.views_count + 1)
+            )
             db.commit()
     
     def _validate_video_file(self, file: UploadFile):
         """Validate video file type and size"""
+        self.validate_video_content_type(file.content_type)
+    
+    def _validate_thumbnail_file(self, file: UploadFile):
+        """Validate thumbnail file type"""
+        self.validate_thumbnail_content_type(file.content_type)
+
+    def validate_video_content_type(self, content_type: Optional[str]):
+        """Validate a video MIME type (also used when the file itself never reaches the API)"""
         ALLOWED_VIDEO_TYPES = ["video/mp4", "video/quicktime", "video/webm"]
-        MAX_VIDEO_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
         
-        if file.content_type not in ALLOWED_VIDEO_TYPES:
+        if content_type not in ALLOWED_VIDEO_TYPES:
             raise HTTPException(
                 status_code=400,
                 detail=f"Invalid video format. Allowed: MP4, MOV, WebM"
             )
-    
-    def _validate_thumbnail_file(self, file: UploadFile):
-        """Validate thumbnail file type"""
+
+    def validate_thumbnail_content_type(self, content_type: Optional[str]):
+        """Validate a thumbnail MIME type"""
         ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp"]
         
-        if file.content_type not in ALLOWED_IMAGE_TYPES:
+        if content_type not in ALLOWED_IMAGE_TYPES:
             raise HTTPException(
                 status_code=400,
                 detail=f"Invalid thumbnail format. Allowed: JPEG, PNG, WebP"
@@ -462,15 +618,23 @@ class VideoService:
         search: Optional[str] = None,
         user_id: Optional[str] = None,
         sort_by: str = "created_at",
-        sort_order: str = "desc"
-    ) -> Tuple[List[Video], int]:
+        sort_order: str = "desc",
+        cursor: Optional[str] = None,
+        count: str = "exact"
+    ) -> dict:
         """
         Get videos for admin panel with filtering, searching, and sorting
-        Returns tuple of (videos, total_count)
+        Returns {"items", "total", "total_is_estimate", "next_cursor", "has_more"}
+
+        - sort_by=created_at pages by cursor (keyset on created_at, id); other
+          sort fields page by skip only
+        - count="estimated": pg_class.reltuples without filters, otherwise a
+          count cached for settings.admin_count_cache_seconds
         """
         print("ADMIN VIDEOS API HIT")
         # BASE QUERY
         query = db.query(Video).options(joinedload(Video.user))
+        filters = {"status": status, "processing_status": processing_status, "user_id": user_id, "search": search}
         
         # Apply filters on BASE QUERY
         if status:
@@ -491,26 +655,73 @@ class VideoService:
                 )
             )
         
-        # Get total count before pagination // this also triggers a DB call that executes the query we've been building till now
-        total = query.count()
-        
-        # Apply sorting
-        sort_column = getattr(Video, sort_by, Video.created_at)
-        if sort_order == "asc":
-            query = query.order_by(asc(sort_column))
+        if count == "estimated":
+            total, estimated = self._estimated_video_count(db, query, filters), True
         else:
-            query = query.order_by(desc(sort_column))
+            # this also triggers a DB call that executes the query we've been building till now
+            total, estimated = query.count(), False
         
-        # Apply pagination
-        videos = query.offset(skip).limit(limit).all()
+        if sort_by == "created_at":
+            videos, next_cursor = keyset_page(query, limit, cursor, descending=sort_order != "asc", skip=skip)
+            has_more = next_cursor is not None
+        else:
+            if cursor:
+                raise HTTPException(status_code=400, detail="Cursor pagination requires sort_by=created_at")
+            # Apply sorting (id breaks ties so pages don't overlap)
+            sort_column = getattr(Video, sort_by, Video.created_at)
+            direction = asc if sort_order == "asc" else desc
+            query = query.order_by(direction(sort_column), direction(Video.id))
+            
+            # Apply pagination (one extra row tells whether there is a next page)
+            videos = query.offset(skip).limit(limit + 1).all()
+            next_cursor = None
+            has_more = len(videos) > limit
+            videos = videos[:limit]
         
+        overlay_views(videos)
+
         # Attach user info to each video for the response
         for video in videos:
             if video.user:
                 video.user_email = video.user.email
                 video.user_username = video.user.username
         
-        return videos, total
+        return {
+            "items": videos,
+            "total": total,
+            "total_is_estimate": estimated,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+
+    def _estimated_video_count(self, db: Session, query, filters: dict) -> int:
+        """
+        Row count without scanning the filtered set: the planner's estimate of the
+        whole table, or a recent exact count of the same filters (Redis).
+        """
+        if not any(filters.values()):
+            reltuples = db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'videos'::regclass")
+            ).scalar()
+            # -1 / 0 until the table has been vacuumed or analyzed
+            if reltuples and reltuples > 0:
+                return int(reltuples)
+            return query.count()
+
+        key = "videos:count:" + hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+        try:
+            cached = get_redis().get(key)
+            if cached is not None:
+                return int(cached)
+        except redis.RedisError as e:
+            logger.warning(f"Video count cache read failed: {str(e)}")
+
+        total = query.count()
+        try:
+            get_redis().set(key, total, ex=settings.admin_count_cache_seconds)
+        except redis.RedisError as e:
+            logger.warning(f"Video count cache write failed: {str(e)}")
+        return total
 
 
 
@@ -0,0 +1,206 @@
+# Service layer - buffered view counts
+# /backend/app/services/view_counter.py
+"""
+View counts are counted in Redis and written to Postgres in batches.
+
+A play costs one HINCRBY and one PFADD instead of a row lock and a commit, so a
+viral title doesn't turn its videos row into a write hotspot. flush_view_counts
+(Celery beat, every settings.view_flush_interval_seconds) moves the deltas into
+videos.views_count with one UPDATE ... FROM (VALUES ...) per batch, and read
+paths add what hasn't been flushed yet (overlay_views).
+
+- Pending:  hash  views:pending          (video_id -> plays since the last flush)
+- Flushing: hash  views:flushing         (the deltas a flush is writing; retried if it failed)
+- Flush ID: string views:flushing:id     (ID of that batch, recorded in the view_flushes table)
+- Lock:     string views:flush:lock      (one flush at a time)
+- Unique:   HyperLogLog views:unique:{video_id}  (distinct viewers, ~0.8% error; expires
+            settings.view_unique_ttl_seconds after the last play, dropped with the video)
+
+A batch's flush ID is inserted into view_flushes in the same transaction as its
+UPDATEs. A retry of a batch that was committed (the flush died, or its lock
+expired, before views:flushing was deleted) finds the ID and only drops the
+batch, so every play is counted once.
+"""
+
+from typing import Iterable, Optional
+import uuid
+import logging
+
+import redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import get_settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+PENDING_KEY = "views:pending"
+FLUSHING_KEY = "views:flushing"
+FLUSH_ID_KEY = "views:flushing:id"
+FLUSH_LOCK_KEY = "views:flush:lock"
+LEDGER_RETENTION_HOURS = 24  # view_flushes rows kept (a stuck batch is retried every flush interval)
+
+# Move views:pending aside under a new flush ID, unless a batch is still waiting;
+# returns the ID of the batch to write (nil: nothing to flush)
+_START_FLUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return false
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('SET', KEYS[3], ARGV[1])
+elseif redis.call('EXISTS', KEYS[3]) == 0 then
+    redis.call('SET', KEYS[3], ARGV[1])
+end
+return redis.call('GET', KEYS[3])
+"""
+
+# Drop the written batch - unless it was already replaced by a newer one
+_FINISH_FLUSH_SCRIPT = """
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1], KEYS[2])
+end
+return 0
+"""
+
+# Release the lock only if this flush still holds it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def unique_key(video_id: str) -> str:
+    return f"views:unique:{video_id}"
+
+
+def record_view(video_id: str, viewer: str):
+    """
+    Count a play and its viewer (user ID, or client address + user agent).
+
+    Raises:
+        redis.RedisError: The caller falls back to a direct UPDATE
+    """
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hincrby(PENDING_KEY, video_id, 1)
+    pipe.pfadd(unique_key(video_id), viewer)
+    pipe.expire(unique_key(video_id), settings.view_unique_ttl_seconds)
+    pipe.execute()
+
+
+def forget_views(video_id: str):
+    """Drop the buffered plays and unique viewers of a deleted video"""
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hdel(PENDING_KEY, video_id)
+        pipe.delete(unique_key(video_id))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"View buffer cleanup failed for {video_id}: {str(e)}")
+
+
+def unique_viewers(video_id: str) -> Optional[int]:
+    try:
+        return get_redis().pfcount(unique_key(video_id))
+    except redis.RedisError as e:
+        logger.warning(f"Unique viewer count failed for {video_id}: {str(e)}")
+        return None
+
+
+def pending_views(video_ids: list) -> dict:
+    """Plays not in Postgres yet, by video ID (Redis errors: none)"""
+    if not video_ids:
+        return {}
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hmget(PENDING_KEY, video_ids)
+        pipe.hmget(FLUSHING_KEY, video_ids)
+        pending, flushing = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Pending view count read failed: {str(e)}")
+        return {}
+
+    deltas = {}
+    for video_id, a, b in zip(video_ids, pending, flushing):
+        delta = int(a or 0) + int(b or 0)
+        if delta:
+            deltas[video_id] = delta
+    return deltas
+
+
+def overlay_views(videos: Iterable):
+    """
+    Add unflushed plays to loaded Video rows. The rows are not marked dirty,
+    so a later commit in the same session doesn't write the overlay back.
+    """
+    videos = [video for video in videos if video is not None]
+    deltas = pending_views([video.id for video in videos])
+    for video in videos:
+        if video.id in deltas:
+            set_committed_value(video, "views_count", (video.views_count or 0) + deltas[video.id])
+
+
+def flush_pending(db: Session) -> int:
+    """
+    Write buffered plays to videos.views_count.
+
+    Returns:
+        Number of videos updated (0 if another flush holds the lock)
+    """
+    redis_client = get_redis()
+    token = uuid.uuid4().hex
+    if not redis_client.set(FLUSH_LOCK_KEY, token, nx=True, ex=settings.view_flush_lock_seconds):
+        return 0
+
+    try:
+        # Deltas left by a failed flush go first; new plays keep landing in views:pending
+        flush_id = redis_client.eval(
+            _START_FLUSH_SCRIPT, 3, PENDING_KEY, FLUSHING_KEY, FLUSH_ID_KEY, uuid.uuid4().hex
+        )
+        if not flush_id:
+            return 0  # no plays since the last flush
+
+        deltas = [(video_id, int(delta)) for video_id, delta in redis_client.hgetall(FLUSHING_KEY).items()]
+
+        # Blocks on a concurrent flush of the same batch until it commits, then finds its row
+        applied = db.execute(
+            text("INSERT INTO view_flushes (id) VALUES (:id) ON CONFLICT (id) DO NOTHING RETURNING id"),
+            {"id": flush_id}
+        ).first()
+        if applied is None:
+            logger.warning(f"View flush {flush_id} was already applied, dropping the batch")
+            db.rollback()
+            redis_client.eval(_FINISH_FLUSH_SCRIPT, 2, FLUSHING_KEY, FLUSH_ID_KEY, flush_id)
+            return 0
+
+        batch_size = settings.view_flush_batch_size
+        for start in range(0, len(deltas), batch_size):
+            batch = deltas[start:start + batch_size]
+            values = ", ".join(f"(:id{i}, :delta{i})" for i in range(len(batch)))
+            params = {}
+            for i, (video_id, delta) in enumerate(batch):
+                params[f"id{i}"] = video_id
+                params[f"delta{i}"] = delta
+            db.execute(
+                text(
+                    "UPDATE videos SET views_count = COALESCE(videos.views_count, 0) + v.delta "
+                    f"FROM (VALUES {values}) AS v(id, delta) WHERE videos.id = v.id"
+                ),
+                params
+            )
+        db.execute(
+            text(f"DELETE FROM view_flushes WHERE applied_at < now() - interval '{LEDGER_RETENTION_HOURS} hours'")
+        )
+        db.commit()
+        redis_client.eval(_FINISH_FLUSH_SCRIPT, 2, FLUSHING_KEY, FLUSH_ID_KEY, flush_id)
+
+        logger.info(f"Flushed {sum(delta for _, delta in deltas)} views of {len(deltas)} videos (flush {flush_id})")
+        return len(deltas)
+    finally:
+        redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, FLUSH_LOCK_KEY, token)
@@ -1,2 +1,4 @@
 from .video_tasks import *
-from .workflows import create_video_processing_workflow, start_video_processing
\ No newline at end of file
+from .workflows import create_video_processing_workflow, start_video_processing
+from .view_counts import flush_view_counts
+from .scheduler import reap_processing_slots
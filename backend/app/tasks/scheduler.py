@@ -0,0 +1,285 @@
+# /backend/app/tasks/scheduler.py
+"""
+Admission control in front of start_video_processing.
+
+- Priority:   short / small sources first (Celery priority on the Redis broker: 0 = most urgent)
+- Fair share: at most settings.processing_max_jobs_per_user pipelines in flight per uploader.
+              The rest wait in that user's pending set (most urgent first, FIFO within a tier)
+              and are released one by one as the user's running videos complete or fail.
+              Slots of pipelines that never report back (killed worker) expire after
+              settings.processing_slot_timeout_seconds; reap_processing_slots (Celery beat)
+              then starts the waiting videos even if the user uploads nothing new.
+- Expedite:   an admin can push one video to priority 0, past its uploader's cap
+
+Redis keys:
+- Job:     hash  scheduler:job:{video_id}          (user_id, priority, expedited, state)
+- Running: zset  scheduler:user:{user_id}:running  (video_id -> admitted at)
+- Pending: zset  scheduler:user:{user_id}:pending  (video_id -> priority * 1e10 + queued at)
+"""
+
+from typing import Optional
+import bisect
+import time
+import logging
+
+import redis
+
+from app.celery_app import celery_app
+from app.core.config import get_settings
+from app.core.redis_client import get_redis
+from app.tasks.dependencies import get_db_session
+from app.models.videos import Video
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+EXPEDITED_PRIORITY = 0
+MAX_PRIORITY = 9
+JOB_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Free a running slot (ARGV[1], may be empty), drop slots of pipelines that never reported
+# back, then hand one free slot to the user's most urgent pending video (if any)
+_FILL_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+local cap = tonumber(ARGV[2])
+if cap > 0 and redis.call('ZCARD', KEYS[1]) >= cap then
+    return false
+end
+local popped = redis.call('ZPOPMIN', KEYS[2])
+if #popped == 0 then
+    return false
+end
+redis.call('ZADD', KEYS[1], ARGV[4], popped[1])
+return popped[1]
+"""
+
+
+def job_key(video_id: str) -> str:
+    return f"scheduler:job:{video_id}"
+
+
+def running_key(user_id: str) -> str:
+    return f"scheduler:user:{user_id}:running"
+
+
+def pending_key(user_id: str) -> str:
+    return f"scheduler:user:{user_id}:pending"
+
+
+def processing_priority(duration_seconds: Optional[float] = None, file_size: Optional[int] = None) -> int:
+    """
+    1 (short clip) .. 9 (feature film) from the source duration and/or size;
+    one step per bucket passed in settings.processing_priority_*_buckets.
+    0 is reserved for expedited videos.
+    """
+    tiers = []
+    if duration_seconds:
+        tiers.append(bisect.bisect_left(settings.processing_priority_duration_buckets, duration_seconds))
+    if file_size:
+        tiers.append(bisect.bisect_left(settings.processing_priority_size_buckets_mb, file_size / (1024 * 1024)))
+
+    if not tiers:
+        return MAX_PRIORITY // 2
+    return min(1 + max(tiers), MAX_PRIORITY)
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _stale_before(now: float) -> float:
+    return now - settings.processing_slot_timeout_seconds
+
+
+def _enqueue(redis_client, user_id: str, video_id: str, priority: int):
+    redis_client.zadd(pending_key(user_id), {video_id: priority * 1e10 + _now()})
+
+
+def _fill_slots(redis_client, user_id: str, freed: str = "") -> dict:
+    """
+    Dispatch the user's pending videos, most urgent first, while they have free slots.
+
+    Returns:
+        {video_id: AsyncResult} of the videos started
+    """
+    started = {}
+    # Keep filling while there is room (the cap may have been raised meanwhile)
+    while True:
+        now = _now()
+        next_id = redis_client.eval(
+            _FILL_SCRIPT, 2, running_key(user_id), pending_key(user_id),
+            freed, settings.processing_max_jobs_per_user, _stale_before(now), now
+        )
+        if not next_id:
+            break
+        freed = ""
+
+        priority = int(redis_client.hget(job_key(next_id), "priority") or MAX_PRIORITY // 2)
+        logger.info(f"Dispatching {next_id} with priority {priority} for user {user_id}")
+        try:
+            started[next_id] = _dispatch(user_id, next_id, priority)
+        except Exception as e:
+            # Back in line for the next free slot rather than lost
+            logger.error(f"Failed to start queued video {next_id}: {str(e)}")
+            redis_client.zadd(pending_key(user_id), {next_id: priority * 1e10 + now})
+            break
+    return started
+
+
+def _dispatch(user_id: str, video_id: str, priority: int):
+    """Start the Celery workflow; the slot is given back if the broker refuses it"""
+    from app.tasks.workflows import start_video_processing
+
+    try:
+        result = start_video_processing(video_id, priority=priority)
+    except Exception:
+        get_redis().zrem(running_key(user_id), video_id)
+        raise
+
+    get_redis().hset(job_key(video_id), "state", "running")
+    return result
+
+
+def _record_task_id(video_id: str, task_id: str):
+    with get_db_session() as db:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video:
+            video.celery_task_id = task_id
+            db.commit()
+
+
+def schedule_video_processing(
+    video_id: str,
+    user_id: str,
+    file_size: Optional[int] = None,
+    metadata: Optional[dict] = None
+):
+    """
+    Start processing now if the uploader is under their cap, otherwise queue it.
+
+    Args:
+        file_size: Source size in bytes (known at upload time)
+        metadata: processing_metadata, when the video was probed before (reprocessing)
+
+    Returns:
+        The workflow's AsyncResult, or None if the video waits for a free slot
+    """
+    metadata = metadata or {}
+    priority = processing_priority(
+        metadata.get("duration_seconds"),
+        metadata.get("file_size") or file_size
+    )
+
+    redis_client = get_redis()
+    pipe = redis_client.pipeline()
+    pipe.hset(job_key(video_id), mapping={
+        "user_id": str(user_id),
+        "priority": priority,
+        "expedited": 0,
+        "state": "pending",
+    })
+    pipe.expire(job_key(video_id), JOB_TTL_SECONDS)
+    pipe.execute()
+
+    # Everything goes through the pending set, so a slot freed by a dead pipeline goes
+    # to the user's most urgent waiting video, not to whichever upload arrives next
+    _enqueue(redis_client, str(user_id), video_id, priority)
+    started = _fill_slots(redis_client, str(user_id))
+
+    for started_id, result in started.items():
+        if started_id != video_id:
+            _record_task_id(started_id, result.id)
+    if video_id not in started:
+        logger.info(f"User {user_id} is at their processing cap - {video_id} queued with priority {priority}")
+    return started.get(video_id)
+
+
+def job_priority(video_id: str, metadata: Optional[dict] = None) -> int:
+    """
+    Priority for the stages after prepare_video, from the probed metadata.
+    Expedited videos keep priority 0.
+    """
+    metadata = metadata or {}
+    priority = processing_priority(metadata.get("duration_seconds"), metadata.get("file_size"))
+    try:
+        job = get_redis().hgetall(job_key(video_id))
+        if job.get("expedited") == "1":
+            return EXPEDITED_PRIORITY
+        if job:
+            get_redis().hset(job_key(video_id), "priority", priority)
+    except redis.RedisError as e:
+        logger.warning(f"Scheduler lookup failed for {video_id}: {str(e)}")
+    return priority
+
+
+def release_processing_slot(video_id: str):
+    """
+    Called when a video completes, fails or is deleted: frees its slot (or its
+    place in the pending set) and starts the uploader's next pending video(s).
+    Safe to call more than once per video.
+    """
+    try:
+        redis_client = get_redis()
+        job = redis_client.hgetall(job_key(video_id))
+        if not job:
+            return
+        user_id = job["user_id"]
+        pipe = redis_client.pipeline()
+        pipe.delete(job_key(video_id))
+        pipe.zrem(pending_key(user_id), video_id)
+        pipe.execute()
+
+        for started_id, result in _fill_slots(redis_client, user_id, freed=video_id).items():
+            logger.info(f"Slot freed by {video_id} - started {started_id}")
+            _record_task_id(started_id, result.id)
+    except redis.RedisError as e:
+        logger.warning(f"Scheduler release failed for {video_id}: {str(e)}")
+
+
+@celery_app.task(queue="light", ignore_result=True)
+def reap_processing_slots():
+    """
+    Periodic (beat_schedule in app/celery_app.py)
+    - Every user with pending videos: drop expired running slots and fill the free ones
+    - Releases normally happen on completed/failed; this covers pipelines that died silently
+    """
+    redis_client = get_redis()
+    started = 0
+    for key in redis_client.scan_iter(match=pending_key("*"), count=500):
+        user_id = key[len("scheduler:user:"):-len(":pending")]
+        for started_id, result in _fill_slots(redis_client, user_id).items():
+            logger.info(f"Started {started_id} for user {user_id} after reaping stale slots")
+            _record_task_id(started_id, result.id)
+            started += 1
+    return started
+
+
+def expedite_video_processing(video_id: str) -> Optional[dict]:
+    """
+    Admin override: priority 0 and no per-user cap.
+    - Pending video: dispatched right away
+    - Running video: stages not yet queued get priority 0
+
+    Returns:
+        {"state", "priority", "celery_task_id"}, or None if the scheduler doesn't know the video
+    """
+    redis_client = get_redis()
+    job = redis_client.hgetall(job_key(video_id))
+    if not job:
+        return None
+
+    redis_client.hset(job_key(video_id), mapping={"expedited": 1, "priority": EXPEDITED_PRIORITY})
+
+    if job.get("state") != "pending":
+        return {"state": job.get("state"), "priority": EXPEDITED_PRIORITY, "celery_task_id": None}
+
+    # Past the cap: straight from pending to running
+    pipe = redis_client.pipeline()
+    pipe.zrem(pending_key(job["user_id"]), video_id)
+    pipe.zadd(running_key(job["user_id"]), {video_id: _now()})
+    pipe.execute()
+    result = _dispatch(job["user_id"], video_id, EXPEDITED_PRIORITY)
+    logger.info(f"Expedited {video_id} - dispatched past user {job['user_id']}'s cap")
+    return {"state": "running", "priority": EXPEDITED_PRIORITY, "celery_task_id": result.id}
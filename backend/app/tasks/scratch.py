@@ -0,0 +1,170 @@
+# app/tasks/scratch.py
+"""
+Scratch directory sync through MinIO (settings.scratch_affinity = "minio_sync").
+
+Every stage works in processing_temp_dir/<video_id>. Normally the rest of a
+video's pipeline is pinned to the host that ran prepare_video (host queue, see
+celery_app.scratch_host_queue). When that isn't possible - no host queues, or
+a host went away - stages can run on any worker instead:
+- before a stage runs, pull_scratch() fetches what this host is missing
+- after it returns, push_scratch() uploads what it wrote
+- finalize_processing drops the synced copy with delete_scratch()
+
+Objects live in the (private) raw videos bucket under scratch/<video_id>/.
+This trades extra transfer for placement freedom, so host_queue stays the default.
+
+Two things are never part of the whole-dir sync:
+- the raw source: a host without it reads the upload itself from MinIO
+  (see _resolve_source_input in video_tasks.py)
+- chunks/: in chunked mode (host_queue and minio_sync alike) every source chunk
+  and encoded chunk is its own object, moved with push_files() / pull_files() by
+  the one task that needs it, so chunk encodes run on any encode worker
+"""
+
+from functools import wraps
+import os
+import logging
+
+from app.core.config import get_settings
+from .dependencies import get_minio_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+# Source chunks (chunks/chunk_NNNNN.*) and encoded chunks (chunks/<quality>/) of chunked mode
+CHUNKS_DIR = "chunks"
+
+
+def _prefix(video_id: str) -> str:
+    return f"scratch/{video_id}/"
+
+
+def _work_dir(video_id: str) -> str:
+    return os.path.join(settings.processing_temp_dir, video_id)
+
+
+def _object_name(video_id: str, local_path: str) -> str:
+    return _prefix(video_id) + os.path.relpath(local_path, _work_dir(video_id)).replace(os.sep, "/")
+
+
+def _whole_dir_synced(relative_path: str) -> bool:
+    """False for what pull_scratch / push_scratch leave alone (see module docstring)"""
+    top = relative_path.split("/", 1)[0]
+    if "/" not in relative_path and (top == "raw" or top.startswith("raw.")):
+        return False
+    return top != CHUNKS_DIR and not relative_path.endswith(".parts")  # .parts: host-local download logs
+
+
+def push_files(video_id: str, paths: list):
+    """Upload these scratch files (paths inside the video's work dir)"""
+    files = [(path, _object_name(video_id, path)) for path in paths]
+    if files:
+        get_minio_client().upload_files(settings.minio_bucket_videos, files, resume=False)
+
+
+def pull_files(video_id: str, paths: list) -> list:
+    """Download the scratch files of these paths this host doesn't have; returns the ones pulled"""
+    minio_client = get_minio_client()
+    pulled = []
+    for path in paths:
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        minio_client.download_file(settings.minio_bucket_videos, _object_name(video_id, path), path)
+        pulled.append(path)
+    return pulled
+
+
+def delete_files(video_id: str, relative_dir: str) -> int:
+    """Delete the scratch objects under one directory of the work dir (e.g. "chunks/720p")"""
+    return get_minio_client().delete_prefix(settings.minio_bucket_videos, f"{_prefix(video_id)}{relative_dir}/")
+
+
+def pull_scratch(video_id: str):
+    """Download scratch files this host doesn't have (or has with a different size)"""
+    minio_client = get_minio_client()
+    prefix = _prefix(video_id)
+    work_dir = _work_dir(video_id)
+
+    pulled = 0
+    for object_name, size in minio_client.list_object_sizes(settings.minio_bucket_videos, prefix).items():
+        if not _whole_dir_synced(object_name[len(prefix):]):
+            continue
+        local_path = os.path.join(work_dir, object_name[len(prefix):])
+        if os.path.exists(local_path) and os.path.getsize(local_path) == size:
+            continue
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        minio_client.download_file(settings.minio_bucket_videos, object_name, local_path)
+        pulled += 1
+
+    if pulled:
+        logger.info(f"Pulled {pulled} scratch files for {video_id}")
+
+
+def push_scratch(video_id: str):
+    """Upload local scratch files MinIO doesn't have yet"""
+    work_dir = _work_dir(video_id)
+    if not os.path.isdir(work_dir):
+        return
+
+    minio_client = get_minio_client()
+    prefix = _prefix(video_id)
+    stored = minio_client.list_object_sizes(settings.minio_bucket_videos, prefix)
+
+    files = []
+    for root, _, names in os.walk(work_dir):
+        for name in names:
+            local_path = os.path.join(root, name)
+            object_name = _object_name(video_id, local_path)
+            if not _whole_dir_synced(object_name[len(prefix):]):
+                continue
+            if stored.get(object_name) != os.path.getsize(local_path):
+                files.append((local_path, object_name))
+
+    if files:
+        minio_client.upload_files(settings.minio_bucket_videos, files, resume=False)
+        logger.info(f"Pushed {len(files)} scratch files for {video_id}")
+
+
+def delete_scratch(video_id: str):
+    removed = get_minio_client().delete_prefix(settings.minio_bucket_videos, _prefix(video_id))
+    if removed:
+        logger.info(f"Deleted {removed} synced scratch files for {video_id}")
+
+
+def _find_video_id(args) -> str:
+    """video_id from a task's arguments: prepare_video's id, a stage payload, or a list of chord results"""
+    if args and isinstance(args[0], str):
+        return args[0]
+    for arg in args:
+        if isinstance(arg, dict) and arg.get("video_id"):
+            return arg["video_id"]
+        if isinstance(arg, list):
+            for item in arg:
+                if isinstance(item, dict) and item.get("video_id"):
+                    return item["video_id"]
+    return None
+
+
+def synced_scratch(task_func):
+    """
+    Task decorator (below @celery_app.task): in minio_sync mode, pull the video's
+    scratch dir before the task and push it after. No-op in the other modes.
+    """
+    @wraps(task_func)
+    def wrapper(self, *args, **kwargs):
+        if settings.scratch_affinity != "minio_sync":
+            return task_func(self, *args, **kwargs)
+
+        video_id = _find_video_id(args)
+        if video_id:
+            pull_scratch(video_id)
+
+        result = task_func(self, *args, **kwargs)
+
+        if video_id:
+            push_scratch(video_id)
+        return result
+
+    return wrapper
@@ -1,20 +1,56 @@
-from app.celery_app import celery_app
+from app.celery_app import celery_app, scratch_host_id, scratch_host_queue
 from .dependencies import get_db_session, get_minio_client
+from .scratch import synced_scratch, delete_scratch, push_files, pull_files, delete_files, CHUNKS_DIR
 from app.models.videos import Video
 from app.core.config import get_settings
-from app.services.ffmpeg_service import extract_metadata
-from app.utils.video_helpers import update_video_processing_status
+from app.services.ffmpeg_service import (
+    extract_metadata,
+    build_encode_args,
+    build_ladder_command,
+    build_keyframe_args,
+    build_hls_output_args,
+    split_into_chunks,
+    build_concat_command,
+    build_input_args,
+    is_remote_input,
+    format_command_for_log,
+    run_ffmpeg_with_progress,
+    measure_crf_bitrate,
+    detail_exponent,
+    plan_per_title_ladder,
+    parse_bitrate,
+    measure_hls_rendition,
+    format_stream_inf,
+    format_media_tag,
+    is_hls_segment,
+    read_media_playlist,
+    probe_streams,
+    build_dash_manifest,
+    build_trickplay_command,
+    mark_iframes_only,
+    format_iframe_stream_inf,
+    build_trickplay_vtt,
+    HLS_INIT_SEGMENT,
+    TRICKPLAY_SPRITE_PATTERN
+)
+from app.utils.video_helpers import update_video_processing_status, file_sha256, reuse_processed_duplicate
+from app.tasks.scheduler import release_processing_slot
+from app.core.autotune import encode_threads
+from app.services.progress_service import publish_status, publish_stage_progress, set_parts_total, TERMINAL_STATUSES
+from celery import chord, group
+from datetime import timedelta
 import os
 import time
 import logging
 import subprocess
+import shutil
 
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
-@celery_app.task
+@celery_app.task(queue="light")
 def test_task(name: str):
     """Simple test task to verify Celery is working"""
     time.sleep(10)  # Sleep for 10 seconds
@@ -22,8 +58,9 @@ def test_task(name: str):
 
 
 
-@celery_app.task(bind=True, max_requests=3)
+@celery_app.task(bind=True, max_requests=3, queue="io")
 # STAGE 1: Prepration 
+@synced_scratch
 def prepare_video(self, video_id:str):
     """
     - validate video exists in DB
@@ -38,10 +75,19 @@ def prepare_video(self, video_id:str):
         video = db.query(Video).filter(Video.id == video_id).first()
 
         if not video:
+            # Deleted while queued: give the uploader's slot back
+            _set_status(video_id, "failed", "Video not found")
             raise ValueError(f"Video not found : {video_id}")
         
-        if video.processing_status != "queued":
-            raise ValueError(f"Video not ready for processing. Current status : {video.processing_status}")
+        # A Celery retry of this task finds its own "preparing" status - let it resume
+        resumable = self.request.retries > 0 and video.processing_status == "preparing"
+        if video.processing_status != "queued" and not resumable:
+            status = video.processing_status
+            if status in TERMINAL_STATUSES:
+                release_processing_slot(video_id)  # nothing to mark, only the slot to free
+            else:
+                _set_status(video_id, "failed", f"Not ready for processing (status: {status})")
+            raise ValueError(f"Video not ready for processing. Current status : {status}")
 
         # update status to proessing so that no other worker picks this up
         video.processing_status = "preparing"
@@ -50,12 +96,21 @@ def prepare_video(self, video_id:str):
 
         # store what we need (we get this value here because we cannot use ORM object outside the session)
         raw_video_path = video.raw_video_path
+        content_sha256 = video.content_sha256
 
+    publish_status(video_id, "preparing")
     logger.info(f"Video validated. MinIo path: {raw_video_path}")
     
     # create a working dir for this video
     work_dir_path = os.path.join(settings.processing_temp_dir , video_id)
-    os.makedirs(work_dir_path)
+
+    # Hash known from the API upload: check for a duplicate before downloading anything
+    if content_sha256 and settings.content_dedup_enabled:
+        duplicate_result = _try_reuse_duplicate(self, video_id, content_sha256, work_dir_path)
+        if duplicate_result:
+            return duplicate_result
+    # exist_ok: a retry reuses the partially downloaded source in here
+    os.makedirs(work_dir_path, exist_ok=True)
 
     # Create subdirectories 
     transcoded_dir = os.path.join(work_dir_path, "transcoded")
@@ -74,60 +129,109 @@ def prepare_video(self, video_id:str):
     # minio_video_name = str(raw_video_path).split("/")[1]
     local_video_path = os.path.join(work_dir_path,f"raw{original_extension}")
 
-    logger.info(f"Downloading video from minio to : {local_video_path}")
+    minio_client = get_minio_client()
 
-        
-    try:
-        minio_client = get_minio_client()
-        bytes_downloaded = minio_client.download_video_to_file(raw_video_path, local_video_path)
-        logger.info(f"Download complete: {bytes_downloaded / (1024*1024):.2f} MB")
-    except Exception as e:
-        logger.error(f"Download failed for {raw_video_path}: {str(e)}")
+    # Streaming input: probe the source over a presigned URL and skip the local copy.
+    # Containers we don't trust to stream (or a failed probe) fall back to downloading.
+    input_mode = "local"
+    metadata = None
+    if settings.stream_source_input and original_extension.lower() in settings.stream_source_extensions:
+        try:
+            source_url = minio_client.get_video_url(
+                raw_video_path,
+                expires=timedelta(minutes=settings.stream_source_url_expiry_minutes)
+            )
+            metadata = extract_metadata(source_url)
+            input_mode = "stream"
+            local_video_path = None
+            logger.info(f"Streaming source from MinIO, no local copy. Metadata: {metadata.width}x{metadata.height}, {metadata.duration_seconds:2f}s")
+        except Exception as e:
+            logger.warning(f"Streaming probe failed for {video_id}, falling back to download: {str(e)}")
 
-        # Check: Are we out of retries?
-        if self.request.retries >= self.max_retries:
-            # Final failure - update DB
-            with get_db_session() as db:
-                update_video_processing_status(
-                    db, video_id, "failed"
-                )
-            raise  # Let Celery know it's a final failure
-        
-        # Not final - retry
-        raise self.retry(exc=e, countdown=60)  # Retry in 60 seconds
+    if input_mode == "local":
+        logger.info(f"Downloading video from minio to : {local_video_path}")
 
+        try:
+            bytes_downloaded = minio_client.download_video_to_file(raw_video_path, local_video_path)
+            logger.info(f"Download complete: {bytes_downloaded / (1024*1024):.2f} MB")
+        except Exception as e:
+            logger.error(f"Download failed for {raw_video_path}: {str(e)}")
 
-    try:
-        metadata = extract_metadata(local_video_path)
-        logger.info(f"Metadata extracted: {metadata.width}x{metadata.height},  {metadata.duration_seconds:2f}s")
+            # Check: Are we out of retries?
+            if self.request.retries >= self.max_retries:
+                # Final failure - update DB
+                _set_status(video_id, "failed")
+                raise  # Let Celery know it's a final failure
+            
+            # Not final - retry
+            raise self.retry(exc=e, countdown=60)  # Retry in 60 seconds
 
-    except Exception as e:
-        logger.error(f"Metadata extraction failed for {video_id}: {str(e)}")
 
+        try:
+            metadata = extract_metadata(local_video_path)
+            logger.info(f"Metadata extracted: {metadata.width}x{metadata.height},  {metadata.duration_seconds:2f}s")
+
+        except Exception as e:
+            logger.error(f"Metadata extraction failed for {video_id}: {str(e)}")
 
-        # No retry for metadata extraction if file is corrupt , retrying wont help
-        with get_db_session() as db:
-            update_video_processing_status(
-                    db, video_id, "Failed",f"{str(e)}"
-                )
+
+            # No retry for metadata extraction if file is corrupt , retrying wont help
+            _set_status(video_id, "failed", f"{str(e)}")
             raise
 
 
+    # Direct/resumable uploads never passed through the API, so hash the source here
+    if not content_sha256 and settings.content_dedup_enabled and input_mode == "stream":
+        # Hashing would read the whole source before the first encode: do it alongside
+        # the pipeline instead. This upload is encoded anyway, later copies reuse it.
+        hash_source.delay(video_id, raw_video_path)
+    elif not content_sha256 and settings.content_dedup_enabled:
+        try:
+            content_sha256 = file_sha256(local_video_path)
+            logger.info(f"Source sha256: {content_sha256}")
+        except Exception as e:
+            logger.warning(f"Hashing source failed, continuing without dedup: {str(e)}")
+
+        if content_sha256:
+            duplicate_result = _try_reuse_duplicate(self, video_id, content_sha256, work_dir_path)
+            if duplicate_result:
+                return duplicate_result
+
     # Update DB with metadata 
     with get_db_session() as db:
         video = db.query(Video).filter(Video.id == video_id).first()
         video.processing_metadata = metadata.to_dict()
         db.commit()
 
+    # Chunked mode: cut the source into keyframe-aligned chunks for segment-parallel encoding
+    chunks = []
+    if settings.transcode_mode == "chunked":
+        chunks_dir = os.path.join(work_dir_path, CHUNKS_DIR)
+        try:
+            chunk_source = source_url if input_mode == "stream" else local_video_path
+            chunks = split_into_chunks(chunk_source, chunks_dir, settings.transcode_chunk_seconds)
+            # Chunk encodes aren't pinned to this host: each one fetches its own chunk object
+            if settings.scratch_affinity != "none":
+                push_files(video_id, chunks)
+        except Exception as e:
+            logger.error(f"Chunk split failed for {video_id}: {str(e)}")
+            _set_status(video_id, "failed", f"{str(e)}")
+            raise
+
     logger.info(f"prepare_video complete for {video_id}")
 
     return {
         "video_id": video_id,
-        "local_path":local_video_path,
+        # Where the scratch dir lives; later stages are routed there (see pin_to_scratch_host)
+        "scratch_host": scratch_host_id(),
+        "local_path":local_video_path,   # None in streaming mode, see _resolve_source_input
+        "input_mode": input_mode,
+        "raw_video_path": raw_video_path,
         "work_dir":work_dir_path,
         "transcoded_dir": transcoded_dir,  
         "segments_dir": segments_dir,      
         # "manifests_dir": manifests_dir,    
+        "chunks": chunks,
         "metadata":metadata.to_dict()
     }
 
@@ -136,9 +240,296 @@ def prepare_video(self, video_id:str):
 
 
 
+# STAGE 1.5: Per-title ladder
+
+@celery_app.task(bind=True, queue="encode", acks_late=True)
+@synced_scratch
+def plan_ladder(self, data: dict, qualities: list):
+    """
+    Pick bitrates and rungs for this title from a fast complexity probe
+    - CRF probe encodes of a few short samples at the probe height and at half of it
+    - Their bitrates give how hard the title is and how bitrate grows with resolution
+    - Adds data["ladder"] = {quality: bitrate cap}; {} falls back to QUALITY_SETTINGS
+    - Return: data
+    """
+    video_id = data["video_id"]
+    metadata = data["metadata"]
+    logger.info(f"Planning per-title ladder for {video_id}")
+
+    source_width = metadata.get("width")
+    source_height = metadata.get("height")
+    candidates = {
+        quality: settings.QUALITY_SETTINGS[quality]
+        for quality in qualities
+        if quality in settings.QUALITY_SETTINGS
+        and source_height and settings.QUALITY_SETTINGS[quality]["height"] <= source_height
+    }
+    if not candidates or not source_width:
+        logger.warning(f"No rungs to plan for a {source_width}x{source_height} source, using the static ladder")
+        return {**data, "ladder": {}}
+
+    # Even heights (libx264 4:2:0)
+    probe_height = min(source_height, settings.ladder_probe_max_height) // 2 * 2
+    half_height = probe_height // 4 * 2
+
+    try:
+        input_path = _resolve_source_input(data)
+
+        def probe(height: int) -> float:
+            return measure_crf_bitrate(
+                input_path,
+                metadata.get("duration_seconds"),
+                height,
+                data["work_dir"],
+                crf=settings.encode_crf,
+                samples=settings.ladder_probe_samples,
+                sample_seconds=settings.ladder_probe_sample_seconds,
+                threads=_encode_threads([{"width": source_width, "height": probe_height}], metadata, "ladder_probe")
+            )
+
+        bitrate_full = probe(probe_height)
+        bitrate_half = probe(half_height)
+    except Exception as e:
+        # A probe failure only costs the savings, not the video
+        logger.warning(f"Complexity probe failed for {video_id}, using the static ladder: {str(e)}")
+        return {**data, "ladder": {}}
+
+    exponent = detail_exponent(bitrate_full, bitrate_half)
+    ladder = plan_per_title_ladder(
+        candidates,
+        source_width,
+        source_height,
+        probe_height,
+        bitrate_full,
+        exponent,
+        headroom=settings.ladder_bitrate_headroom,
+        min_bitrate_ratio=settings.ladder_min_bitrate_ratio,
+        min_step_ratio=settings.ladder_min_step_ratio
+    )
+
+    logger.info(
+        f"Probe: {bitrate_full / 1000:.0f}kbps at {probe_height}p, {bitrate_half / 1000:.0f}kbps at {half_height}p "
+        f"(detail exponent {exponent:.2f})"
+    )
+    for quality, bitrate in ladder.items():
+        logger.info(f"  ✓ {quality}: {bitrate} (static {settings.QUALITY_SETTINGS[quality]['bitrate']})")
+
+    with get_db_session() as db:
+        video = db.query(Video).filter(Video.id == video_id).first()
+
+        if not video:
+            raise ValueError(f"Video not found in database: {video_id}")
+
+        video.processing_metadata = {**(video.processing_metadata or {}), "ladder": ladder}
+        db.commit()
+
+    return {**data, "ladder": ladder}
+
+
+
 # STAGE 2: Transcoding 
 
-@celery_app.task(bind=True, max_retries=2)
+def rung_settings(data: dict, quality: str):
+    """QUALITY_SETTINGS of a rung, with the per-title bitrate cap from plan_ladder if there is one"""
+    q_settings = settings.QUALITY_SETTINGS.get(quality)
+    bitrate = (data.get("ladder") or {}).get(quality)
+    if q_settings and bitrate:
+        q_settings = {**q_settings, "bitrate": bitrate}
+    return q_settings
+
+
+def with_priority(signature, data: dict):
+    """Carry the scheduler's priority (data["priority"]) to a task, without host routing"""
+    if data.get("priority") is not None:
+        signature = signature.set(priority=data["priority"])
+    return signature
+
+
+def pin_to_scratch_host(signature, data: dict):
+    """
+    Route a signature to the host holding this video's scratch dir
+    - Keeps the task's own queue class: encode -> encode.host.<scratch_host>
+    - Routing is a no-op unless settings.scratch_affinity is "host_queue"
+    - Also carries the scheduler's priority (data["priority"]) to the task
+    """
+    signature = with_priority(signature, data)
+
+    host_id = data.get("scratch_host")
+    if settings.scratch_affinity != "host_queue" or not host_id:
+        return signature
+
+    queue = getattr(signature.type, "queue", None) or celery_app.conf.task_default_queue
+    return signature.set(queue=scratch_host_queue(queue, host_id))
+
+
+def _set_status(video_id: str, status: str, error_message: str = None):
+    """
+    Report a stage change.
+    - Every change goes to the live progress in Redis
+    - Postgres is only written for terminal states (completed / failed)
+    """
+    status = publish_status(video_id, status, error_message)
+    if status in TERMINAL_STATUSES:
+        with get_db_session() as db:
+            update_video_processing_status(db, video_id, status, error_message)
+        # Lets the uploader's next queued video start
+        release_processing_slot(video_id)
+
+
+def _encode_threads(rungs: list, metadata: dict, label: str) -> int:
+    """ffmpeg -threads for an encode of these QUALITY_SETTINGS rungs (see app/core/autotune.py)"""
+    return encode_threads(
+        [(q_settings["width"], q_settings["height"]) for q_settings in rungs],
+        metadata.get("frame_rate"),
+        label
+    )
+
+
+def _transcode_progress(video_id: str, part: str = None):
+    """on_progress callback for run_ffmpeg_with_progress"""
+    return lambda percent: publish_stage_progress(video_id, "transcoding", percent, part=part)
+
+
+@celery_app.task(queue="io", ignore_result=True)
+def hash_source(video_id: str, raw_video_path: str):
+    """
+    SHA-256 of a streamed source (no local copy), stored for content dedup
+    - Runs next to the pipeline so hashing doesn't delay the first encode
+    - Later uploads of the same content match this video once it completes
+    """
+    try:
+        content_sha256 = get_minio_client().hash_video_object(raw_video_path)
+    except Exception as e:
+        logger.warning(f"Hashing source of {video_id} failed, it won't be deduplicated against: {str(e)}")
+        return
+
+    with get_db_session() as db:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video and not video.content_sha256:
+            video.content_sha256 = content_sha256
+            db.commit()
+    logger.info(f"Source sha256 of {video_id}: {content_sha256}")
+
+
+def _try_reuse_duplicate(task, video_id: str, content_sha256: str, work_dir: str):
+    """
+    Content-hash dedup for prepare_video.
+    - Stores the hash on the video (so later uploads can match it)
+    - If a completed video has the same hash: reuse its renditions, stop the chain
+    - Returns prepare_video's result in that case, else None
+    """
+    with get_db_session() as db:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video.content_sha256 != content_sha256:
+            video.content_sha256 = content_sha256
+            db.commit()
+
+        if not reuse_processed_duplicate(db, video):
+            return None
+        source_id = video.processing_metadata["deduplicated_from"]
+
+    publish_status(video_id, "completed")
+    release_processing_slot(video_id)
+
+    # Nothing left for the rest of the workflow to do
+    task.request.chain = None
+    task.request.callbacks = None
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info(f"✓ {video_id} has the same content as {source_id} - renditions reused, pipeline skipped")
+    return {"video_id": video_id, "deduplicated_from": source_id}
+
+
+def _resolve_source_input(data: dict) -> str:
+    """
+    What FFmpeg should read the source from: the local raw copy, or - when
+    prepare_video chose streaming input, or this host isn't the one that downloaded
+    it (the raw source is never synced) - a presigned URL signed for this task.
+    """
+    if data.get("input_mode") == "stream" or not os.path.exists(data["local_path"]):
+        return get_minio_client().get_video_url(
+            data["raw_video_path"],
+            expires=timedelta(minutes=settings.stream_source_url_expiry_minutes)
+        )
+    return data["local_path"]
+
+
+def _validate_transcode_input(input_path: str, label: str):
+    """Make sure the raw source is present, readable and non-empty before invoking FFmpeg."""
+
+    # Presigned URLs were already validated by the ffprobe in prepare_video
+    if is_remote_input(input_path):
+        return
+
+    # Check if input file exists
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+
+    # Check if input file is readable
+    if not os.access(input_path, os.R_OK):
+        raise PermissionError(f"Cannot read input file: {input_path}")
+
+    # Verify input file size
+    input_size = os.path.getsize(input_path)
+    logger.info(f"[{label}] Input file size: {input_size / (1024*1024):.2f} MB")
+
+    if input_size == 0:
+        raise ValueError(f"Input file is empty: {input_path}")
+
+
+def _skip_upscale_result(video_id: str, quality: str, q_settings: dict, metadata: dict):
+    """
+    Return the "skipped" result dict when the rung is taller than the source (no upscaling),
+    otherwise None.
+    """
+    source_height = metadata.get("height")
+    if not source_height:
+        raise ValueError("Missing height in metadata")
+
+    target_height = q_settings["height"]
+
+    if target_height > source_height:
+        logger.info(f"[{quality}] Skipping - source is {source_height}p, target is {target_height}p (no upscaling)")
+        return {
+            "video_id": video_id,
+            "quality": quality,
+            "skipped": True,
+            "reason": f"Source resolution ({source_height}p) lower than target ({target_height}p)"
+        }
+
+    return None
+
+
+def _hls_rendition_result(video_id: str, quality: str, quality_dir: str) -> dict:
+    """
+    Result dict for a rung that was encoded straight to HLS.
+
+    Same keys as the MP4 result (output_path points at the media playlist) plus the
+    segment info that segment_videos would otherwise have produced.
+    """
+    playlist_path = os.path.join(quality_dir, "playlist.m3u8")
+    if not os.path.exists(playlist_path):
+        raise FileNotFoundError(f"Playlist not created: {playlist_path}")
+
+    segment_files = [f for f in os.listdir(quality_dir) if is_hls_segment(f)]
+    file_size = sum(os.path.getsize(os.path.join(quality_dir, f)) for f in segment_files)
+    # Counted from the playlist - in single-file mode there is one file for all segments
+    segment_count = len(read_media_playlist(playlist_path))
+    logger.info(f"[{quality}] Created {segment_count} segments - Size: {file_size / (1024*1024):.2f} MB")
+
+    return {
+        "video_id": video_id,
+        "quality": quality,
+        "output_path": playlist_path,
+        "file_size": file_size,
+        "hls": True,
+        "segment_dir": quality_dir,
+        "segment_count": segment_count
+    }
+
+
+@celery_app.task(bind=True, max_retries=2, queue="encode", acks_late=True)
+@synced_scratch
 def transcode_quality(self, data:dict, quality:str):
     """
     Transcode video to specific quality
@@ -156,15 +547,12 @@ def transcode_quality(self, data:dict, quality:str):
     
         # Extract data from previous task
         video_id = data["video_id"]
-        input_path = data["local_path"]
+        input_path = _resolve_source_input(data)
         transcoded_dir = data['transcoded_dir']
         metadata = data['metadata']
 
         # UPDATE processing status
-        with get_db_session() as db:
-            update_video_processing_status(
-                db, video_id, "transcoding"
-            )
+        _set_status(video_id, "transcoding")
         
         # Validate all required data
         if not all([video_id, input_path, transcoded_dir, metadata]):
@@ -177,85 +565,65 @@ def transcode_quality(self, data:dict, quality:str):
             raise ValueError(f"Missing required data: {', '.join(missing)}")
 
         logger.info(f"[{quality}] Video ID: {video_id}")
-        logger.info(f"[{quality}] Input: {input_path}")
+        logger.info(f"[{quality}] Input: {'presigned URL' if is_remote_input(input_path) else input_path}")
 
 
         # INPUT FILE VALIDATION
-        
-        # Check if input file exists
-        if not os.path.exists(input_path):
-            raise FileNotFoundError(f"Input file not found: {input_path}")
-        
-        # Check if input file is readable
-        if not os.access(input_path, os.R_OK):
-            raise PermissionError(f"Cannot read input file: {input_path}")
-        
-        # Verify input file size
-        input_size = os.path.getsize(input_path)
-        logger.info(f"[{quality}] Input file size: {input_size / (1024*1024):.2f} MB")
-        
-        if input_size == 0:
-            raise ValueError(f"Input file is empty: {input_path}")
-
-
+        _validate_transcode_input(input_path, quality)
 
         # QUALITY SETTINGS & UPSCALING CHECK
-        
-        q_settings = settings.QUALITY_SETTINGS.get(quality)
+        q_settings = rung_settings(data, quality)
         if not q_settings:
             raise ValueError(f"Invalid quality setting: {quality}")
-        
+
         # Check if we should skip (no upscaling)
-        source_height = metadata.get("height")
-        if not source_height:
-            raise ValueError("Missing height in metadata")
-        
-        target_height = q_settings["height"]
-        
-        if target_height > source_height:
-            logger.info(f"[{quality}] Skipping - source is {source_height}p, target is {target_height}p (no upscaling)")
-            return {
-                "video_id": video_id,
-                "quality": quality,
-                "skipped": True,
-                "reason": f"Source resolution ({source_height}p) lower than target ({target_height}p)"
-            }
-        
-        
-        # output path
-        output_path = os.path.join(transcoded_dir,f"{quality}.mp4")
-        logger.info(f"Output path: {output_path}")
+        skipped = _skip_upscale_result(video_id, quality, q_settings, metadata)
+        if skipped:
+            publish_stage_progress(video_id, "transcoding", 100, part=quality)
+            return skipped
+
 
         # Build FFmpeg command
         cmd = [
             'ffmpeg',
-            '-i', input_path,
-            '-c:v', 'libx264',           # Video codec
-            '-threads', f'{settings.FFMPEG_THREADS}',             # THREAD LIMIT HERE
-            '-preset', 'medium',         # Encoding speed
-            '-crf', '23',                # Quality (lower = better, 18-28 range)
+            *build_input_args(input_path),
             '-vf', f"scale={q_settings['width']}:{q_settings['height']}",  # Resolution
-            '-b:v', q_settings['bitrate'], # Target bitrate
-            '-c:a', 'aac',               # Audio codec
-            '-b:a', '128k',              # Audio bitrate
+            *build_encode_args(q_settings, _encode_threads([q_settings], metadata, quality), crf=settings.encode_crf),
             '-y',                        # Overwrite output file
-            output_path      
             ]
+
+        if settings.hls_direct_output:
+            # Write segments + media playlist straight into segments/<quality>/
+            quality_dir = os.path.join(data['segments_dir'], quality)
+            os.makedirs(quality_dir, exist_ok=True)
+            logger.info(f"Output directory (direct HLS): {quality_dir}")
+            cmd += build_keyframe_args(settings.hls_segment_seconds)
+            cmd += build_hls_output_args(
+                quality_dir, settings.hls_segment_seconds, settings.hls_segment_type, settings.hls_single_file
+            )
+        else:
+            # output path
+            output_path = os.path.join(transcoded_dir,f"{quality}.mp4")
+            logger.info(f"Output path: {output_path}")
+            cmd.append(output_path)
         
-        logger.info(f"Runnign FFmpeg: {' '.join(cmd)}")
+        logger.info(f"Runnign FFmpeg: {format_command_for_log(cmd)}")
 
         try:
 
-            # Run FFmpeg
-            result = subprocess.run(
+            # Run FFmpeg, reporting this rung's percent to the live progress
+            run_ffmpeg_with_progress(
                 cmd,
-                capture_output=True,
-                text=True,
-                check=True
+                metadata.get("duration_seconds"),
+                on_progress=_transcode_progress(video_id, part=quality),
+                interval=settings.progress_report_interval_seconds
             )
 
             logger.info(f"Transcoding complete for {quality}")
 
+            if settings.hls_direct_output:
+                return _hls_rendition_result(video_id, quality, quality_dir)
+
             # Verify output exists
             if not os.path.exists(output_path):
                 raise Exception (f"Output file not created: {output_path}")
@@ -281,11 +649,8 @@ def transcode_quality(self, data:dict, quality:str):
                 return None  # Don't break entire workflow
 
         except Exception as e:
-            with get_db_session() as db:
-                update_video_processing_status(
-                        db, video_id, "Failed",f"{str(e)}"
-                    )
-
+            # One rung: on_transcode_complete decides whether the video failed
+            logger.error(f"Transcode failed for {quality}: {str(e)}")
             return None
 
     except Exception as exc:
@@ -294,9 +659,366 @@ def transcode_quality(self, data:dict, quality:str):
 
 
 
+# Stage 2 (single_decode mode): Transcode the whole ladder in one FFmpeg process
+
+@celery_app.task(bind=True, max_retries=2, queue="encode", acks_late=True)
+@synced_scratch
+def transcode_ladder(self, data: dict, qualities: list):
+    """
+    Transcode every requested quality from a single decode of the source
+    - Input: data from prepare_video, list of qualities
+    - Process: One FFmpeg run, split filter graph, one output per rung
+    - Return: list of per-quality result dicts (same shape as transcode_quality),
+      so on_transcode_complete can consume it unchanged
+    """
+    logger.info(f"Starting single-decode ladder transcode for {len(qualities)} qualities")
+    logger.info(f"Task ID: {self.request.id}")
+    logger.info(f"Retry attempt: {self.request.retries}/{self.max_retries}")
+
+    video_id = data["video_id"]
+    input_path = _resolve_source_input(data)
+    transcoded_dir = data["transcoded_dir"]
+    metadata = data["metadata"]
+
+    _set_status(video_id, "transcoding")
+
+    try:
+        _validate_transcode_input(input_path, "ladder")
+
+        results = []
+        rungs = []
+
+        for quality in qualities:
+            q_settings = rung_settings(data, quality)
+            if not q_settings:
+                logger.warning(f"[{quality}] Invalid quality setting, skipping")
+                results.append(None)
+                continue
+
+            skipped = _skip_upscale_result(video_id, quality, q_settings, metadata)
+            if skipped:
+                results.append(skipped)
+                continue
+
+            if settings.hls_direct_output:
+                output_path = os.path.join(data["segments_dir"], quality)
+                os.makedirs(output_path, exist_ok=True)
+            else:
+                output_path = os.path.join(transcoded_dir, f"{quality}.mp4")
+            rungs.append((quality, q_settings, output_path))
+
+        if not rungs:
+            logger.warning("No rungs left to encode after upscaling check")
+            return results
+
+        cmd = build_ladder_command(
+            input_path,
+            rungs,
+            _encode_threads([q_settings for _, q_settings, _ in rungs], metadata, "ladder"),
+            hls_segment_seconds=settings.hls_segment_seconds if settings.hls_direct_output else None,
+            crf=settings.encode_crf,
+            hls_segment_type=settings.hls_segment_type,
+            hls_single_file=settings.hls_single_file
+        )
+        logger.info(f"Running FFmpeg: {format_command_for_log(cmd)}")
+
+        run_ffmpeg_with_progress(
+            cmd,
+            metadata.get("duration_seconds"),
+            on_progress=_transcode_progress(video_id),
+            interval=settings.progress_report_interval_seconds
+        )
+
+        for quality, _, output_path in rungs:
+            if settings.hls_direct_output:
+                try:
+                    results.append(_hls_rendition_result(video_id, quality, output_path))
+                except FileNotFoundError as e:
+                    logger.error(f"[{quality}] {str(e)}")
+                    results.append(None)
+                continue
+
+            if not os.path.exists(output_path):
+                logger.error(f"[{quality}] Output file not created: {output_path}")
+                results.append(None)
+                continue
+
+            file_size = os.path.getsize(output_path)
+            logger.info(f"[{quality}] Created {quality}.mp4 - Size: {file_size / (1024*1024):.2f} MB")
+
+            results.append({
+                "video_id": video_id,
+                "quality": quality,
+                "output_path": output_path,
+                "file_size": file_size
+            })
+
+        return results
+
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg ladder transcode failed: {e.stderr[-500:] if e.stderr else 'No error output'}")
+
+        if self.request.retries < self.max_retries:
+            logger.info(f"Retrying ladder transcode (attempt {self.request.retries + 1}/{self.max_retries})")
+            raise self.retry(exc=e, countdown=60)
+
+        logger.error(f"Final failure for ladder transcode after {self.max_retries} retries")
+        # Let on_transcode_complete decide the workflow outcome
+        return [None for _ in qualities]
+
+    except Exception as e:
+        logger.error(f"Ladder transcode failed: {str(e)}")
+        _set_status(video_id, "failed", f"{str(e)}")
+        raise
+
+
+
+# Stage 2 (chunked mode): Split -> encode (chunk, quality) pairs in parallel -> stitch
+
+@celery_app.task(bind=True, queue="light")
+def dispatch_chunk_transcodes(self, data: dict, qualities: list):
+    """
+    Fan out one transcode_chunk task per (chunk, quality) pair
+    - Input: data from prepare_video (with "chunks"), list of qualities
+    - Rungs taller than the source are skipped here, once, instead of per chunk
+    - Replaces itself with chord(transcode_chunk..., stitch_chunks) so the rest
+      of the workflow continues with the stitched per-quality results
+    """
+    video_id = data["video_id"]
+    chunks = data.get("chunks") or []
+    metadata = data["metadata"]
+
+    if not chunks:
+        raise ValueError(f"No chunks available for chunked transcoding: {video_id}")
+
+    _set_status(video_id, "transcoding")
+
+    encode_qualities = []
+    skipped_results = []
+    for quality in qualities:
+        q_settings = settings.QUALITY_SETTINGS.get(quality)
+        if not q_settings:
+            logger.warning(f"[{quality}] Invalid quality setting, skipping")
+            continue
+
+        skipped = _skip_upscale_result(video_id, quality, q_settings, metadata)
+        if skipped:
+            skipped_results.append(skipped)
+        else:
+            encode_qualities.append(quality)
+
+    logger.info(f"Dispatching {len(chunks)} chunks x {len(encode_qualities)} qualities = "
+                f"{len(chunks) * len(encode_qualities)} chunk encodes")
+    set_parts_total(video_id, len(chunks) * len(encode_qualities))
+
+    # Not pinned: the chunks are objects in MinIO (or on a shared volume with scratch_affinity "none")
+    header = group(
+        with_priority(transcode_chunk.s(data, chunk_index, quality), data)
+        for quality in encode_qualities
+        for chunk_index in range(len(chunks))
+    )
+
+    raise self.replace(
+        chord(header, pin_to_scratch_host(stitch_chunks.s(data, encode_qualities, skipped_results), data))
+    )
+
+
+@celery_app.task(bind=True, max_retries=2, queue="encode", acks_late=True)
+def transcode_chunk(self, data: dict, chunk_index: int, quality: str):
+    """
+    Encode one chunk of the source to one quality (video only)
+    - Runs on any encode worker: pulls only its own chunk and pushes only its
+      output (scratch_affinity "none" works on the shared dir instead)
+    - Return: video_id, quality, chunk_index, output_path
+    """
+    video_id = data["video_id"]
+    chunk_path = data["chunks"][chunk_index]
+    label = f"{quality}#{chunk_index}"
+    synced = settings.scratch_affinity != "none"
+    pulled = []
+
+    try:
+        if synced:
+            pulled = pull_files(video_id, [chunk_path])
+        _validate_transcode_input(chunk_path, label)
+
+        q_settings = rung_settings(data, quality)
+
+        encoded_dir = os.path.join(data["work_dir"], CHUNKS_DIR, quality)
+        os.makedirs(encoded_dir, exist_ok=True)
+        output_path = os.path.join(encoded_dir, f"chunk_{chunk_index:05d}.mp4")
+
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-i', chunk_path,
+            '-vf', f"scale={q_settings['width']}:{q_settings['height']}",
+            *build_encode_args(
+                q_settings,
+                _encode_threads([q_settings], data["metadata"], quality),
+                audio=False,
+                crf=settings.encode_crf
+            ),
+        ]
+        if settings.hls_direct_output:
+            # Same boundaries in every rung, so the stitched streams segment identically
+            cmd += build_keyframe_args(settings.hls_segment_seconds)
+        cmd.append(output_path)
+
+        subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+
+        if not os.path.exists(output_path):
+            raise Exception(f"Output file not created: {output_path}")
+
+        if synced:
+            push_files(video_id, [output_path])
+            # The stitching host keeps its local copy, any other host only needed it for the push
+            if scratch_host_id() != data.get("scratch_host"):
+                os.remove(output_path)
+
+        publish_stage_progress(video_id, "transcoding", 100, part=label)
+
+        return {
+            "video_id": video_id,
+            "quality": quality,
+            "chunk_index": chunk_index,
+            "output_path": output_path
+        }
+
+    except subprocess.CalledProcessError as e:
+        logger.error(f"[{label}] FFmpeg failed: {e.stderr[-500:] if e.stderr else 'No error output'}")
+
+        if self.request.retries < self.max_retries:
+            logger.info(f"[{label}] Retrying (attempt {self.request.retries + 1}/{self.max_retries})")
+            raise self.retry(exc=e, countdown=30)
+
+        logger.error(f"[{label}] Final failure after {self.max_retries} retries")
+        return None  # stitch_chunks drops the quality this chunk belongs to
+
+    except Exception as e:
+        # Scratch sync / MinIO hiccups are as transient as a failed encode
+        logger.error(f"[{label}] Chunk transcode failed: {str(e)}")
+
+        if self.request.retries < self.max_retries:
+            logger.info(f"[{label}] Retrying (attempt {self.request.retries + 1}/{self.max_retries})")
+            raise self.retry(exc=e, countdown=30)
+
+        logger.error(f"[{label}] Final failure after {self.max_retries} retries")
+        return None
+
+    finally:
+        # Another rung's encode of this chunk pulls it again if it lands here
+        for path in pulled:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@celery_app.task(bind=True, queue="encode", acks_late=True)
+@synced_scratch
+def stitch_chunks(self, results: list, data: dict, qualities: list, skipped_results: list):
+    """
+    Concatenate encoded chunks per quality without re-encoding (chord callback)
+    - Input: transcode_chunk results, data from prepare_video
+    - Audio is encoded once from the original source while muxing
+    - Return: list of per-quality result dicts, same shape as transcode_quality
+    """
+    video_id = data["video_id"]
+    chunk_count = len(data["chunks"])
+    transcoded_dir = data["transcoded_dir"]
+
+    logger.info(f"Stitching chunks for {len(qualities)} qualities ({chunk_count} chunks each)")
+
+    chunk_outputs = {quality: {} for quality in qualities}
+    for result in results:
+        if result:
+            chunk_outputs[result["quality"]][result["chunk_index"]] = result["output_path"]
+
+    stitched = list(skipped_results)
+
+    for quality in qualities:
+        outputs = chunk_outputs[quality]
+        if len(outputs) != chunk_count:
+            logger.error(f"[{quality}] Only {len(outputs)}/{chunk_count} chunks encoded, dropping quality")
+            stitched.append(None)
+            continue
+
+        if settings.scratch_affinity != "none":
+            # Chunks encoded on other hosts
+            try:
+                pull_files(video_id, list(outputs.values()))
+            except Exception as e:
+                logger.error(f"[{quality}] Fetching encoded chunks failed, dropping quality: {str(e)}")
+                stitched.append(None)
+                continue
+
+        encoded_dir = os.path.dirname(outputs[0])
+        concat_list_path = os.path.join(encoded_dir, "concat.txt")
+        with open(concat_list_path, "w") as f:
+            for chunk_index in range(chunk_count):
+                f.write(f"file '{outputs[chunk_index]}'\n")
+
+        if settings.hls_direct_output:
+            output_path = os.path.join(data["segments_dir"], quality)
+            os.makedirs(output_path, exist_ok=True)
+        else:
+            output_path = os.path.join(transcoded_dir, f"{quality}.mp4")
+
+        cmd = build_concat_command(
+            concat_list_path,
+            _resolve_source_input(data),
+            output_path,
+            hls_segment_seconds=settings.hls_segment_seconds if settings.hls_direct_output else None,
+            hls_segment_type=settings.hls_segment_type,
+            hls_single_file=settings.hls_single_file
+        )
+        logger.info(f"[{quality}] Running FFmpeg: {format_command_for_log(cmd)}")
+
+        try:
+            subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+        except subprocess.CalledProcessError as e:
+            logger.error(f"[{quality}] Stitch failed: {e.stderr[-500:] if e.stderr else 'No error output'}")
+            stitched.append(None)
+            continue
+
+        # Encoded chunks are no longer needed once the rendition exists
+        shutil.rmtree(encoded_dir, ignore_errors=True)
+        if settings.scratch_affinity != "none":
+            try:
+                delete_files(video_id, f"{CHUNKS_DIR}/{quality}")
+            except Exception as e:
+                logger.warning(f"[{quality}] Deleting encoded chunk objects failed (non-critical): {str(e)}")
+
+        if settings.hls_direct_output:
+            stitched.append(_hls_rendition_result(video_id, quality, output_path))
+            continue
+
+        file_size = os.path.getsize(output_path)
+        logger.info(f"[{quality}] Stitched {quality}.mp4 - Size: {file_size / (1024*1024):.2f} MB")
+
+        stitched.append({
+            "video_id": video_id,
+            "quality": quality,
+            "output_path": output_path,
+            "file_size": file_size
+        })
+
+    return stitched
+
+
+
 # Stage 2.5: Collect Transcoding Results (Chord Callback)
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, queue="light")
 def on_transcode_complete(self, results: list):
     """
     Called after all parallel transcoding tasks finish
@@ -309,6 +1031,9 @@ def on_transcode_complete(self, results: list):
 
  
 
+    # Any non-None result carries the video_id (including skipped rungs)
+    video_id = next((r['video_id'] for r in results if r), None)
+
     # Filter out None/failed results
     successful_results = [r for r in results if r is not None and not r.get('skipped',False)]
 
@@ -316,19 +1041,14 @@ def on_transcode_complete(self, results: list):
 
     if not successful_results:
         logger.error("All transcoding tasks failed!")
-        with get_db_session() as db:
-            update_video_processing_status(
-                    db, video_id, "Failed",f"All transcoding tasks failed!"
-                )
+        if video_id:
+            _set_status(video_id, "failed", "All transcoding tasks failed!")
         raise Exception("No successful transcodes - cannot continue workflow")
 
 
     # Get video_id (same across all results)
     video_id = successful_results[0]['video_id']
-    with get_db_session() as db:
-        update_video_processing_status(
-                    db, video_id, "aggregating",
-                )
+    _set_status(video_id, "aggregating")
 
 
     # Build transcoded files dict
@@ -343,24 +1063,77 @@ def on_transcode_complete(self, results: list):
     
     
     logger.info(f"Transcoding complete for video: {video_id}")
-    return {
+    aggregated = {
         'video_id': video_id,
         'transcoded_files': transcoded_files,
         'total_qualities': len(transcoded_files)
     }
 
+    # Direct-to-HLS rungs are already segmented: hand create_manifest the same
+    # shape segment_videos would have returned, so that stage can be skipped
+    hls_results = [r for r in successful_results if r.get('hls')]
+    if hls_results:
+        aggregated['segmented_files'] = {
+            r['quality']: {
+                'playlist_path': r['output_path'],
+                'segment_dir': r['segment_dir'],
+                'segment_count': r['segment_count']
+            }
+            for r in hls_results
+        }
+        aggregated['segments_dir'] = os.path.dirname(hls_results[0]['segment_dir'])
+
+    return aggregated
+
 
 
 
 # Stage 3: Segmentation
 
-@celery_app.task(bind=True, max_retries=2)
+AUDIO_RENDITION = "audio"  # segments/audio/: the shared audio track in fMP4 mode
+
+
+def _package_audio_rendition(source_path: str, segments_dir: str):
+    """
+    Stream-copy the audio of one encoded rung into segments/audio/ as fMP4 HLS.
+    Returns its segment info (same shape as segmented_files entries), or None
+    if the video has no audio.
+    """
+    if not probe_streams(source_path)["audio"]:
+        logger.info("No audio track - skipping audio rendition")
+        return None
+
+    audio_dir = os.path.join(segments_dir, AUDIO_RENDITION)
+    os.makedirs(audio_dir, exist_ok=True)
+    cmd = [
+        'ffmpeg',
+        '-i', source_path,
+        '-map', '0:a:0',
+        '-c', 'copy',
+        '-y',
+        *build_hls_output_args(audio_dir, settings.hls_segment_seconds, "fmp4", settings.hls_single_file)
+    ]
+    logger.info(f"[audio] FFmpeg command: {' '.join(cmd)}")
+    subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+    segment_count = len(read_media_playlist(os.path.join(audio_dir, "playlist.m3u8")))
+    logger.info(f"[audio] ✓ Created {segment_count} audio segments")
+    return {
+        'playlist_path': os.path.join(audio_dir, "playlist.m3u8"),
+        'segment_dir': audio_dir,
+        'segment_count': segment_count
+    }
+
+
+@celery_app.task(bind=True, max_retries=2, queue="io", acks_late=True)
+@synced_scratch
 def segment_videos(self, data: dict):
     """
     Create HLS segments for all qualities
     - Input: transcoded_files from on_transcode_complete
-    - Process: Use FFmpeg to create .ts segments
-    - Return: video_id, segmented_files dict
+    - Process: Use FFmpeg to create .ts segments (or fMP4, settings.hls_segment_type)
+    - fMP4: rungs are video only, audio is packaged once into segments/audio/
+    - Return: video_id, segmented_files dict, audio_rendition (fMP4 with audio only)
     """
     logger.info("=" * 60)
     logger.info("Starting HLS segmentation for all qualities")
@@ -377,10 +1150,7 @@ def segment_videos(self, data: dict):
         logger.info(f"Video ID: {video_id}")
         logger.info(f"Qualities to segment: {len(transcoded_files)}")
 
-        with get_db_session() as db:
-            update_video_processing_status(
-                db, video_id, "segmenting"
-            )
+        _set_status(video_id, "segmenting")
         
         
         # basic validation
@@ -388,6 +1158,8 @@ def segment_videos(self, data: dict):
             raise ValueError(f"Segments directory not fonnd: {segments_dir}")
         
         segmented_files = {}
+        # CMAF keeps one track per rendition: every rung shares one audio track
+        demux_audio = settings.hls_segment_type == "fmp4"
 
         for quality, file_info in transcoded_files.items():
             logger.info(f"[{quality}] Starting segmentation")
@@ -406,19 +1178,17 @@ def segment_videos(self, data: dict):
 
             # Paths for HLS output
             playlist_path = os.path.join(quality_dir,"playlist.m3u8")
-            segment_pattern = os.path.join(quality_dir, "segment_%4d.ts")
 
             # Build FFMPEG  command for HLS segmentaion
             cmd = [
                 'ffmpeg',
                 '-i', input_path,
+                *(['-map', '0:v:0'] if demux_audio else []),
                 '-c', 'copy',                    # Copy codec (no re-encoding)
-                '-f', 'hls',                     # Output format: HLS
-                '-hls_time', '6',                # 6 seconds per segment (Apple recommendation)
-                '-hls_list_size', '0',           # Include all segments in playlist
-                '-hls_segment_filename', segment_pattern,
                 '-y',                            # Overwrite if exists
-                playlist_path
+                *build_hls_output_args(
+                    quality_dir, settings.hls_segment_seconds, settings.hls_segment_type, settings.hls_single_file
+                )
             ]
             logger.info(f"[{quality}] FFmpeg command: {' '.join(cmd)}")
 
@@ -437,9 +1207,8 @@ def segment_videos(self, data: dict):
                 if not os.path.exists(playlist_path):
                     raise FileNotFoundError(f"Playlist not created: {playlist_path}")
 
-                # Count segments created
-                segment_files = [f for f in os.listdir(quality_dir) if f.endswith('.ts')]
-                segment_count = len(segment_files)
+                # Count segments created (from the playlist: single-file mode has one media file)
+                segment_count = len(read_media_playlist(playlist_path))
 
                 logger.info(f"[{quality}] ✓ Segmentation complete")
                 logger.info(f"[{quality}] Created {segment_count} segments")
@@ -470,6 +1239,12 @@ def segment_videos(self, data: dict):
         # Check for successful segmentation
         if not segmented_files:
             raise Exception("All segmentation tasks failed!")
+
+        audio_rendition = None
+        if demux_audio:
+            # Every rung carries the same AAC track - package it from the first one
+            audio_source = transcoded_files[next(iter(segmented_files))]["path"]
+            audio_rendition = _package_audio_rendition(audio_source, segments_dir)
         
         logger.info(f"Segmentation complete: {len(segmented_files)}/{len(transcoded_files)} qualities")
         logger.info("="*60)
@@ -478,7 +1253,8 @@ def segment_videos(self, data: dict):
         return {
             'video_id': video_id,
             'segmented_files': segmented_files,
-            'segments_dir': segments_dir
+            'segments_dir': segments_dir,
+            'audio_rendition': audio_rendition
         }
 
     
@@ -490,21 +1266,121 @@ def segment_videos(self, data: dict):
             logger.info(f"Retrying entire segmentation task (attempt {self.request.retries + 1}/{self.max_retries})")
             raise self.retry(exc=e, countdown=60)
         else:
-            with get_db_session() as db:
-                update_video_processing_status(
-                db, video_id, "failed",f"{str(e)}")
+            _set_status(video_id, "failed", f"{str(e)}")
             raise
 
 
 
+# Trickplay output, next to the renditions in segments/
+IFRAME_RENDITION = "iframes"
+TRICKPLAY_DIR = "trickplay"
+TRICKPLAY_INDEX = "thumbnails.vtt"
+
+
+def _trickplay_input(segmented_files: dict):
+    """(quality, media playlist) of the smallest rung at least settings.trickplay_iframe_height tall"""
+    by_height = sorted(segmented_files, key=lambda quality: settings.QUALITY_SETTINGS[quality]["height"])
+    tall_enough = [
+        quality for quality in by_height
+        if settings.QUALITY_SETTINGS[quality]["height"] >= settings.trickplay_iframe_height
+    ]
+    quality = tall_enough[0] if tall_enough else by_height[-1]
+    return quality, segmented_files[quality]["playlist_path"]
+
+
+@celery_app.task(bind=True, queue="encode", acks_late=True)
+@synced_scratch
+def create_trickplay(self, data: dict):
+    """
+    Seek previews from one decode of a low rung (not the source)
+    - I-frame-only rendition in segments/iframes/ (EXT-X-I-FRAME-STREAM-INF in the master)
+    - Sprite sheets + thumbnails.vtt (WebVTT, #xywh tiles) in segments/trickplay/
+    - Best effort: if it fails the video goes on without trickplay
+    - Return: data + trickplay ({iframe_playlist_path, vtt_path, frames} or None)
+    """
+    video_id = data["video_id"]
+    segments_dir = data["segments_dir"]
+    iframes_dir = os.path.join(segments_dir, IFRAME_RENDITION)
+    sprites_dir = os.path.join(segments_dir, TRICKPLAY_DIR)
+
+    logger.info("=" * 60)
+    logger.info(f"Creating trickplay for video: {video_id}")
+
+    try:
+        quality, input_path = _trickplay_input(data["segmented_files"])
+        q_settings = settings.QUALITY_SETTINGS[quality]
+
+        # A retried task starts from empty directories
+        for directory in (iframes_dir, sprites_dir):
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory)
+
+        cmd = build_trickplay_command(
+            input_path,
+            iframes_dir,
+            sprites_dir,
+            interval_seconds=settings.trickplay_interval_seconds,
+            iframe_height=min(settings.trickplay_iframe_height, q_settings["height"]),
+            tile_width=settings.trickplay_tile_width,
+            columns=settings.trickplay_sprite_columns,
+            rows=settings.trickplay_sprite_rows,
+            threads=_encode_threads([q_settings], data.get("metadata") or {}, "trickplay")
+        )
+        logger.info(f"[{quality}] Running FFmpeg: {format_command_for_log(cmd)}")
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+        iframe_playlist_path = os.path.join(iframes_dir, "playlist.m3u8")
+        mark_iframes_only(iframe_playlist_path)
+        durations = [duration for duration, _, _ in read_media_playlist(iframe_playlist_path)]
+
+        # Tile size as ffmpeg rounded it: every sheet is the full grid (the last one padded)
+        sheet = probe_streams(os.path.join(sprites_dir, TRICKPLAY_SPRITE_PATTERN % 1))["video"]
+        vtt_path = os.path.join(sprites_dir, TRICKPLAY_INDEX)
+        with open(vtt_path, "w") as f:
+            f.write(build_trickplay_vtt(
+                durations,
+                int(sheet["width"]) // settings.trickplay_sprite_columns,
+                int(sheet["height"]) // settings.trickplay_sprite_rows,
+                settings.trickplay_sprite_columns,
+                settings.trickplay_sprite_rows
+            ))
+
+        sheets = len([f for f in os.listdir(sprites_dir) if f.endswith(".jpg")])
+        logger.info(f"✓ Trickplay created from {quality}: {len(durations)} frames, {sheets} sprite sheets")
+        logger.info("=" * 60)
+
+        return {
+            **data,
+            "trickplay": {
+                "iframe_playlist_path": iframe_playlist_path,
+                "vtt_path": vtt_path,
+                "frames": len(durations)
+            }
+        }
+
+    except Exception as e:
+        # Playback doesn't need it - don't fail the video over seek previews
+        stderr = getattr(e, "stderr", None)
+        logger.warning(f"Trickplay not created: {stderr[-500:] if stderr else str(e)}")
+        for directory in (iframes_dir, sprites_dir):
+            shutil.rmtree(directory, ignore_errors=True)
+        return {**data, "trickplay": None}
+
+
 # Stage 4: Manifest Creation
-@celery_app.task(bind=True, max_retries=2)
-def create_manifest(self, data: dict):
+@celery_app.task(bind=True, max_retries=2, queue="light")
+@synced_scratch
+def create_manifest(self, data: dict, ladder: dict = None):
     """
     Create HLS playlist files (.m3u8)
     - Master playlist (lists all qualities)
     - Media playlists (lists segments for each quality)
-    - Return: video_id, manifest_paths
+    - BANDWIDTH / AVERAGE-BANDWIDTH measured from the segments, CODECS / RESOLUTION /
+      FRAME-RATE probed from them
+    - ladder: per-title bitrate caps from plan_ladder, only used if measuring fails
+    - fMP4 segments: also a DASH manifest.mpd over the same files
+    - Trickplay: EXT-X-I-FRAME-STREAM-INF for the I-frame rendition of create_trickplay
+    - Return: video_id, manifest_paths, renditions (measured attributes per quality)
     """
 
     logger.info("="*60)
@@ -515,9 +1391,7 @@ def create_manifest(self, data: dict):
         video_id = data["video_id"]
         segmented_files= data["segmented_files"]
 
-        with get_db_session() as db:
-                update_video_processing_status(
-                db, video_id, "creating_manifest")
+        _set_status(video_id, "creating_manifest")
 
         # Reconstruct path - master.m3u8 goes in segments/
         segments_dir = os.path.join(settings.processing_temp_dir, video_id, "segments")
@@ -534,7 +1408,19 @@ def create_manifest(self, data: dict):
         master_playlist_path = os.path.join(segments_dir,"master.m3u8")
 
         # Build master playlist content
-        playlist_lines = ["#EXTM3U", "#EXT-X-VERSION:3", ""]
+        # (every segment starts on a keyframe, so each can be decoded on its own)
+        playlist_lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS", ""]
+        renditions = {}
+
+        # fMP4 mode packages audio once; every video rendition references it by group
+        audio = None
+        if data.get("audio_rendition"):
+            audio = measure_hls_rendition(data["audio_rendition"]["playlist_path"])
+            playlist_lines += [
+                format_media_tag(audio, AUDIO_RENDITION, f"{AUDIO_RENDITION}/playlist.m3u8"),
+                ""
+            ]
+            logger.info(f"  ✓ Added audio: peak {audio['bandwidth']/1000:.0f}kbps {audio.get('codecs') or ''}")
 
         # Quality settings for bandwidth and resolution info
         quality_order = ["2160p", "1440p", "1080p", "720p", "480p", "360p", "240p", "144p"]
@@ -546,33 +1432,66 @@ def create_manifest(self, data: dict):
 
         for quality in sorted_qualities:
             segment_info = segmented_files[quality]
-            q_settings = settings.QUALITY_SETTINGS.get(quality)
-
-            if not q_settings:
-                logger.warning(f"[{quality}] Quality settings not found , skipping")
-                continue
 
-            # Get bitrate (converting "500K" to 500000)
-            bitrate = int(q_settings['bitrate'].replace('k',''))*1000
-            width = q_settings['width']
-            height = q_settings['height']
+            try:
+                rendition = measure_hls_rendition(segment_info['playlist_path'])
+            except Exception as e:
+                # Fall back to the configured values (peak = the rung's maxrate + audio)
+                logger.warning(f"[{quality}] Could not measure rendition, using configured values: {str(e)}")
+                q_settings = rung_settings({"ladder": ladder}, quality)
+                if not q_settings:
+                    logger.warning(f"[{quality}] Quality settings not found , skipping")
+                    continue
+                rendition = {
+                    "playlist_path": segment_info['playlist_path'],
+                    "bandwidth": parse_bitrate(q_settings['bitrate']) + (0 if audio else parse_bitrate("128k")),
+                    "width": q_settings['width'],
+                    "height": q_settings['height'],
+                }
 
             # Relative path 
             relative_playlist_path = f"{quality}/playlist.m3u8"
 
             # add quality level to master playlist
-            playlist_lines.append(
-                f'#EXT-X-STREAM-INF:BANDWIDTH={bitrate},RESOLUTION={width}x{height}'
-            )
+            playlist_lines.append(format_stream_inf(rendition, audio, AUDIO_RENDITION))
             playlist_lines.append(relative_playlist_path)
             playlist_lines.append("")
+            renditions[quality] = rendition
+
+            logger.info(
+                f"  ✓ Added {quality}: {rendition['width']}x{rendition['height']} "
+                f"peak {rendition['bandwidth']/1000:.0f}kbps, avg {rendition.get('average_bandwidth', 0)/1000:.0f}kbps "
+                f"{rendition.get('codecs') or ''}"
+            )
 
-            logger.info(f"  ✓ Added {quality}: {width}x{height} @ {bitrate/1000}kbps")
+        if data.get("trickplay"):
+            try:
+                iframes = measure_hls_rendition(data["trickplay"]["iframe_playlist_path"])
+                playlist_lines += [
+                    format_iframe_stream_inf(iframes, f"{IFRAME_RENDITION}/playlist.m3u8"),
+                    ""
+                ]
+                logger.info(f"  ✓ Added I-frame rendition: {iframes['width']}x{iframes['height']}")
+            except Exception as e:
+                logger.warning(f"I-frame rendition not added: {str(e)}")
 
         # Write master playlist file
         with open(master_playlist_path, 'w') as f:
             f.write('\n'.join(playlist_lines))
         
+        # DASH over the same fMP4 segments (SegmentTimeline from the HLS EXTINF durations)
+        dash_manifest_path = None
+        if settings.hls_segment_type == "fmp4":
+            try:
+                dash_manifest_path = os.path.join(segments_dir, "manifest.mpd")
+                with open(dash_manifest_path, 'w') as f:
+                    f.write(build_dash_manifest(renditions, audio))
+                logger.info(f"✓ DASH manifest created: {dash_manifest_path}")
+            except Exception as e:
+                # HLS still works - don't fail the video over the MPD
+                logger.warning(f"DASH manifest not created: {str(e)}")
+                dash_manifest_path = None
+        
         # Verify file was created
         if not os.path.exists(master_playlist_path):
             raise FileNotFoundError(f"Master playlist not created: {master_playlist_path}")
@@ -584,7 +1503,11 @@ def create_manifest(self, data: dict):
             'video_id': video_id,
             'master_playlist_path': master_playlist_path,
             'segments_dir': segments_dir,
-            'available_qualities': sorted_qualities
+            'available_qualities': list(renditions),
+            'renditions': renditions,
+            'dash_manifest_path': dash_manifest_path,
+            'audio_rendition': data.get('audio_rendition'),
+            'trickplay': data.get('trickplay')
         }
 
 
@@ -597,19 +1520,20 @@ def create_manifest(self, data: dict):
             logger.info(f"Retrying manifest creation (attempt {self.request.retries + 1}/{self.max_retries})")
             raise self.retry(exc=e, countdown=60)
         else:
-            with get_db_session() as db:
-                update_video_processing_status(
-                db, video_id, "failed",f"{str(e)}")
+            _set_status(video_id, "failed", f"{str(e)}")
             raise
 
 
 # Stage 5: Upload to MinIO
 
-@celery_app.task(bind=True, max_retries=3)
+@celery_app.task(bind=True, max_retries=3, queue="io", acks_late=True)
+@synced_scratch
 def upload_to_minio(self, data: dict):
     """
     Upload all HLS segments and playlists to MinIO for permanent storage.
-    Uploads: master.m3u8, quality playlists, and all .ts segments.
+    Uploads: all segments (+ fMP4 init segments), then quality playlists, then
+    master.m3u8 / manifest.mpd (concurrently within each wave, resuming objects
+    stored by a previous attempt). Single-file renditions are one multipart upload each.
     """
     logger.info("=" * 60)
     logger.info("Starting upload to MinIO")
@@ -625,9 +1549,7 @@ def upload_to_minio(self, data: dict):
         logger.info(f"Segments directory: {segments_dir}")
         logger.info(f"Qualities to upload: {len(available_qualities)}")
 
-        with get_db_session() as db:
-            update_video_processing_status(
-                db, video_id, "uploading to storage")
+        _set_status(video_id, "uploading to storage")
         
         # Validate segments directory exists
         if not os.path.exists(segments_dir):
@@ -640,31 +1562,20 @@ def upload_to_minio(self, data: dict):
         bucket_name = settings.minio_bucket_processed_videos
         base_path = f"{video_id}/segments"
         
-        uploaded_files = []
-        total_bytes = 0
-        
-        # Upload master playlist
-        logger.info("Uploading master playlist...")
-        master_minio_path = f"{base_path}/master.m3u8"
-        
-        try:
-            file_size = os.path.getsize(master_playlist_path)
-            minio_client.upload_file(
-                bucket_name=bucket_name,
-                object_name=master_minio_path,
-                file_path=master_playlist_path
-            )
-            total_bytes += file_size
-            uploaded_files.append(master_minio_path)
-            logger.info(f"✓ Uploaded master.m3u8")
-        except Exception as e:
-            logger.error(f"Failed to upload master playlist: {str(e)}")
-            raise
-        
-        # Upload each quality's files
-        for quality in available_qualities:
-            logger.info(f"[{quality}] Starting upload...")
-            
+        # Collect everything first so it can be uploaded in ordered waves:
+        #   1. segments, 2. media playlists, 3. master playlist
+        # A player that sees a playlist can therefore always fetch what it references.
+        segment_uploads = []
+        playlist_uploads = []
+
+        # The shared audio rendition (fMP4 mode) and trickplay output are uploaded like rungs
+        rendition_dirs = list(available_qualities)
+        if data.get('audio_rendition'):
+            rendition_dirs.append(AUDIO_RENDITION)
+        if data.get('trickplay'):
+            rendition_dirs += [IFRAME_RENDITION, TRICKPLAY_DIR]
+
+        for quality in rendition_dirs:
             # Reconstruct quality directory path
             quality_dir = os.path.join(segments_dir, quality)
             
@@ -673,54 +1584,60 @@ def upload_to_minio(self, data: dict):
                 logger.warning(f"[{quality}] Directory not found: {quality_dir}, skipping")
                 continue
             
-            # Get all files in quality directory
-            quality_files = os.listdir(quality_dir)
-            
-            # Filter for playlist and segments
-            playlist_file = [f for f in quality_files if f == 'playlist.m3u8']
-            segment_files = [f for f in quality_files if f.endswith('.ts')]
-            
-            files_to_upload = playlist_file + sorted(segment_files)
-            uploaded_count = 0
-            quality_bytes = 0
-            
-            # Upload each file
-            for filename in files_to_upload:
+            queued_before = len(segment_uploads)
+            for filename in sorted(os.listdir(quality_dir)):
                 local_path = os.path.join(quality_dir, filename)
                 minio_path = f"{base_path}/{quality}/{filename}"
-                
-                try:
-                    file_size = os.path.getsize(local_path)
-                    minio_client.upload_file(
-                        bucket_name=bucket_name,
-                        object_name=minio_path,
-                        file_path=local_path
-                    )
-                    uploaded_count += 1
-                    quality_bytes += file_size
-                    total_bytes += file_size
-                    uploaded_files.append(minio_path)
-                    
-                    # Log progress every 10 files
-                    if uploaded_count % 10 == 0:
-                        logger.info(f"[{quality}] Uploaded {uploaded_count}/{len(files_to_upload)} files...")
-                        
-                except Exception as e:
-                    logger.error(f"[{quality}] Failed to upload {filename}: {str(e)}")
-                    # Retry entire task if upload fails
-                    if self.request.retries < self.max_retries:
-                        raise self.retry(exc=e, countdown=60)
-                    else:
-                        raise
-            
-            logger.info(f"[{quality}] ✓ Upload complete: {uploaded_count} files ({quality_bytes / (1024*1024):.2f} MB)")
+
+                # Indexes go with the playlists, after the files they reference
+                if filename in ('playlist.m3u8', TRICKPLAY_INDEX):
+                    playlist_uploads.append((local_path, minio_path))
+                elif is_hls_segment(filename) or filename == HLS_INIT_SEGMENT or filename.endswith('.jpg'):
+                    segment_uploads.append((local_path, minio_path))
+
+            logger.info(f"[{quality}] Queued {len(segment_uploads) - queued_before} segments")
+
+        master_minio_path = f"{base_path}/master.m3u8"
+        master_uploads = [(master_playlist_path, master_minio_path)]
+        dash_url = None
+        if data.get('dash_manifest_path'):
+            master_uploads.append((data['dash_manifest_path'], f"{base_path}/manifest.mpd"))
+            dash_url = f"/{bucket_name}/{base_path}/manifest.mpd"
+        trickplay_url = None
+        if data.get('trickplay'):
+            trickplay_url = f"/{bucket_name}/{base_path}/{TRICKPLAY_DIR}/{TRICKPLAY_INDEX}"
+
+        waves = [
+            ("segments", segment_uploads),
+            ("media playlists", playlist_uploads),
+            ("master playlist", master_uploads),
+        ]
+
+        uploaded_files = []
+        total_bytes = 0
+        bytes_sent = 0
+
+        for wave_name, wave_files in waves:
+            logger.info(f"Uploading {wave_name}: {len(wave_files)} files")
+            try:
+                result = minio_client.upload_files(bucket_name, wave_files)
+            except Exception as e:
+                logger.error(f"Failed to upload {wave_name}: {str(e)}")
+                raise
+
+            uploaded_files += result["uploaded"] + result["skipped"]
+            total_bytes += sum(os.path.getsize(local_path) for local_path, _ in wave_files)
+            bytes_sent += result["bytes"]
+
+            if result["skipped"]:
+                logger.info(f"Resumed {wave_name}: {len(result['skipped'])} already in storage")
         
         # Generate master playlist URL
         master_url = f"/{bucket_name}/{base_path}/master.m3u8"
         
         logger.info(f"✓ Upload complete!")
         logger.info(f"Total files uploaded: {len(uploaded_files)}")
-        logger.info(f"Total size: {total_bytes / (1024*1024):.2f} MB")
+        logger.info(f"Total size: {total_bytes / (1024*1024):.2f} MB ({bytes_sent / (1024*1024):.2f} MB sent this attempt)")
         logger.info(f"Master playlist URL: {master_url}")
         logger.info("=" * 60)
         
@@ -731,7 +1648,9 @@ def upload_to_minio(self, data: dict):
             'base_path': base_path,
             'total_files': len(uploaded_files),
             'total_bytes': total_bytes,
-            'available_qualities': available_qualities
+            'available_qualities': available_qualities,
+            'dash_url': dash_url,
+            'trickplay_url': trickplay_url
         }
         
     except Exception as e:
@@ -742,14 +1661,12 @@ def upload_to_minio(self, data: dict):
             logger.info(f"Retrying upload (attempt {self.request.retries + 1}/{self.max_retries})")
             raise self.retry(exc=e, countdown=60)
         else:
-            with get_db_session() as db:
-                update_video_processing_status(
-                db, video_id, "failed",f"{str(e)}")
+            _set_status(video_id, "failed", f"{str(e)}")
             raise
 
 # Stage 6: Finalization
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, queue="light")
 def finalize_processing(self, data: dict):
     """
     Final step: Update database and cleanup temporary files.
@@ -775,9 +1692,7 @@ def finalize_processing(self, data: dict):
         logger.info(f"Master URL: {master_url}")
         logger.info(f"Available qualities: {available_qualities}")
 
-        with get_db_session() as db:
-            update_video_processing_status(
-                db, video_id, "finalizing")
+        _set_status(video_id, "finalizing")
         
         # Update database
         with get_db_session() as db:
@@ -792,6 +1707,15 @@ def finalize_processing(self, data: dict):
             video.processing_status = "completed"
             video.manifest_url = master_url
             video.available_qualities = available_qualities
+            extra_metadata = {}
+            if data.get('dash_url'):
+                # Same segments, DASH clients (fMP4 mode only)
+                extra_metadata["dash_manifest_url"] = data['dash_url']
+            if data.get('trickplay_url'):
+                # Seek preview thumbnails (the I-frame playlist is listed in master.m3u8)
+                extra_metadata["trickplay_vtt_url"] = data['trickplay_url']
+            if extra_metadata:
+                video.processing_metadata = {**(video.processing_metadata or {}), **extra_metadata}
             video.processing_error = None  # Clear any previous errors
             video.celery_task_id = None  # Workflow complete, clear task ID
             
@@ -813,6 +1737,13 @@ def finalize_processing(self, data: dict):
                 # Don't fail the task if cleanup fails - video is already processed
         else:
             logger.info("No temporary files to clean up")
+
+        # The MinIO copy of the scratch dir (minio_sync) / the chunk objects (chunked mode)
+        if settings.scratch_affinity != "none":
+            try:
+                delete_scratch(video_id)
+            except Exception as e:
+                logger.warning(f"Failed to delete synced scratch files (non-critical): {str(e)}")
         
         logger.info("=" * 60)
         logger.info(" ✓ VIDEO PROCESSING COMPLETE!")
@@ -824,9 +1755,7 @@ def finalize_processing(self, data: dict):
         logger.info("=" * 60)
 
 
-        with get_db_session() as db:
-            update_video_processing_status(
-                db, video_id, "completed")
+        _set_status(video_id, "completed")
         
         return {
             'video_id': video_id,
@@ -856,7 +1785,27 @@ def finalize_processing(self, data: dict):
         except Exception as db_error:
             logger.error(f"Failed to update database with error status: {str(db_error)}")
         
-        with get_db_session() as db:
-            update_video_processing_status(
-                db, video_id, "failed",f"{str(e)}")
-        raise
\ No newline at end of file
+        _set_status(video_id, "failed", f"{str(e)}")
+        raise
+
+
+# Pipeline errback
+
+@celery_app.task(queue="light", ignore_result=True)
+def on_processing_error(request, exc, traceback, video_id: str):
+    """
+    link_error of the whole workflow (create_video_processing_workflow)
+    - A stage that died without reporting it (unhandled exception, retries exhausted)
+      marks the video failed, which frees the uploader's processing slot
+    - Videos a stage already marked completed/failed are left as they are
+    """
+    with get_db_session() as db:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        status = video.processing_status if video else None
+
+    if status in TERMINAL_STATUSES:
+        release_processing_slot(video_id)
+        return
+
+    logger.error(f"Stage {request.task} of {video_id} failed: {str(exc)}")
+    _set_status(video_id, "failed", f"{request.task} failed: {str(exc)}")
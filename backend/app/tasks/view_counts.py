@@ -0,0 +1,25 @@
+# /backend/app/tasks/view_counts.py
+"""
+Periodic flush of the view counts buffered in Redis (app/services/view_counter.py).
+Scheduled by Celery beat (beat_schedule in app/celery_app.py).
+"""
+
+import logging
+
+from app.celery_app import celery_app
+from app.services.view_counter import flush_pending
+from app.tasks.dependencies import get_db_session
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(queue="light", ignore_result=True)
+def flush_view_counts():
+    """
+    - Moves views:pending aside and adds it to videos.views_count in batched UPDATEs
+    - Skips when another flush still runs (Redis lock)
+    - Failures leave the deltas in Redis for the next run
+    """
+    with get_db_session() as db:
+        updated = flush_pending(db)
+    return updated
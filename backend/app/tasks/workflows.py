@@ -1,61 +1,184 @@
+from functools import partial
 from celery import chain, chord, group
+from app.celery_app import celery_app
+from app.core.config import get_settings
+from app.services.progress_service import set_parts_total
+from app.tasks.scheduler import job_priority
 from app.tasks.video_tasks import (
     prepare_video,
+    plan_ladder,
     transcode_quality,
+    transcode_ladder,
+    dispatch_chunk_transcodes,
     on_transcode_complete,
     segment_videos,
+    create_trickplay,
     create_manifest,
     upload_to_minio,
-    finalize_processing
+    finalize_processing,
+    on_processing_error,
+    pin_to_scratch_host
 )
+import logging
 
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
-def create_video_processing_workflow(video_id: str):
+
+# Rungs produced for every video (skip-upscale is still applied per rung)
+LADDER_QUALITIES = [
+    # "2160p",  # 4K available for for development purpose its commented as testing would take a lot of time.
+    "1440p",  # 2K
+    "1080p",
+    "720p",
+    "480p",
+    "360p",
+    "240p",
+    "144p",
+]
+
+
+def ladder_qualities(data: dict) -> list:
+    """Rungs to encode: the per-title ladder from plan_ladder, else LADDER_QUALITIES"""
+    ladder = data.get("ladder")
+    if not ladder:
+        return LADDER_QUALITIES
+    return [quality for quality in LADDER_QUALITIES if quality in ladder]
+
+
+def _transcode_stage(data: dict):
     """
-    Main workflow that orchestrates all video processing tasks
-    
+    Build the transcoding stage according to settings.transcode_mode.
+
+    - per_quality:   one transcode_quality task per rung (parallel), collected by a chord
+    - single_decode: one transcode_ladder task that decodes the source once for all rungs
+    - chunked:       one transcode_chunk task per (chunk, quality), stitched per quality
+                     (the fan-out is built by dispatch_chunk_transcodes)
+    All end in on_transcode_complete with the same list of per-quality results.
+    """
+    pin = partial(pin_to_scratch_host, data=data)
+    qualities = ladder_qualities(data)
+
+    if settings.transcode_mode == "chunked":
+        return chain(
+            pin(dispatch_chunk_transcodes.s(data, qualities)),
+            pin(on_transcode_complete.s())
+        )
+
+    if settings.transcode_mode == "single_decode":
+        return chain(
+            pin(transcode_ladder.s(data, qualities)),
+            pin(on_transcode_complete.s())
+        )
+
+    return chord(
+        group(pin(transcode_quality.s(data, quality)) for quality in qualities),
+        pin(on_transcode_complete.s())
+    )
+
+
+def build_processing_tail(data: dict):
+    """
+    Every stage after prepare_video (and plan_ladder), routed to the host holding
+    the scratch dir (data["scratch_host"], recorded by prepare_video) in host_queue mode.
+
     Flow:
-    1. Prepare video (sequential)
-    2. Transcode all qualities (parallel) → Collect results
-    3. Segment videos (sequential)
+    2. Transcode all qualities (parallel, single-decode or chunked) → Collect results
+    3. Segment videos (sequential, skipped when settings.hls_direct_output is on)
+    3.5 Trickplay: I-frame rendition + sprite sheets (settings.trickplay_enabled)
     4. Create manifest (sequential)
     5. Upload to MinIO (sequential)
     6. Finalize (sequential)
-    
     """
+    pin = partial(pin_to_scratch_host, data=data)
 
-    workflow = chain(
+    stages = [_transcode_stage(data)]
+
+    # With direct-to-HLS output the transcoders already wrote the segments
+    if not settings.hls_direct_output:
+        stages.append(pin(segment_videos.s()))
+
+    if settings.trickplay_enabled:
+        stages.append(pin(create_trickplay.s()))
 
-        prepare_video.s(video_id),
-        chord(
-            group(
-                # transcode_quality.s("2160p"),  # 4K available for for development purpose its commented as testing would take a lot of time.
-                transcode_quality.s("1440p"),  # 2K
-                transcode_quality.s("1080p"),
-                transcode_quality.s("720p"),
-                transcode_quality.s("480p"),
-                transcode_quality.s("360p"),
-                transcode_quality.s("240p"),
-                transcode_quality.s("144p"),
-            ),
-            on_transcode_complete.s()
-        ),
-        segment_videos.s(),
-        create_manifest.s(),
-        upload_to_minio.s(),
-        finalize_processing.s()
+    stages += [
+        pin(create_manifest.s(ladder=data.get("ladder"))),
+        pin(upload_to_minio.s()),
+        pin(finalize_processing.s())
+    ]
 
+    return chain(*stages)
+
+
+@celery_app.task(bind=True, queue="light")
+def dispatch_processing_tail(self, data: dict):
+    """
+    Runs right after prepare_video (on any worker - it only builds signatures)
+    - The scratch host is only known once prepare_video ran, so the rest of
+      the workflow is built here and replaces this task
+    - Same for the real duration/size the priority is based on
+    - With settings.per_title_ladder, plan_ladder runs first and this task
+      runs again on its result (the rungs decide the shape of the fan-out)
+    """
+    data["priority"] = job_priority(data["video_id"], data.get("metadata"))
+
+    if settings.per_title_ladder and "ladder" not in data:
+        logger.info(f"Planning the ladder of {data['video_id']} before transcoding")
+        raise self.replace(chain(
+            pin_to_scratch_host(plan_ladder.s(data, LADDER_QUALITIES), data),
+            dispatch_processing_tail.s()
+        ))
+
+    # Live progress averages the parallel rungs
+    if settings.transcode_mode == "per_quality":
+        set_parts_total(data["video_id"], len(ladder_qualities(data)))
+
+    logger.info(
+        f"Routing remaining stages of {data['video_id']} to scratch host {data.get('scratch_host')} "
+        f"with priority {data['priority']}"
     )
+    raise self.replace(build_processing_tail(data))
+
 
+def create_video_processing_workflow(video_id: str, priority: int = None):
+    """
+    Main workflow that orchestrates all video processing tasks
+    
+    Flow:
+    1. Prepare video (sequential, any worker)
+    1.5 Plan the per-title ladder (settings.per_title_ladder)
+    2. Everything else, built by dispatch_processing_tail (see build_processing_tail)
+
+    priority: Celery priority of prepare_video (0 = most urgent), see app/tasks/scheduler.py
+
+    on_processing_error is linked to every stage (replaced tasks pass it on to the
+    stages they build), so a pipeline that dies still ends failed and frees its slot.
+    """
+    prepare = prepare_video.s(video_id)
+    if priority is not None:
+        prepare = prepare.set(priority=priority)
+
+    workflow = chain(
+        prepare,
+        dispatch_processing_tail.s()
+    )
+    workflow.link_error(on_processing_error.s(video_id))
     return workflow
 
 
-def start_video_processing(video_id:str):
+def start_video_processing(video_id:str, priority: int = None):
     """
     Helper function to start the workflow
     Returns the AsyncResult object for tracking
+
+    Called by the scheduler (schedule_video_processing), which enforces the per-user caps
     """
 
-    workflow = create_video_processing_workflow(video_id)
+    workflow = create_video_processing_workflow(video_id, priority)
+
+    # Live progress averages the parallel rungs (chunked mode sets this once chunks are known)
+    if settings.transcode_mode == "per_quality":
+        set_parts_total(video_id, len(LADDER_QUALITIES))
+
     result = workflow.apply_async()
-    return result
\ No newline at end of file
+    return result
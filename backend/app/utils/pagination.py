@@ -0,0 +1,66 @@
+# app/utils/pagination.py
+"""
+Opaque cursors for keyset pagination over (created_at, id).
+
+A cursor is the sort key of the last row of a page, base64url-encoded JSON.
+The next page is "rows after that key in the listing order", which the
+(created_at, id) indexes answer without reading the skipped rows, so page
+1000 costs the same as page 1.
+"""
+
+from datetime import datetime
+from typing import Optional, Tuple
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from app.models.videos import Video
+
+
+def encode_cursor(video: Video) -> str:
+    payload = json.dumps([video.created_at.isoformat(), video.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """(created_at, id) of a cursor, or 400 if it wasn't made by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, video_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(video_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(query, limit: int, cursor: Optional[str] = None, descending: bool = True, skip: int = 0):
+    """
+    One page of a Video query ordered by (created_at, id).
+
+    Args:
+        cursor: next_cursor of the previous page (skip is ignored when given)
+        skip: Offset for clients that still page by number (slower on deep pages)
+
+    Returns:
+        (videos, next_cursor) - next_cursor is None on the last page
+    """
+    if descending:
+        query = query.order_by(Video.created_at.desc(), Video.id.desc())
+    else:
+        query = query.order_by(Video.created_at.asc(), Video.id.asc())
+
+    if cursor:
+        key = tuple_(Video.created_at, Video.id)
+        after = tuple_(*decode_cursor(cursor))
+        query = query.filter(key < after if descending else key > after)
+    elif skip:
+        query = query.offset(skip)
+
+    # One extra row says whether there is a next page, without a count
+    videos = query.limit(limit + 1).all()
+    if len(videos) <= limit:
+        return videos, None
+    videos = videos[:limit]
+    return videos, encode_cursor(videos[-1])
@@ -0,0 +1,13 @@
+from fastapi import Request
+
+
+def client_address(request: Request) -> str:
+    """
+    Address of the client as seen by our reverse proxy: the last X-Forwarded-For
+    entry (the one the proxy appended). Earlier entries come from the client and
+    can be anything, so they must not identify a viewer.
+    """
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if forwarded:
+        return forwarded[-1]
+    return request.client.host if request.client else ""
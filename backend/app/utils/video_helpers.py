@@ -3,7 +3,11 @@
 from app.models.videos import Video
 from sqlalchemy.orm import Session
 from enum import Enum
-from typing import Dict, TypedDict
+from typing import Dict, Optional, TypedDict
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 class ProcessingStatus(str, Enum):
     uploading = "uploading"
@@ -77,4 +81,58 @@ def update_video_processing_status(
         db.commit()
         db.refresh(video)
         
-    return video
\ No newline at end of file
+    return video
+
+
+# ---------- Content-hash dedup ----------
+
+def file_sha256(path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """SHA-256 of a local file, read in chunks"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def find_processed_duplicate(
+    db: Session,
+    content_sha256: str,
+    exclude_video_id: Optional[str] = None
+) -> Optional[Video]:
+    """Oldest completed video whose raw upload had the same bytes"""
+    query = db.query(Video).filter(
+        Video.content_sha256 == content_sha256,
+        Video.processing_status == "completed",
+        Video.manifest_url.isnot(None)
+    )
+    if exclude_video_id:
+        query = query.filter(Video.id != exclude_video_id)
+
+    return query.order_by(Video.created_at.asc()).first()
+
+
+def reuse_processed_duplicate(db: Session, video: Video) -> bool:
+    """
+    Point `video` at the HLS output of an already processed upload with the same hash.
+
+    The renditions are shared, not copied: manifest_url and available_qualities
+    reference the original video's objects. Returns False if there is no match.
+    """
+    if not video.content_sha256:
+        return False
+
+    source = find_processed_duplicate(db, video.content_sha256, exclude_video_id=video.id)
+    if not source:
+        return False
+
+    video.manifest_url = source.manifest_url
+    video.available_qualities = source.available_qualities
+    video.processing_metadata = {**(source.processing_metadata or {}), "deduplicated_from": source.id}
+    video.processing_status = "completed"
+    video.processing_error = None
+    video.celery_task_id = None
+    db.commit()
+
+    logger.info(f"Video {video.id} reuses the renditions of {source.id} (sha256 {video.content_sha256[:12]}...)")
+    return True
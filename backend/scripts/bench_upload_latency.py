@@ -0,0 +1,124 @@
+# scripts/bench_upload_latency.py
+"""
+Latency of cheap endpoints while a large upload is in flight.
+
+Measures /health/ and /videos/ once with an idle API (baseline) and again
+while POST /videos/create streams a large file. If blocking storage or DB
+work runs on the event loop, the "during upload" p99 jumps to seconds.
+
+Usage (from backend/):
+    python scripts/bench_upload_latency.py \
+        --base-url http://localhost:8000 \
+        --token <access token> \
+        --file /path/to/large.mp4
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import httpx
+
+
+PROBE_PATHS = ["/health/", "/videos/"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def probe(client, stop_event, interval, results):
+    """Hit every probe path in a loop until stop_event is set"""
+    while not stop_event.is_set():
+        for path in PROBE_PATHS:
+            start = time.perf_counter()
+            try:
+                client.get(path)
+            except httpx.HTTPError:
+                pass  # a timeout is still a measurement
+            results[path].append((time.perf_counter() - start) * 1000)
+        time.sleep(interval)
+
+
+def run_probes(client, duration, interval):
+    results = {path: [] for path in PROBE_PATHS}
+    stop_event = threading.Event()
+    worker = threading.Thread(target=probe, args=(client, stop_event, interval, results))
+    worker.start()
+    time.sleep(duration)
+    stop_event.set()
+    worker.join()
+    return results
+
+
+def upload(base_url, token, file_path, done):
+    metadata = {
+        "title": "Latency benchmark",
+        "description": "Upload used by scripts/bench_upload_latency.py",
+        "category": "test",
+        "status": "draft"
+    }
+    try:
+        with open(file_path, "rb") as f, httpx.Client(base_url=base_url, timeout=None) as client:
+            start = time.perf_counter()
+            response = client.post(
+                "/videos/create",
+                headers={"Authorization": f"Bearer {token}"},
+                files={"video": (file_path.split("/")[-1], f, "video/mp4")},
+                data={"data": json.dumps(metadata)}
+            )
+            print(f"Upload finished: HTTP {response.status_code} in {time.perf_counter() - start:.1f}s")
+    finally:
+        done.set()
+
+
+def report(label, results):
+    print(f"\n{label}")
+    print(f"  {'path':<12}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for path, values in results.items():
+        if not values:
+            print(f"  {path:<12}{0:>6}")
+            continue
+        print(
+            f"  {path:<12}{len(values):>6}"
+            f"{statistics.median(values):>10.1f}"
+            f"{percentile(values, 95):>10.1f}"
+            f"{percentile(values, 99):>10.1f}"
+            f"{max(values):>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Access token of the uploading user")
+    parser.add_argument("--file", required=True, help="Large video file to upload")
+    parser.add_argument("--baseline-seconds", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=0.05, help="Pause between probe rounds")
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.base_url, timeout=30) as client:
+        report("Idle API", run_probes(client, args.baseline_seconds, args.interval))
+
+        done = threading.Event()
+        uploader = threading.Thread(target=upload, args=(args.base_url, args.token, args.file, done))
+        results = {path: [] for path in PROBE_PATHS}
+        stop_event = threading.Event()
+        prober = threading.Thread(target=probe, args=(client, stop_event, args.interval, results))
+
+        uploader.start()
+        prober.start()
+        done.wait()
+        stop_event.set()
+        prober.join()
+        uploader.join()
+
+        report("During upload", results)
+
+
+if __name__ == "__main__":
+    main()